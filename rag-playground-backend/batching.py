@@ -0,0 +1,136 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+# Key tuple, 16-byte digest, float and the OrderedDict's own slot and link
+SCORE_ENTRY_BYTES = sys.getsizeof(("", b"")) + sys.getsizeof(bytes(16)) + sys.getsizeof(0.0) + 100
+
+
+class MicroBatcher:
+    """Coalesces concurrent calls into one batched call.
+
+    Callers pass a list of items and block until their results are ready.
+    A background thread waits up to ``max_wait_ms`` after the first pending
+    request (or until ``max_batch_size`` items are queued), runs
+    ``batch_fn`` once over everything collected and hands each caller its
+    slice of the output. A single request is never split, so one larger
+    than ``max_batch_size`` runs as its own batch. With ``max_wait_ms=0``
+    calls go straight to ``batch_fn``.
+    """
+
+    def __init__(self, batch_fn: Callable[[List], Sequence], max_batch_size: int = 64,
+                 max_wait_ms: float = 5.0, name: str = "batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._pending: List[Tuple[List, Future]] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+
+    def __call__(self, items: List) -> Sequence:
+        if not items:
+            return []
+        if self.max_wait <= 0:
+            return self.batch_fn(items)
+        return self.submit(items).result()
+
+    def submit(self, items: List) -> Future:
+        future: Future = Future()
+        with self._cond:
+            self._ensure_thread()
+            self._pending.append((items, future))
+            self._cond.notify()
+        return future
+
+    def _ensure_thread(self):
+        # Caller holds self._cond. Threads don't survive fork, so a forked
+        # worker starts its own on first use.
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _take_batch(self) -> List[Tuple[List, Future]]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_wait
+            while sum(len(items) for items, _ in self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._pending.pop(0)]
+            size = len(batch[0][0])
+            while self._pending and size + len(self._pending[0][0]) <= self.max_batch_size:
+                size += len(self._pending[0][0])
+                batch.append(self._pending.pop(0))
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            items = [item for request, _ in batch for item in request]
+            try:
+                outputs = self.batch_fn(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(items)
+            offset = 0
+            for request, future in batch:
+                future.set_result(outputs[offset:offset + len(request)])
+                offset += len(request)
+
+
+class CachedPairScorer:
+    """Scores (query, text) pairs through a batcher, memoizing by (query, chunk hash).
+
+    A repeated rerank of the same candidates for the same question costs
+    no model call at all.
+    """
+
+    def __init__(self, batcher: MicroBatcher, max_entries: int = 10000):
+        self.batcher = batcher
+        self.max_entries = max_entries
+        self._scores: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        keys = [
+            (query, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest())
+            for query, text in pairs
+        ]
+        scores: Dict[Hashable, float] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    scores[key] = self._scores[key]
+
+        missing = [(key, pair) for key, pair in zip(keys, pairs) if key not in scores]
+        if missing:
+            computed = self.batcher([pair for _, pair in missing])
+            with self._lock:
+                for (key, _), score in zip(missing, computed):
+                    scores[key] = self._scores[key] = float(score)
+                while len(self._scores) > self.max_entries:
+                    self._scores.popitem(last=False)
+        return [scores[key] for key in keys]
+
+    def nbytes(self) -> int:
+        # Per entry: a (question, digest) key tuple, the digest and a float;
+        # question strings are shared across a question's candidates
+        with self._lock:
+            return sys.getsizeof(self._scores) + len(self._scores) * SCORE_ENTRY_BYTES
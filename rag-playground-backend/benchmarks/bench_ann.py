@@ -0,0 +1,152 @@
+"""Flat vs. ANN search for collections: recall@k, latency and memory.
+
+Builds clustered synthetic vectors (the shape sentence embeddings have)
+at each --sizes, then for the flat search collections use below
+COLLECTION_ANN_THRESHOLD and for every --indexes kind (doc_collections.
+make_ann_index, so the same HNSW/IVF-PQ settings as the server) reports:
+
+- build time and serialized index size
+- resident memory added by building the index
+- p50/p95 single-query latency, unfiltered and restricted to ~1% of rows
+  through a row selector (flat: exact search over just those rows)
+- recall@k against exact (flat) search, after the same exact re-scoring
+  of REFINE_FACTOR * k candidates the server does
+
+Run from rag-playground-backend/; 1M rows takes a few minutes and ~3 GB:
+
+    python benchmarks/bench_ann.py --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from doc_collections import IVF_TRAIN_SAMPLE, ann_search, make_ann_index  # noqa: E402
+from instrumentation import process_rss  # noqa: E402
+
+
+def clustered_vectors(n: int, dim: int, clusters: int, spread: float, seed: int = 0) -> np.ndarray:
+    """Unit vectors scattered around ``clusters`` random centres.
+
+    Fully isotropic noise makes every neighbour almost equidistant, which no
+    ANN index handles and real embeddings don't look like; ``spread`` keeps
+    most of the variance in a low-dimensional subspace per cluster.
+    """
+    # Same clusters for every seed, so queries land where the data is
+    layout = np.random.default_rng(0)
+    centres = layout.standard_normal((clusters, dim)).astype(np.float32)
+    rank = 16
+    bases = layout.standard_normal((clusters, rank, dim)).astype(np.float32) / np.sqrt(rank)
+    rng = np.random.default_rng(seed + 1)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100_000):
+        end = min(start + 100_000, n)
+        labels = rng.integers(0, clusters, end - start)
+        coords = rng.standard_normal((end - start, 1, rank)).astype(np.float32)
+        structured = (coords @ bases[labels])[:, 0]
+        noise = 0.1 * rng.standard_normal((end - start, dim)).astype(np.float32)
+        vectors[start:end] = centres[labels] + spread * structured + noise
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def percentile_ms(values, q: float) -> float:
+    return round(float(np.percentile(values, q)) * 1000, 3)
+
+
+def timed_queries(search, queries: np.ndarray, k: int):
+    latencies, ids = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, found = search(query.reshape(1, -1))
+        latencies.append(time.perf_counter() - start)
+        # Filtered searches can come back short
+        ids.append(np.pad(found[0], (0, k - len(found[0])), constant_values=-1))
+    return {"p50_ms": percentile_ms(latencies, 50), "p95_ms": percentile_ms(latencies, 95)}, np.array(ids)
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(row[row >= 0]) & set(expected)) for row, expected in zip(found, truth))
+    return round(hits / truth.size, 4)
+
+
+def bench_size(n: int, args) -> Dict:
+    vectors = clustered_vectors(n, args.dim, args.clusters, args.spread)
+    queries = clustered_vectors(args.queries, args.dim, args.clusters, args.spread, seed=1)
+    # A contiguous ~1% slice, like a per-document filter
+    allowed = np.arange(n // 3, n // 3 + max(args.k, n // 100), dtype=np.int64)
+    selector = faiss.IDSelectorBatch(len(allowed), faiss.swig_ptr(allowed))
+
+    _, truth = faiss.knn(queries, vectors, args.k)
+    _, filtered_truth = faiss.knn(queries, vectors[allowed], args.k)
+    filtered_truth = allowed[filtered_truth]
+
+    latency, found = timed_queries(lambda q: faiss.knn(q, vectors, args.k), queries, args.k)
+    subset_latency, _ = timed_queries(lambda q: faiss.knn(q, np.ascontiguousarray(vectors[allowed]), args.k), queries, args.k)
+    results = {"flat": {
+        "build_s": 0.0,
+        "index_bytes": int(vectors.nbytes),
+        "latency": latency,
+        "filtered_latency": subset_latency,
+        "recall_at_k": recall(found, truth),
+    }}
+
+    for kind in args.indexes:
+        sample = vectors
+        if n > IVF_TRAIN_SAMPLE:
+            sample = vectors[np.random.default_rng(0).choice(n, IVF_TRAIN_SAMPLE, replace=False)]
+        rss = process_rss()
+        start = time.perf_counter()
+        index = make_ann_index(kind, args.dim, sample)
+        index.add(vectors)
+        build_s = time.perf_counter() - start
+        rss_delta = process_rss() - rss
+        latency, found = timed_queries(lambda q: ann_search(index, vectors, q, args.k), queries, args.k)
+        # What a collection does past COLLECTION_FILTER_EXACT_MAX rows
+        filtered_latency, filtered = timed_queries(lambda q: ann_search(index, vectors, q, args.k, selector), queries, args.k)
+        results[kind] = {
+            "build_s": round(build_s, 2),
+            "index_bytes": int(faiss.serialize_index(index).nbytes),
+            "rss_delta_bytes": rss_delta,
+            "latency": latency,
+            "filtered_latency": filtered_latency,
+            "recall_at_k": recall(found, truth),
+            "filtered_recall_at_k": recall(filtered, filtered_truth),
+        }
+        del index
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--indexes", nargs="+", choices=["hnsw", "ivfpq"], default=["hnsw", "ivfpq"])
+    parser.add_argument("--dim", type=int, default=384, help="all-MiniLM-L6-v2 output size")
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--spread", type=float, default=1.0, help="within-cluster spread along each cluster's subspace")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=1, help="faiss OpenMP threads")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    results = {
+        "config": {key: getattr(args, key) for key in ("dim", "clusters", "spread", "queries", "k", "threads")},
+        "sizes": {str(n): bench_size(n, args) for n in args.sizes},
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Sparse BM25Index vs. rank_bm25.BM25Okapi (the retriever it replaced).
+
+For each --chunks size, synthetic chunks (benchmarks/synthetic_pdf.py
+vocabulary, split like the 128-token chunker) are indexed by both; the
+report has build time, serialized size, p50/p95 latency for one question
+and for a --batch of questions, and the largest score difference between
+the two. Run from rag-playground-backend/:
+
+    python benchmarks/bench_bm25.py --chunks 1000 10000 50000
+
+Needs rank-bm25 for the comparison (pip install rank-bm25).
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from bm25_index import BM25Index  # noqa: E402
+from pipeline import bm25_tokenize  # noqa: E402
+from synthetic_pdf import QUESTIONS, make_lines  # noqa: E402
+
+WORDS_PER_CHUNK = 100  # ~128 cl100k tokens of this English text
+
+
+def make_chunks(n: int) -> List[str]:
+    words = []
+    pages = 0
+    while len(words) < n * WORDS_PER_CHUNK:
+        for lines in make_lines(50, seed=pages):
+            words.extend(" ".join(lines).split())
+        pages += 50
+    return [" ".join(words[i * WORDS_PER_CHUNK:(i + 1) * WORDS_PER_CHUNK]) for i in range(n)]
+
+
+def latency(func, repeats: int) -> Dict:
+    samples = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - start)
+    return {
+        "p50_ms": round(float(np.percentile(samples, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(samples, 95)) * 1000, 3),
+    }
+
+
+def bench_size(n: int, args) -> Dict:
+    from rank_bm25 import BM25Okapi
+
+    corpus = [bm25_tokenize(text) for text in make_chunks(n)]
+    questions = [bm25_tokenize(q) for q in QUESTIONS]
+    batch = [questions[i % len(questions)] for i in range(args.batch)]
+    results = {}
+
+    start = time.perf_counter()
+    okapi = BM25Okapi(corpus)
+    okapi_build = time.perf_counter() - start
+
+    def okapi_top(tokens):
+        return np.argsort(-okapi.get_scores(tokens), kind="stable")[:args.k]
+
+    results["rank_bm25"] = {
+        "build_s": round(okapi_build, 3),
+        "bytes": len(pickle.dumps(okapi, protocol=pickle.HIGHEST_PROTOCOL)),
+        "query": latency(lambda i: okapi_top(questions[i % len(questions)]), args.repeats),
+        "batch": latency(lambda i: [okapi_top(tokens) for tokens in batch], max(3, args.repeats // 10)),
+    }
+
+    start = time.perf_counter()
+    index = BM25Index.build(corpus)
+    index_build = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bm25.npz")
+        index.save(path)
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        BM25Index.load(path)
+        load_s = time.perf_counter() - start
+
+    results["sparse"] = {
+        "build_s": round(index_build, 3),
+        "bytes": size,
+        "load_s": round(load_s, 4),
+        "query": latency(lambda i: index.top_k([questions[i % len(questions)]], args.k), args.repeats),
+        "batch": latency(lambda i: index.top_k(batch, args.k), max(3, args.repeats // 10)),
+    }
+
+    expected = np.stack([okapi.get_scores(tokens) for tokens in questions])
+    actual = index.scores(questions)
+    # Compared by score: the synthetic text has many exact ties, and float32
+    # weights can order tied chunks differently
+    same_top = sum(
+        np.allclose([score for _, score in index.top_k([tokens], args.k)[0]], scores[okapi_top(tokens)], atol=1e-5)
+        for tokens, scores in zip(questions, expected)
+    )
+    results["parity"] = {
+        "max_abs_score_diff": float(np.abs(expected - actual).max()),
+        "same_top_k_scores": f"{same_top}/{len(questions)}",
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--batch", type=int, default=64, help="questions per batched call")
+    parser.add_argument("--repeats", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    results = {
+        "config": {"batch": args.batch, "repeats": args.repeats, "k": args.k},
+        "sizes": {str(n): bench_size(n, args) for n in args.chunks},
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
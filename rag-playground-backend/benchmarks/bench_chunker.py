@@ -0,0 +1,122 @@
+"""Chunking cost: old split_and_annotate path vs TokenChunker.
+
+The legacy path is reproduced here as it was in rag_engine: a
+CharacterTextSplitter pass, process_in_batches on every chunk and a
+count_tokens call per chunk, each fetching the tiktoken encoding again.
+Run from rag-playground-backend/:
+
+    python benchmarks/bench_chunker.py --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = (
+    "the retrieval of relevant passages depends on chunk size overlap and the "
+    "tokenizer used by the embedding model while latency grows with every "
+    "redundant pass over the document text in Python"
+).split()
+
+
+def make_text(chars: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = []
+    length = 0
+    while length < chars:
+        word = rng.choice(WORDS)
+        # Paragraph breaks give CharacterTextSplitter something to split on
+        word += "\n\n" if rng.random() < 0.02 else " "
+        words.append(word)
+        length += len(word)
+    return "".join(words)[:chars]
+
+
+def legacy_chunk(text: str):
+    import tiktoken
+    from langchain.text_splitter import CharacterTextSplitter
+
+    def count_tokens(chunk: str) -> int:
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return len(encoding.encode(chunk))
+
+    def process_in_batches(chunk: str, max_tokens: int = 6000) -> str:
+        encoding = tiktoken.get_encoding("cl100k_base")
+        tokens = encoding.encode(chunk)
+        if len(tokens) <= max_tokens:
+            return chunk
+        batches, current = [], []
+        for token in tokens:
+            if len(current) + 1 > max_tokens:
+                batches.append(encoding.decode(current))
+                current = []
+            current.append(token)
+        if current:
+            batches.append(encoding.decode(current))
+        return " ".join(batches)
+
+    splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+    docs = splitter.create_documents([text])
+    for i, doc in enumerate(docs):
+        doc.metadata["page"] = i + 1
+        doc.page_content = process_in_batches(doc.page_content)
+    total_tokens = sum(count_tokens(doc.page_content) for doc in docs)
+    return len(docs), total_tokens
+
+
+def token_chunk(text: str):
+    from chunker import TokenChunker
+
+    chunks = TokenChunker(128, 16).split(text)
+    return len(chunks), chunks.total_tokens
+
+
+def best_of(func, text: str, repeats: int):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    from chunker import _token_byte_lengths
+    start = time.perf_counter()
+    _token_byte_lengths()
+    table_ms = (time.perf_counter() - start) * 1000
+
+    results = []
+    for size in args.sizes:
+        text = make_text(size)
+        legacy_s, (legacy_chunks, legacy_tokens) = best_of(legacy_chunk, text, args.repeats)
+        token_s, (token_chunks, token_tokens) = best_of(token_chunk, text, args.repeats)
+        results.append({
+            "chars": size,
+            "legacy_ms": round(legacy_s * 1000, 2),
+            "legacy_chunks": legacy_chunks,
+            "legacy_tokens": legacy_tokens,
+            "token_chunker_ms": round(token_s * 1000, 2),
+            "token_chunker_chunks": token_chunks,
+            "token_chunker_tokens": token_tokens,
+            "speedup": round(legacy_s / token_s, 1),
+        })
+
+    print(f"one-time token length table: {table_ms:.1f} ms")
+    print(f"{'chars':>9} {'legacy ms':>10} {'chunker ms':>11} {'speedup':>8}")
+    for r in results:
+        print(f"{r['chars']:>9} {r['legacy_ms']:>10} {r['token_chunker_ms']:>11} {r['speedup']:>7}x")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""End-to-end benchmark of SimpleRAG, HybridRAG and ReRankerRAG, fully offline.
+
+Synthetic PDFs (benchmarks/synthetic_pdf.py) of each --pages size are
+extracted, chunked, embedded and indexed, then queried at every
+--concurrency level two ways:
+
+- functions: the three answer_with_* coroutines plus score_results,
+  exactly as /query runs them
+- api: POST /query in-process through httpx's ASGI transport
+
+The LLM is the stub (LLM_BACKEND=stub) with --llm-latency seconds per
+call; the LLM, rerank and embedding caches are off so every request does
+the full work. Output is JSON with per-stage p50/p95 (extract, chunk,
+embed, index, retrieve, rerank, generate, score), request latency,
+throughput and peak RSS. Run from rag-playground-backend/:
+
+    python benchmarks/bench_e2e.py --pages 2 20 --concurrency 1 8 --output baseline.json
+    python benchmarks/bench_e2e.py --pages 2 20 --concurrency 1 8 --baseline baseline.json
+
+With --baseline the run fails (exit 1) when a p95 grows, or throughput
+drops, by more than --max-regression (relative) and --min-delta-ms.
+The api mode needs httpx (installed with langchain-groq).
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_pdf import QUESTIONS, make_pdf  # noqa: E402
+
+ARCHITECTURES = ["SimpleRAG", "HybridRAG", "ReRankerRAG"]
+
+# Pipeline step name -> reported stage
+STAGES = {
+    "extraction": "extract",
+    "text_processing": "chunk",
+    "embedding": "embed",
+    "indexing": "index",
+    "retrieval": "retrieve",
+    "reranking": "rerank",
+    "generation": "generate",
+    "scoring": "score",
+}
+
+
+def configure_env(args, store_dir: str):
+    # Must happen before rag_engine/main are imported
+    os.environ.update({
+        "LLM_BACKEND": "stub",
+        "STUB_LLM_LATENCY": str(args.llm_latency),
+        "LLM_CACHE_SIZE": "0",
+        "LLM_CACHE_PATH": "",
+        "LLM_SEMANTIC_CACHE_THRESHOLD": "",
+        "RERANK_CACHE_SIZE": "0",
+        "EMBEDDING_CACHE_DIR": "",
+        "DOCUMENT_STORE_DIR": store_dir,
+        "PRELOAD_MODELS": "",
+    })
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[round(q * (len(ordered) - 1))]
+
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict]:
+    return {
+        name: {
+            "n": len(values),
+            "p50_ms": round(percentile(values, 0.5) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+        }
+        for name, values in samples.items() if values
+    }
+
+
+def collect_steps(results: List[Dict], samples: Dict[str, List[float]]):
+    scoring = None
+    for result in results:
+        for step in (result.get("metrics") or {}).get("steps", []):
+            if step["name"] == "scoring":
+                # One batched pass per request, copied into every result
+                scoring = step["duration"]
+            elif not step.get("shared") and step["name"] in STAGES:
+                # Shared steps belong to the document, not to this query
+                samples[STAGES[step["name"]]].append(step["duration"])
+    if scoring is not None:
+        samples["score"].append(scoring)
+
+
+async def run_load(request, concurrency: int, total: int, samples: Dict[str, List[float]]) -> Dict:
+    """Issue ``total`` requests, at most ``concurrency`` at a time."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            results = await request(QUESTIONS[i % len(QUESTIONS)])
+            latencies.append(time.perf_counter() - start)
+            collect_steps(results, samples)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    wall = time.perf_counter() - start
+    return {
+        "requests": total,
+        "throughput_rps": round(total / wall, 2),
+        "latency": summarize({"request": latencies})["request"],
+    }
+
+
+def build_document(pdf: bytes, samples: Dict[str, List[float]]):
+    from rag_engine import create_vector_store
+    from utils import extract_document
+
+    start = time.perf_counter()
+    pages = extract_document(pdf)
+    samples["extract"].append(time.perf_counter() - start)
+    pipeline = create_vector_store(pages.text, pages=pages)
+    for step in pipeline.steps:
+        samples[STAGES[step["name"]]].append(step["duration"])
+    return pipeline
+
+
+async def bench_functions(args, pdf: bytes, pages: int, runs: Dict):
+    from rag_engine import (
+        answer_with_hybrid_rag,
+        answer_with_reranker_rag,
+        answer_with_simple_rag,
+        ensure_models,
+        models_for,
+        score_results,
+    )
+    functions = [answer_with_simple_rag, answer_with_hybrid_rag, answer_with_reranker_rag]
+    await ensure_models(models_for(ARCHITECTURES))
+
+    build_samples = defaultdict(list)
+    for _ in range(args.build_repeats):
+        pipeline = await asyncio.get_running_loop().run_in_executor(None, build_document, pdf, build_samples)
+    runs[f"build/pages={pages}"] = {
+        "chunks": len(pipeline.chunks),
+        "stages": summarize(build_samples),
+    }
+
+    async def request(question: str):
+        results = list(await asyncio.gather(*(func(pipeline, question) for func in functions)))
+        await score_results(pipeline, question, results)
+        return results
+
+    await request(QUESTIONS[0])  # warm up
+    for concurrency in args.concurrency:
+        samples = defaultdict(list)
+        run = await run_load(request, concurrency, args.requests, samples)
+        run["stages"] = summarize(samples)
+        runs[f"functions/pages={pages}/c={concurrency}"] = run
+
+
+async def bench_api(args, pdf: bytes, pages: int, runs: Dict):
+    import httpx
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        response = await client.post("/documents", files={"pdf": ("bench.pdf", pdf, "application/pdf")})
+        response.raise_for_status()
+        upload_s = time.perf_counter() - start
+        doc_id = response.json()["doc_id"]
+
+        async def request(question: str):
+            response = await client.post("/query", data={
+                "query": question,
+                "architectures": json.dumps(ARCHITECTURES),
+                "doc_id": doc_id,
+            })
+            response.raise_for_status()
+            return response.json()["results"]
+
+        await request(QUESTIONS[0])
+        for concurrency in args.concurrency:
+            samples = defaultdict(list)
+            run = await run_load(request, concurrency, args.requests, samples)
+            run["stages"] = summarize(samples)
+            run["upload_ms"] = round(upload_s * 1000, 2)
+            runs[f"api/pages={pages}/c={concurrency}"] = run
+
+
+def compare(current: Dict, baseline: Dict, max_regression: float, min_delta_ms: float) -> List[str]:
+    """Regressions of ``current`` against ``baseline``, as readable lines."""
+    failures = []
+
+    def check(label: str, new: float, old: float):
+        if new - old > min_delta_ms and new > old * (1 + max_regression):
+            failures.append(f"{label}: {old:.2f} -> {new:.2f} ms")
+
+    for key, run in current["runs"].items():
+        old_run = baseline.get("runs", {}).get(key)
+        if old_run is None:
+            continue
+        for stage, stats in run.get("stages", {}).items():
+            if stage in old_run.get("stages", {}):
+                check(f"{key} {stage} p95", stats["p95_ms"], old_run["stages"][stage]["p95_ms"])
+        if "latency" in run and "latency" in old_run:
+            check(f"{key} request p95", run["latency"]["p95_ms"], old_run["latency"]["p95_ms"])
+        if "throughput_rps" in run and "throughput_rps" in old_run:
+            new, old = run["throughput_rps"], old_run["throughput_rps"]
+            if new < old * (1 - max_regression):
+                failures.append(f"{key} throughput: {old:.2f} -> {new:.2f} req/s")
+    old_rss = baseline.get("peak_rss_mb")
+    if old_rss and current["peak_rss_mb"] > old_rss * (1 + max_regression):
+        failures.append(f"peak RSS: {old_rss:.1f} -> {current['peak_rss_mb']:.1f} MB")
+    return failures
+
+
+async def run(args) -> Dict:
+    runs: Dict[str, Dict] = {}
+    for pages in args.pages:
+        pdf = make_pdf(pages)
+        if "functions" in args.modes:
+            await bench_functions(args, pdf, pages, runs)
+        if "api" in args.modes:
+            await bench_api(args, pdf, pages, runs)
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 20])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="requests per concurrency level")
+    parser.add_argument("--build-repeats", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="stub LLM seconds per call")
+    parser.add_argument("--modes", nargs="+", choices=["functions", "api"], default=["functions", "api"])
+    parser.add_argument("--output", help="write results JSON here (e.g. to save a baseline)")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore smaller absolute changes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        configure_env(args, store_dir)
+        runs = asyncio.run(run(args))
+
+    results = {
+        "config": {
+            "pages": args.pages,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "llm_latency": args.llm_latency,
+            "modes": args.modes,
+            "cpu_count": os.cpu_count(),
+        },
+        # ru_maxrss is in kB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "runs": runs,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = compare(results, baseline, args.max_regression, args.min_delta_ms)
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Embedding throughput and memory: current path vs EmbeddingEngine.
+
+Each variant runs in its own interpreter so RSS numbers are not polluted
+by the other variants' models. Run from rag-playground-backend/:
+
+    python benchmarks/bench_embeddings.py --chunks 2000 --batch-size 64
+
+Variants:
+  langchain   HuggingFaceEmbeddings, the path rag_engine used before
+  torch       EmbeddingEngine, float32, no cache
+  quantized   EmbeddingEngine, int8 dynamic quantization, no cache
+  cached      EmbeddingEngine, float32, second pass over a warm cache
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+VARIANTS = ["langchain", "torch", "quantized", "cached"]
+WORDS = (
+    "retrieval document index vector query answer model context chunk page "
+    "token latency memory report section table figure result method data "
+    "system user service request response cache batch embedding score rank"
+).split()
+
+
+def make_chunks(count: int, chars: int = 500, seed: int = 0):
+    rng = random.Random(seed)
+    chunks = []
+    for _ in range(count):
+        words = []
+        while sum(len(w) + 1 for w in words) < chars:
+            words.append(rng.choice(WORDS))
+        chunks.append(" ".join(words))
+    return chunks
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def run_variant(variant: str, chunks, batch_size: int):
+    import numpy as np
+
+    base_rss = rss_mb()
+    if variant == "langchain":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2", model_kwargs={"device": "cpu"})
+    else:
+        from embedding_engine import EmbeddingEngine
+        cache_dir = tempfile.mkdtemp() if variant == "cached" else None
+        model = EmbeddingEngine(
+            batch_size=batch_size,
+            backend="quantized" if variant == "quantized" else "torch",
+            cache_dir=cache_dir,
+        )
+        if variant == "cached":
+            model.embed_documents(chunks)  # warm the cache
+    loaded_rss = rss_mb()
+
+    start = time.perf_counter()
+    vectors = np.asarray(model.embed_documents(chunks), dtype=np.float32)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "variant": variant,
+        "chunks": len(chunks),
+        "seconds": round(elapsed, 3),
+        "chunks_per_sec": round(len(chunks) / elapsed, 1),
+        "model_rss_mb": round(loaded_rss - base_rss, 1),
+        "rss_mb": round(rss_mb(), 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "vectors": vectors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--variants", nargs="+", default=VARIANTS, choices=VARIANTS)
+    parser.add_argument("--child", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--vectors-out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    import numpy as np
+
+    chunks = make_chunks(args.chunks)
+    if args.child:
+        result = run_variant(args.child, chunks, args.batch_size)
+        np.save(args.vectors_out, result.pop("vectors"))
+        print(json.dumps(result))
+        return
+
+    results = []
+    reference = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for variant in args.variants:
+            vectors_out = os.path.join(tmp, f"{variant}.npy")
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", variant, "--vectors-out", vectors_out,
+                 "--chunks", str(args.chunks), "--batch-size", str(args.batch_size)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            vectors = np.load(vectors_out)
+            if reference is None:
+                reference = vectors
+            cosine = np.sum(reference * vectors, axis=1) / (
+                np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors, axis=1)
+            )
+            result["min_cosine_vs_first"] = round(float(cosine.min()), 5)
+            results.append(result)
+
+    print(f"{'variant':<10} {'chunks/s':>10} {'model MB':>9} {'peak MB':>8} {'min cos':>8}")
+    for r in results:
+        print(f"{r['variant']:<10} {r['chunks_per_sec']:>10} {r['model_rss_mb']:>9} "
+              f"{r['peak_rss_mb']:>8} {r['min_cosine_vs_first']:>8}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""/query latency with and without a full garbage collection per request.
+
+One synthetic PDF (benchmarks/synthetic_pdf.py) is uploaded, then POST
+/query by doc_id runs in-process through httpx's ASGI transport at every
+--concurrency level, in two modes:
+
+- per-request: what main.py used to do; CPython's default thresholds,
+  nothing frozen, and gc.collect() before answering and after every
+  response
+- managed: GC_THRESHOLDS from memory_manager.tune_gc() and the heap
+  frozen after the models loaded (freeze_long_lived), no forced
+  collections
+
+Output is JSON with request p50/p95/p99, throughput, time spent in the
+collector and collections per generation for each mode. The LLM is the
+stub with --llm-latency seconds per call and the caches are off, as in
+bench_e2e.py. Run from rag-playground-backend/:
+
+    python benchmarks/bench_gc.py --pages 20 --concurrency 1 8 --requests 64
+
+Needs httpx (installed with langchain-groq).
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_e2e import ARCHITECTURES, configure_env, percentile  # noqa: E402
+from synthetic_pdf import QUESTIONS, make_pdf  # noqa: E402
+
+CPYTHON_THRESHOLDS = (700, 10, 10)
+
+
+class GCTimer:
+    """Wall time spent in collections while active."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._started = 0.0
+
+    def __call__(self, phase: str, info: Dict):
+        if phase == "start":
+            self._started = time.perf_counter()
+        else:
+            self.seconds += time.perf_counter() - self._started
+
+    def __enter__(self):
+        gc.callbacks.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        gc.callbacks.remove(self)
+
+
+def collect_per_request(app):
+    # The removed clean_up_memory middleware plus the collect /query did first
+    async def wrapped(scope, receive, send):
+        if scope["type"] == "http":
+            gc.collect()
+        await app(scope, receive, send)
+        if scope["type"] == "http":
+            gc.collect()
+    return wrapped
+
+
+def set_mode(mode: str):
+    from memory_manager import freeze_long_lived, tune_gc
+
+    if mode == "per-request":
+        gc.unfreeze()
+        gc.set_threshold(*CPYTHON_THRESHOLDS)
+    else:
+        tune_gc()
+        freeze_long_lived()
+
+
+async def run_load(client, doc_id: str, concurrency: int, total: int) -> Dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/query", data={
+                "query": QUESTIONS[i % len(QUESTIONS)],
+                "architectures": json.dumps(ARCHITECTURES),
+                "doc_id": doc_id,
+            })
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    collections = [generation["collections"] for generation in gc.get_stats()]
+    with GCTimer() as timer:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        wall = time.perf_counter() - start
+    return {
+        "requests": total,
+        "throughput_rps": round(total / wall, 2),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "gc_ms": round(timer.seconds * 1000, 2),
+        "collections": [
+            generation["collections"] - before for generation, before in zip(gc.get_stats(), collections)
+        ],
+    }
+
+
+async def run(args) -> Dict:
+    import httpx
+    from main import app
+    from rag_engine import ensure_models, models_for
+
+    # Everything loaded up front, so no model load lands in a timed run
+    await ensure_models(models_for(ARCHITECTURES))
+    runs: Dict[str, Dict] = {}
+    pdf = make_pdf(args.pages)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        response = await client.post("/documents", files={"pdf": ("bench.pdf", pdf, "application/pdf")})
+        response.raise_for_status()
+        doc_id = response.json()["doc_id"]
+
+    for mode in args.modes:
+        set_mode(mode)
+        target = collect_per_request(app) if mode == "per-request" else app
+        transport = httpx.ASGITransport(app=target)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            await run_load(client, doc_id, 1, len(ARCHITECTURES))  # warm up
+            for concurrency in args.concurrency:
+                runs[f"{mode}/c={concurrency}"] = await run_load(client, doc_id, concurrency, args.requests)
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--requests", type=int, default=64, help="requests per concurrency level")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="stub LLM seconds per call")
+    parser.add_argument("--modes", nargs="+", choices=["per-request", "managed"], default=["per-request", "managed"])
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        configure_env(args, store_dir)
+        runs = asyncio.run(run(args))
+
+    results = {
+        "config": {
+            "pages": args.pages,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "llm_latency": args.llm_latency,
+        },
+        "runs": runs,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
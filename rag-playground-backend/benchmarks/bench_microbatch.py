@@ -0,0 +1,121 @@
+"""Reranker and query-embedding throughput with and without micro-batching.
+
+N threads each issue --requests calls shaped like one ReRankerRAG request
+(5 question/chunk pairs to score, or one question to embed). "direct"
+calls the model per request, as before; "batched" routes the same calls
+through MicroBatcher. The pair score cache is left out so every call does
+real work. Run from rag-playground-backend/:
+
+    python benchmarks/bench_microbatch.py --concurrency 1 4 16 32 --wait-ms 5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = (
+    "the retrieval of relevant passages depends on chunk size overlap and the "
+    "tokenizer used by the embedding model while latency grows with every "
+    "redundant pass over the document text in Python"
+).split()
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def run_load(call, payloads, concurrency: int):
+    """Run every payload through ``call`` from ``concurrency`` threads."""
+    latencies = []
+    lock = threading.Lock()
+    shards = [payloads[i::concurrency] for i in range(concurrency)]
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(shard):
+        barrier.wait()
+        for payload in shard:
+            start = time.perf_counter()
+            call(payload)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker, args=(shard,)) for shard in shards]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests_per_s": round(len(payloads) / wall, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--requests", type=int, default=256, help="total requests per run")
+    parser.add_argument("--wait-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, default=64)
+    args = parser.parse_args()
+
+    from sentence_transformers import CrossEncoder
+    from batching import MicroBatcher
+    from embedding_engine import EmbeddingEngine
+
+    rng = random.Random(0)
+    reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+    engine = EmbeddingEngine("all-MiniLM-L6-v2", batch_size=args.max_batch)
+
+    def predict(pairs):
+        return reranker.predict(pairs, batch_size=args.max_batch, show_progress_bar=False)
+
+    workloads = {
+        "rerank": (
+            predict,
+            [[(sentence(rng, 10), sentence(rng, 90)) for _ in range(5)] for _ in range(args.requests)],
+        ),
+        "query_embed": (
+            engine._encode,
+            [[sentence(rng, 12)] for _ in range(args.requests)],
+        ),
+    }
+
+    results = []
+    for name, (batch_fn, payloads) in workloads.items():
+        batch_fn(payloads[0])  # warm up
+        for concurrency in args.concurrency:
+            direct = run_load(batch_fn, payloads, concurrency)
+            batcher = MicroBatcher(batch_fn, max_batch_size=args.max_batch, max_wait_ms=args.wait_ms)
+            batched = run_load(batcher, payloads, concurrency)
+            results.append({
+                "workload": name,
+                "concurrency": concurrency,
+                "direct": direct,
+                "batched": batched,
+                "mean_batch_items": round(batcher.items / max(batcher.batches, 1), 1),
+                "speedup": round(batched["requests_per_s"] / direct["requests_per_s"], 2),
+            })
+
+    print(f"{'workload':>12} {'N':>4} {'direct req/s':>13} {'batched req/s':>14} {'batch':>6} {'speedup':>8}")
+    for r in results:
+        print(
+            f"{r['workload']:>12} {r['concurrency']:>4} {r['direct']['requests_per_s']:>13} "
+            f"{r['batched']['requests_per_s']:>14} {r['mean_batch_items']:>6} {r['speedup']:>7}x"
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
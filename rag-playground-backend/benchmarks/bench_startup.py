@@ -0,0 +1,122 @@
+"""Cold start: import time of main, time until /health answers, warm-up cost.
+
+Each run starts a fresh interpreter, so nothing is shared between runs:
+
+- import: ``import main`` alone
+- healthy: from spawning uvicorn until ``GET /health`` returns 200
+- warmup: ``POST /warmup`` (loading every model), when --warmup is given
+
+Exits non-zero if the median time-to-healthy exceeds --budget seconds, so
+it can gate a deploy. Run from rag-playground-backend/:
+
+    python benchmarks/bench_startup.py --runs 3 --budget 5 --warmup --stub-llm
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(env) -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def request(url: str, method: str = "GET", timeout: float = 600):
+    req = urllib.request.Request(url, method=method, data=b"" if method == "POST" else None)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+
+
+def measure_server(env, warmup: bool, timeout: float):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited with {server.returncode}")
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError(f"not healthy after {timeout}s")
+            try:
+                status, _ = request(f"{base}/health", timeout=1)
+                if status == 200:
+                    break
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.05)
+        result = {"healthy_s": round(time.perf_counter() - start, 3)}
+
+        if warmup:
+            warm_start = time.perf_counter()
+            status, body = request(f"{base}/warmup", method="POST")
+            result["warmup_s"] = round(time.perf_counter() - warm_start, 3)
+            result["warmup_status"] = status
+            result["models"] = body.get("models") if isinstance(body, dict) else None
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--budget", type=float, default=5.0, help="max median seconds to healthy")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--warmup", action="store_true", help="also time POST /warmup")
+    parser.add_argument("--stub-llm", action="store_true", help="LLM_BACKEND=stub (no API key needed)")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PRELOAD_MODELS="")
+    if args.stub_llm:
+        env["LLM_BACKEND"] = "stub"
+
+    runs = []
+    for _ in range(args.runs):
+        run = {"import_s": round(measure_import(env), 3)}
+        run.update(measure_server(env, args.warmup, args.timeout))
+        runs.append(run)
+
+    healthy = statistics.median(run["healthy_s"] for run in runs)
+    summary = {
+        "import_s": statistics.median(run["import_s"] for run in runs),
+        "healthy_s": healthy,
+        "budget_s": args.budget,
+        "within_budget": healthy <= args.budget,
+    }
+    if args.warmup:
+        summary["warmup_s"] = statistics.median(run["warmup_s"] for run in runs)
+
+    print(json.dumps({"runs": runs, "summary": summary}, indent=2))
+    print(f"time to healthy {healthy:.2f}s (budget {args.budget:.2f}s)")
+    if not summary["within_budget"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
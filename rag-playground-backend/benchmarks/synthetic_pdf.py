@@ -0,0 +1,97 @@
+"""Deterministic text PDFs for benchmarks, written without any PDF library.
+
+Each page is one content stream of Helvetica text lines, enough for
+pdfplumber to extract. ``QUESTIONS`` are phrased around the same
+vocabulary so every retriever has something to find.
+
+    python benchmarks/synthetic_pdf.py --pages 50 --output /tmp/doc.pdf
+"""
+import argparse
+import random
+from typing import List
+
+TOPICS = [
+    ("revenue", "grew twelve percent in the third quarter driven by subscription renewals"),
+    ("latency", "of the search service stays under forty milliseconds at the median"),
+    ("retention", "improved after the onboarding flow was shortened to three steps"),
+    ("embedding model", "maps each passage to a vector of three hundred eighty four dimensions"),
+    ("storage cost", "fell when cold documents moved to compressed object storage"),
+    ("incident review", "found that the cache eviction policy caused the outage"),
+    ("hiring plan", "adds four engineers to the retrieval team next year"),
+    ("security audit", "requires rotating every service credential each quarter"),
+]
+FILLER = (
+    "the report notes that results depend on careful measurement and that each team "
+    "tracks its own metrics while sharing a common dashboard for weekly review"
+).split()
+
+QUESTIONS = [f"What does the document say about {topic}?" for topic, _ in TOPICS] + [
+    "Why did the outage happen?",
+    "How fast is the search service?",
+    "How many dimensions do the vectors have?",
+    "What changed in onboarding?",
+]
+
+
+def make_lines(pages: int, lines_per_page: int = 45, seed: int = 0) -> List[List[str]]:
+    rng = random.Random(seed)
+    result = []
+    for _ in range(pages):
+        lines = []
+        for _ in range(lines_per_page):
+            if rng.random() < 0.15:
+                topic, fact = rng.choice(TOPICS)
+                lines.append(f"The {topic} {fact}.")
+            else:
+                lines.append(" ".join(rng.choice(FILLER) for _ in range(rng.randint(8, 14))).capitalize() + ".")
+        result.append(lines)
+    return result
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: int, lines_per_page: int = 45, seed: int = 0) -> bytes:
+    """A ``pages``-page PDF of synthetic text, identical for the same arguments."""
+    page_lines = make_lines(pages, lines_per_page, seed)
+    # 1 catalog, 2 page tree, 3 font, then a (page, content) pair per page
+    page_ids = [4 + 2 * i for i in range(pages)]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{i} 0 R" for i in page_ids), pages)).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for page_id, lines in zip(page_ids, page_lines):
+        stream = "BT /F1 9 Tf 11 TL 40 800 Td\n" + "".join(f"({_escape(line)}) Tj T*\n" for line in lines) + "ET"
+        stream = stream.encode("latin-1")
+        objects.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        ).encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+    with open(args.output, "wb") as f:
+        f.write(make_pdf(args.pages, seed=args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import sys
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+
+class BM25Index:
+    """Okapi BM25 over a sparse term-by-chunk weight matrix.
+
+    Every BM25 term weight ``idf * tf * (k1 + 1) / (tf + k1 * norm)`` is
+    computed once at build time, so a query is a sparse vector of query
+    term counts multiplied into the matrix: one vectorized pass instead of
+    a Python loop over the vocabulary. Scores are the same as
+    ``rank_bm25.BM25Okapi`` (including its floor for negative IDFs), and
+    the arrays save to a single ``.npz`` with no pickle.
+    """
+
+    def __init__(self, vocabulary: Dict[str, int], weights: sparse.csr_matrix):
+        self.vocabulary = vocabulary
+        # Shape (terms, chunks), so a query selects whole rows
+        self.weights = weights
+
+    @property
+    def chunks(self) -> int:
+        return self.weights.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        # Vocabulary dict plus its term strings (term ids are near enough free)
+        vocabulary = sys.getsizeof(self.vocabulary) + sum(sys.getsizeof(term) for term in self.vocabulary)
+        return vocabulary + self.weights.data.nbytes + self.weights.indices.nbytes + self.weights.indptr.nbytes
+
+    @classmethod
+    def build(cls, corpus: Sequence[Sequence[str]], k1: float = 1.5, b: float = 0.75,
+              epsilon: float = 0.25) -> "BM25Index":
+        """Index tokenized chunks; parameters as in ``BM25Okapi``."""
+        vocabulary: Dict[str, int] = {}
+        term_ids: List[int] = []
+        chunk_ids: List[int] = []
+        lengths = np.zeros(len(corpus), dtype=np.float64)
+        for chunk, tokens in enumerate(corpus):
+            lengths[chunk] = len(tokens)
+            for token in tokens:
+                term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+            chunk_ids.extend([chunk] * len(tokens))
+
+        # Duplicate (term, chunk) entries are summed into term frequencies
+        tf = sparse.csr_matrix(
+            (np.ones(len(term_ids), dtype=np.float64), (term_ids, chunk_ids)),
+            shape=(len(vocabulary), len(corpus)),
+        )
+        tf.sum_duplicates()
+
+        n = len(corpus)
+        document_frequency = np.diff(tf.indptr)
+        idf = np.log(n - document_frequency + 0.5) - np.log(document_frequency + 0.5)
+        if len(idf):
+            idf[idf < 0] = epsilon * idf.mean()
+
+        average_length = lengths.mean() if n else 0.0
+        norm = k1 * (1 - b + b * lengths / (average_length or 1.0))
+        chunk_of_entry = tf.indices
+        term_of_entry = np.repeat(np.arange(tf.shape[0]), document_frequency)
+        data = idf[term_of_entry] * tf.data * (k1 + 1) / (tf.data + norm[chunk_of_entry])
+        weights = sparse.csr_matrix((data.astype(np.float32), tf.indices, tf.indptr), shape=tf.shape)
+        return cls(vocabulary, weights)
+
+    def query_matrix(self, queries: Sequence[Sequence[str]]) -> sparse.csr_matrix:
+        """Query term counts, one row per query; unknown terms drop out."""
+        rows, cols = [], []
+        for row, tokens in enumerate(queries):
+            for token in tokens:
+                term = self.vocabulary.get(token)
+                if term is not None:
+                    rows.append(row)
+                    cols.append(term)
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(len(queries), len(self.vocabulary)),
+        )
+
+    def scores(self, queries: Sequence[Sequence[str]]) -> np.ndarray:
+        """Dense ``(queries, chunks)`` BM25 scores."""
+        return (self.query_matrix(queries) @ self.weights).toarray()
+
+    def top_k(self, queries: Sequence[Sequence[str]], k: int) -> List[List[Tuple[int, float]]]:
+        """``(chunk, score)`` of the ``k`` best chunks per query, best first."""
+        scores = self.scores(queries)
+        k = min(k, self.chunks)
+        results = []
+        for row in scores:
+            if k < len(row):
+                top = np.argpartition(-row, k - 1)[:k]
+                # Best first; ties go to the lower chunk
+                top = top[np.lexsort((top, -row[top]))]
+            else:
+                top = np.argsort(-row, kind="stable")
+            results.append([(int(i), float(row[i])) for i in top])
+        return results
+
+    def save(self, path: str):
+        terms = np.empty(len(self.vocabulary), dtype=object)
+        for term, i in self.vocabulary.items():
+            terms[i] = term
+        np.savez(
+            path,
+            terms=terms.astype(str),
+            data=self.weights.data,
+            indices=self.weights.indices,
+            indptr=self.weights.indptr,
+            shape=np.array(self.weights.shape),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        arrays = np.load(path)
+        vocabulary = {str(term): i for i, term in enumerate(arrays["terms"])}
+        weights = sparse.csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]), shape=tuple(arrays["shape"])
+        )
+        return cls(vocabulary, weights)
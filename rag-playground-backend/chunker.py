@@ -0,0 +1,120 @@
+import sys
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+import numpy as np
+import tiktoken
+
+ENCODING_NAME = "cl100k_base"
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = ENCODING_NAME) -> tiktoken.Encoding:
+    return tiktoken.get_encoding(name)
+
+@lru_cache(maxsize=None)
+def _token_byte_lengths(name: str = ENCODING_NAME) -> np.ndarray:
+    """UTF-8 byte length of every token id, built once per process."""
+    encoding = get_encoding(name)
+    lengths = np.zeros(encoding.n_vocab, dtype=np.int64)
+    for token in range(encoding.n_vocab):
+        try:
+            lengths[token] = len(encoding.decode_single_token_bytes(token))
+        except KeyError:
+            pass  # unused ids between the regular and special tokens
+    return lengths
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode_ordinary(text))
+
+
+class ChunkSet:
+    """Chunks of one text stored as parallel arrays.
+
+    ``starts``/``ends`` are character offsets into ``text``, ``token_counts``
+    the tokens in each chunk and ``pages`` the page each chunk starts on
+    (0 when unknown). LangChain ``Document`` objects are only created by
+    ``document(i)``, i.e. for chunks that are actually returned as sources.
+    """
+
+    def __init__(self, text: str, starts: np.ndarray, ends: np.ndarray, token_counts: np.ndarray, pages: np.ndarray):
+        self.text = text
+        self.starts = starts
+        self.ends = ends
+        self.token_counts = token_counts
+        self.pages = pages
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def chunk_text(self, i: int) -> str:
+        return self.text[self.starts[i]:self.ends[i]]
+
+    def texts(self) -> List[str]:
+        return [self.text[start:end] for start, end in zip(self.starts.tolist(), self.ends.tolist())]
+
+    @property
+    def total_tokens(self) -> int:
+        return int(self.token_counts.sum())
+
+    @property
+    def nbytes(self) -> int:
+        arrays = self.starts.nbytes + self.ends.nbytes + self.token_counts.nbytes + self.pages.nbytes
+        return arrays + sys.getsizeof(self.text)
+
+    def document(self, i: int):
+        from langchain_core.documents import Document
+
+        i = int(i)
+        return Document(
+            page_content=self.chunk_text(i),
+            metadata={
+                "chunk": i,
+                "page": int(self.pages[i]) or None,
+                "start_index": int(self.starts[i]),
+                "tokens": int(self.token_counts[i])
+            }
+        )
+
+    def save(self, path: str):
+        np.savez(path, starts=self.starts, ends=self.ends, token_counts=self.token_counts, pages=self.pages)
+
+    @classmethod
+    def load(cls, path: str, text: str) -> "ChunkSet":
+        arrays = np.load(path)
+        return cls(text, arrays["starts"], arrays["ends"], arrays["token_counts"], arrays["pages"])
+
+
+class TokenChunker:
+    """Fixed-size token windows with token overlap, from one tokenization.
+
+    The text is encoded once; token boundaries are mapped to character
+    offsets with NumPy (per-token byte lengths, then a prefix count of
+    UTF-8 character starts), so there is no per-token Python loop.
+    """
+
+    def __init__(self, chunk_tokens: int = 128, overlap_tokens: int = 16, encoding_name: str = ENCODING_NAME):
+        if not 0 <= overlap_tokens < chunk_tokens:
+            raise ValueError("overlap_tokens must be >= 0 and smaller than chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.encoding_name = encoding_name
+
+    def split(self, text: str, page_at: Optional[Callable[[int], Optional[int]]] = None) -> ChunkSet:
+        tokens = np.asarray(get_encoding(self.encoding_name).encode_ordinary(text), dtype=np.int64)
+        n = len(tokens)
+        stride = self.chunk_tokens - self.overlap_tokens
+        token_starts = np.arange(0, max(n - self.overlap_tokens, 1), stride, dtype=np.int64) if n else np.zeros(0, dtype=np.int64)
+        token_ends = np.minimum(token_starts + self.chunk_tokens, n)
+
+        # Token index -> byte offset -> character offset
+        byte_offsets = np.concatenate(([0], np.cumsum(_token_byte_lengths(self.encoding_name)[tokens])))
+        data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+        char_at_byte = np.concatenate(([0], np.cumsum((data & 0xC0) != 0x80)))
+        starts = char_at_byte[byte_offsets[token_starts]]
+        ends = char_at_byte[byte_offsets[token_ends]]
+
+        if page_at is not None:
+            pages = np.fromiter((page_at(start) or 0 for start in starts.tolist()), dtype=np.int32, count=len(starts))
+        else:
+            pages = np.zeros(len(starts), dtype=np.int32)
+        return ChunkSet(text, starts, ends, (token_ends - token_starts).astype(np.int32), pages)
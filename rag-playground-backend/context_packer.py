@@ -0,0 +1,110 @@
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from chunker import count_tokens, get_encoding
+
+# Token budget for the retrieved context in each prompt
+MAX_CONTEXT_TOKENS = int(os.getenv("MAX_CONTEXT_TOKENS", "2000"))
+# A chunk sharing at least this fraction of its characters with one already
+# packed is a near-duplicate (neighbouring chunks overlap by design)
+DUPLICATE_OVERLAP = float(os.getenv("CONTEXT_DUPLICATE_OVERLAP", "0.5"))
+# Don't bother trimming a boundary chunk down to fewer tokens than this
+MIN_TRIM_TOKENS = 32
+
+SEPARATOR = "\n\n"
+PROMPT_TEMPLATE = "Question: {question}\nContext: {context}\nAnswer concisely:"
+_TEMPLATE_TOKENS = None
+
+
+class PackedContext:
+    """The context text for a prompt and what went into it."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.docs: List = []
+        self.tokens = 0
+        self.skipped = 0
+        self.trimmed = False
+        self.duration = 0.0
+
+    @property
+    def text(self) -> str:
+        return SEPARATOR.join(self.parts)
+
+    def prompt(self, question: str) -> Tuple[str, int]:
+        """Prompt for ``question`` and its token count (the context is not re-encoded)."""
+        global _TEMPLATE_TOKENS
+        if _TEMPLATE_TOKENS is None:
+            _TEMPLATE_TOKENS = count_tokens(PROMPT_TEMPLATE.format(question="", context=""))
+        prompt = PROMPT_TEMPLATE.format(question=question, context=self.text)
+        # Separators are a token each; counts add up to within a token per join
+        tokens = _TEMPLATE_TOKENS + count_tokens(question) + self.tokens + max(len(self.parts) - 1, 0)
+        return prompt, tokens
+
+    def metadata(self, prompt_tokens: int) -> Dict:
+        return {
+            "prompt_tokens": prompt_tokens,
+            "context_tokens": self.tokens,
+            "context_chunks": len(self.docs),
+            "skipped_chunks": self.skipped,
+            "context_trimmed": self.trimmed,
+            "packing_ms": round(self.duration * 1000, 3),
+        }
+
+
+def _span(doc) -> Optional[Tuple[str, int, int]]:
+    start = doc.metadata.get("start_index")
+    if start is None:
+        return None
+    return doc.metadata.get("doc_id", ""), start, start + len(doc.page_content)
+
+
+def _overlap(span: Tuple[str, int, int], packed: Sequence[Tuple[str, int, int]]) -> int:
+    source, start, end = span
+    return max(
+        (min(end, other_end) - max(start, other_start) for other_source, other_start, other_end in packed
+         if other_source == source),
+        default=0,
+    )
+
+
+def pack_context(docs: Sequence, max_tokens: int = MAX_CONTEXT_TOKENS) -> PackedContext:
+    """Greedily fill ``max_tokens`` with ``docs`` (best first).
+
+    Token counts come from chunking (``metadata["tokens"]``), so whole
+    chunks are never re-tokenized. Near-duplicates of packed chunks are
+    skipped; the first chunk that does not fit is trimmed to the remaining
+    budget, which is the only tokenizer call, and packing stops there.
+    """
+    start_time = time.perf_counter()
+    packed = PackedContext()
+    spans = []
+    seen = set()
+    for doc in docs:
+        text = doc.page_content
+        span = _span(doc)
+        if text in seen or (span is not None and _overlap(span, spans) >= DUPLICATE_OVERLAP * max(len(text), 1)):
+            packed.skipped += 1
+            continue
+        tokens = doc.metadata.get("tokens")
+        if tokens is None:
+            tokens = count_tokens(text)
+        remaining = max_tokens - packed.tokens
+        if tokens > remaining:
+            if remaining >= MIN_TRIM_TOKENS or not packed.parts:
+                encoding = get_encoding()
+                text = encoding.decode(encoding.encode_ordinary(text)[:remaining])
+                packed.parts.append(text)
+                packed.docs.append(doc)
+                packed.tokens += remaining
+                packed.trimmed = True
+            break
+        packed.parts.append(text)
+        packed.docs.append(doc)
+        packed.tokens += tokens
+        seen.add(doc.page_content)
+        if span is not None:
+            spans.append(span)
+    packed.duration = time.perf_counter() - start_time
+    return packed
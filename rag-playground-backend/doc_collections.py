@@ -0,0 +1,405 @@
+import bisect
+import fcntl
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from chunker import ChunkSet, TokenChunker
+from instrumentation import span
+from memory_manager import MemoryManager
+from pipeline import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, FlatIndex
+from utils import PDF_WORKERS, extract_document
+
+logger = logging.getLogger(__name__)
+
+# Exact search up to this many chunks, an ANN index beyond it
+ANN_THRESHOLD = int(os.getenv("COLLECTION_ANN_THRESHOLD", "50000"))
+ANN_INDEX = os.getenv("COLLECTION_ANN_INDEX", "hnsw")  # or "ivfpq"
+HNSW_M = int(os.getenv("COLLECTION_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("COLLECTION_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("COLLECTION_HNSW_EF_SEARCH", "64"))
+IVF_NPROBE = int(os.getenv("COLLECTION_IVF_NPROBE", "16"))
+PQ_M = int(os.getenv("COLLECTION_PQ_M", "48"))  # subquantizers; must divide the dimension
+IVF_TRAIN_SAMPLE = 100_000
+# ANN hits are re-scored exactly against the stored vectors; fetch this many times k
+REFINE_FACTOR = int(os.getenv("COLLECTION_REFINE_FACTOR", "4"))
+# Filters matching at most this many rows are searched exactly, whatever the index
+FILTER_EXACT_MAX = int(os.getenv("COLLECTION_FILTER_EXACT_MAX", "20000"))
+
+# Collections take whole documents; MAX_TEXT_LENGTH only applies to /query
+COLLECTION_MAX_CHARS = int(os.environ["COLLECTION_MAX_CHARS"]) if os.getenv("COLLECTION_MAX_CHARS") else None
+
+MANIFEST_FILE = "collection.json"
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.faiss"
+LOCK_FILE = ".lock"
+DOCS_DIR = "docs"
+
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def make_ann_index(kind: str, dim: int, train_vectors: Optional[np.ndarray] = None):
+    """Empty ANN index of ``kind`` ("hnsw" or "ivfpq"); IVF-PQ is trained on ``train_vectors``."""
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+    if kind == "ivfpq":
+        if train_vectors is None or len(train_vectors) == 0:
+            raise ValueError("IVF-PQ needs training vectors")
+        # ~4*sqrt(n) lists, but at least 39 training points per list
+        nlist = max(1, min(int(4 * math.sqrt(len(train_vectors))), len(train_vectors) // 39))
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, PQ_M, 8)
+        index.train(np.ascontiguousarray(train_vectors, dtype=np.float32))
+        index.nprobe = min(IVF_NPROBE, nlist)
+        return index
+    raise ValueError(f"Unknown ANN index: {kind}")
+
+
+def search_parameters(index, selector=None, candidates: int = 0):
+    """Search parameters for ``index``, restricted to the ids ``selector`` accepts."""
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=max(index.hnsw.efSearch, candidates))
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+
+def ann_search(index, vectors: np.ndarray, query: np.ndarray, k: int, selector=None) -> Tuple[np.ndarray, np.ndarray]:
+    """``index.search`` for ``REFINE_FACTOR * k`` candidates, re-ranked by exact distance.
+
+    ``vectors`` holds the full-precision rows (the memmap), so PQ error and
+    HNSW misorderings among the candidates cost nothing.
+    """
+    candidates = k * max(REFINE_FACTOR, 1)
+    _, ids = index.search(query, candidates, params=search_parameters(index, selector, candidates))
+    found = ids[0][(ids[0] >= 0) & (ids[0] < len(vectors))]
+    if len(found) == 0:
+        return np.empty((1, 0), dtype=np.float32), np.empty((1, 0), dtype=np.int64)
+    order = np.sort(found)  # sequential reads from the memmap
+    distances = ((np.asarray(vectors[order]) - query) ** 2).sum(axis=1)
+    best = np.argsort(distances)[:k]
+    return distances[best].reshape(1, -1), order[best].reshape(1, -1)
+
+
+class Collection:
+    """A named set of documents searched as one vector index.
+
+    Documents are added one PDF at a time. Each one's text and chunk
+    arrays live in ``docs/<doc_id>/``; its vectors are appended to one
+    float32 file, so a document owns a contiguous range of rows and row
+    number == index id. Up to ``ANN_THRESHOLD`` rows are searched exactly
+    (straight off the memory-mapped file); past it an HNSW or IVF-PQ index
+    is built once and then only extended; its candidates are re-scored
+    against the exact vectors. Per-document filters search the selected
+    rows exactly, or pass a row selector to the index when they are large.
+
+    Writers hold an flock on the collection, and other processes pick up
+    changes through the manifest's mtime. A loaded ANN index is tracked by
+    ``memory``, which may ``release()`` it; the next search reloads it.
+    """
+
+    def __init__(self, root: str, name: str, embeddings, memory: Optional[MemoryManager] = None):
+        self.name = name
+        self.memory = memory
+        self.path = os.path.join(root, name)
+        self.embeddings = embeddings
+        self.chunker = TokenChunker(CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+        self.documents: "OrderedDict[str, Dict]" = OrderedDict()
+        self.rows = 0
+        self.dim: Optional[int] = None
+        self.index_kind = "flat"
+        self.index = None
+        self._starts: List[int] = []
+        self._doc_ids: List[str] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._chunks: "OrderedDict[str, ChunkSet]" = OrderedDict()
+        self._manifest_mtime = None
+        self._lock = threading.RLock()
+        os.makedirs(os.path.join(self.path, DOCS_DIR), exist_ok=True)
+        with self._lock:
+            self._refresh()
+
+    @property
+    def doc_id(self) -> str:
+        # Cache scope for LLM answers; changes whenever documents are added
+        return f"collection:{self.name}:{self.rows}"
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _refresh(self):
+        """Reload the manifest if this or another process changed it. Caller holds self._lock."""
+        try:
+            mtime = os.path.getmtime(self._file(MANIFEST_FILE))
+        except OSError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+        with open(self._file(MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.dim = manifest["dim"]
+        self.rows = manifest["rows"]
+        self.index_kind = manifest["index"]
+        self.documents = OrderedDict((doc["doc_id"], doc) for doc in manifest["documents"])
+        self._starts = [doc["start"] for doc in self.documents.values()]
+        self._doc_ids = list(self.documents)
+        self._vectors = None
+        self.index = None
+        if self.index_kind != "flat":
+            self.index = faiss.read_index(self._file(INDEX_FILE))
+            self._track_index()
+        self._manifest_mtime = mtime
+
+    def _track_index(self):
+        # Caller holds self._lock; the saved index is about its size in memory
+        if self.memory is not None:
+            self.memory.track("collection_indexes", self.name, os.path.getsize(self._file(INDEX_FILE)), self.release)
+
+    def release(self):
+        """Drop the loaded index and cached chunks; they reload on next use."""
+        with self._lock:
+            self.index = None
+            self._vectors = None
+            self._chunks.clear()
+            self._manifest_mtime = None
+
+    def _vector_map(self) -> np.ndarray:
+        # Caller holds self._lock. Rows past the manifest's count are ignored.
+        if self._vectors is None:
+            if self.rows == 0:
+                return np.zeros((0, self.dim or 0), dtype=np.float32)
+            self._vectors = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode="c", shape=(self.rows, self.dim))
+        return self._vectors
+
+    def _save_manifest(self):
+        tmp_path = self._file(f"{MANIFEST_FILE}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "name": self.name,
+                "dim": self.dim,
+                "rows": self.rows,
+                "index": self.index_kind,
+                "documents": list(self.documents.values()),
+            }, f)
+        os.replace(tmp_path, self._file(MANIFEST_FILE))
+        self._manifest_mtime = os.path.getmtime(self._file(MANIFEST_FILE))
+
+    def add(self, content: bytes, filename: Optional[str], doc_id: str) -> Tuple[Dict, bool]:
+        """Ingest one PDF; returns ``(document entry, added)``. Re-adding is a no-op.
+
+        Extraction, chunking and embedding run before any lock is taken;
+        only appending the vectors and writing the manifest hold it, so
+        searches and stats keep going during an ingest.
+        """
+        with self._lock:
+            self._refresh()
+            if doc_id in self.documents:
+                return self.documents[doc_id], False
+
+        steps = []
+        with span("extraction", steps):
+            pages = extract_document(content, max_chars=COLLECTION_MAX_CHARS, workers=PDF_WORKERS)
+        with span("text_processing", steps):
+            chunks = self.chunker.split(pages.text, pages.page_at)
+        with span("embedding", steps):
+            vectors = np.asarray(self.embeddings.embed_documents(chunks.texts()), dtype=np.float32)
+
+        with self._lock, open(self._file(LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._refresh()
+            if doc_id in self.documents:
+                return self.documents[doc_id], False  # added meanwhile
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection ({self.dim})")
+
+            doc_path = os.path.join(self.path, DOCS_DIR, doc_id)
+            os.makedirs(doc_path, exist_ok=True)
+            with open(os.path.join(doc_path, "text.txt"), "w", encoding="utf-8") as f:
+                f.write(pages.text)
+            chunks.save(os.path.join(doc_path, "chunks.npz"))
+
+            with span("indexing", steps):
+                start = self.rows
+                with open(self._file(VECTORS_FILE), "ab") as f:
+                    # Drop rows a crashed writer appended without a manifest entry
+                    f.truncate(start * self.dim * 4)
+                    f.write(vectors.tobytes())
+                self._extend_index(vectors)
+
+            entry = {
+                "doc_id": doc_id,
+                "filename": filename,
+                "start": start,
+                "chunks": len(chunks),
+                "characters": len(pages.text),
+                "pages": len(pages.page_numbers),
+                "added": time.time(),
+                "steps": steps,
+            }
+            self.documents[doc_id] = entry
+            self._starts.append(start)
+            self._doc_ids.append(doc_id)
+            self.rows = start + len(chunks)
+            self._vectors = None
+            self._save_manifest()
+            logger.info(f"Added {doc_id} ({len(chunks)} chunks) to collection {self.name}; {self.rows} rows")
+        if self.memory is not None:
+            self.memory.enforce()
+        return entry, True
+
+    def _extend_index(self, vectors: np.ndarray):
+        # Caller holds self._lock and the flock; self.rows is still the old count
+        if self.index_kind == "flat":
+            if self.rows + len(vectors) < ANN_THRESHOLD:
+                return
+            # Crossing the threshold: build the ANN index over everything once
+            existing = np.asarray(self._vector_map())
+            everything = np.concatenate([existing, vectors]) if len(existing) else vectors
+            sample = everything
+            if len(sample) > IVF_TRAIN_SAMPLE:
+                sample = sample[np.random.default_rng(0).choice(len(sample), IVF_TRAIN_SAMPLE, replace=False)]
+            self.index = make_ann_index(ANN_INDEX, self.dim, sample)
+            self.index.add(everything)
+            self.index_kind = ANN_INDEX
+            logger.info(f"Collection {self.name} switched to a {ANN_INDEX} index at {len(everything)} rows")
+        else:
+            self.index.add(vectors)
+        tmp_path = self._file(f"{INDEX_FILE}.tmp")
+        faiss.write_index(self.index, tmp_path)
+        os.replace(tmp_path, self._file(INDEX_FILE))
+        self._track_index()
+
+    def _allowed_rows(self, doc_ids: Sequence[str]) -> np.ndarray:
+        unknown = [doc_id for doc_id in doc_ids if doc_id not in self.documents]
+        if unknown:
+            raise ValueError(f"Unknown documents in collection {self.name}: {', '.join(unknown)}")
+        return np.concatenate([
+            np.arange(self.documents[doc_id]["start"], self.documents[doc_id]["start"] + self.documents[doc_id]["chunks"])
+            for doc_id in doc_ids
+        ]).astype(np.int64)
+
+    def search(self, query_vector: np.ndarray, k: int = 4, doc_ids: Optional[Sequence[str]] = None) -> List[Tuple[int, float]]:
+        """``(row, squared L2 distance)`` of the nearest chunks, optionally within ``doc_ids``."""
+        query = np.ascontiguousarray(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))
+        with self._lock:
+            self._refresh()
+            if self.rows == 0:
+                return []
+            allowed = self._allowed_rows(doc_ids) if doc_ids else None
+            vectors = self._vector_map()
+            if allowed is not None and (self.index_kind == "flat" or len(allowed) <= FILTER_EXACT_MAX):
+                # Exact over the selected documents: cheaper and more accurate
+                # than a filtered graph/list walk when they are a small slice
+                subset = np.ascontiguousarray(vectors[allowed])
+                distances, ids = faiss.knn(query, subset, min(k, len(allowed)))
+                ids = np.where(ids >= 0, allowed[np.maximum(ids, 0)], -1)
+            elif self.index_kind == "flat":
+                distances, ids = FlatIndex(vectors).search(query, min(k, self.rows))
+            else:
+                selector = None
+                if allowed is not None:
+                    selector = faiss.IDSelectorBatch(len(allowed), faiss.swig_ptr(allowed))
+                distances, ids = ann_search(self.index, vectors, query, k, selector)
+        if self.memory is not None and self.index is not None:
+            self.memory.touch("collection_indexes", self.name)
+            self.memory.enforce()
+        return [(int(row), float(distance)) for distance, row in zip(distances[0], ids[0]) if row >= 0]
+
+    def document(self, row: int):
+        """LangChain Document for a row, with doc_id/filename in its metadata."""
+        with self._lock:
+            position = bisect.bisect_right(self._starts, row) - 1
+            doc_id = self._doc_ids[position]
+            entry = self.documents[doc_id]
+            chunks = self._chunks.get(doc_id)
+            if chunks is None:
+                doc_path = os.path.join(self.path, DOCS_DIR, doc_id)
+                with open(os.path.join(doc_path, "text.txt"), encoding="utf-8") as f:
+                    text = f.read()
+                chunks = ChunkSet.load(os.path.join(doc_path, "chunks.npz"), text)
+                self._chunks[doc_id] = chunks
+                while len(self._chunks) > 32:
+                    self._chunks.popitem(last=False)
+            self._chunks.move_to_end(doc_id)
+        doc = chunks.document(row - entry["start"])
+        doc.metadata.update(doc_id=doc_id, filename=entry["filename"], row=row)
+        return doc
+
+    def similarity_search(self, question: str, k: int = 4, doc_ids: Optional[Sequence[str]] = None):
+        vector = self.embeddings.embed_query(question)
+        return [(self.document(row), distance) for row, distance in self.search(vector, k, doc_ids)]
+
+    def stats(self, documents: bool = False) -> Dict:
+        """Sizes and index kind; ``documents`` adds the document entries."""
+        with self._lock:
+            self._refresh()
+            index_path = self._file(INDEX_FILE)
+            stats = {
+                "name": self.name,
+                "documents": len(self.documents),
+                "chunks": self.rows,
+                "index": self.index_kind,
+                "dim": self.dim,
+                "vectors_bytes": self.rows * (self.dim or 0) * 4,
+                "index_bytes": os.path.getsize(index_path) if self.index_kind != "flat" else 0,
+            }
+            if documents:
+                stats["documents"] = list(self.documents.values())
+            return stats
+
+
+class CollectionStore:
+    """Named collections under one directory, opened on first use."""
+
+    def __init__(self, root: str, embeddings, memory: Optional[MemoryManager] = None):
+        self.root = root
+        self.embeddings = embeddings
+        self.memory = memory
+        self._collections: Dict[str, Collection] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def get(self, name: str, create: bool = False) -> Optional[Collection]:
+        if not NAME_PATTERN.match(name):
+            raise ValueError("Collection names are 1-64 letters, digits, '-' or '_'")
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                if not create and not os.path.isdir(os.path.join(self.root, name)):
+                    return None
+                collection = self._collections[name] = Collection(self.root, name, self.embeddings, self.memory)
+            return collection
+
+    def names(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.root)
+            if NAME_PATTERN.match(name) and os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def delete(self, name: str) -> bool:
+        if not NAME_PATTERN.match(name):
+            raise ValueError("Collection names are 1-64 letters, digits, '-' or '_'")
+        with self._lock:
+            self._collections.pop(name, None)
+            if self.memory is not None:
+                self.memory.forget("collection_indexes", name)
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path):
+                return False
+            shutil.rmtree(path, ignore_errors=True)
+            return True
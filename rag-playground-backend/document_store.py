@@ -0,0 +1,226 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from memory_manager import MemoryManager
+from pipeline import DocumentPipeline, META_FILE, load_text, read_meta
+from utils import ExtractedText
+
+logger = logging.getLogger(__name__)
+
+
+def compute_doc_id(content: bytes) -> str:
+    """Content address of an uploaded PDF."""
+    return hashlib.sha256(content).hexdigest()
+
+
+class DocumentStore:
+    """Content-addressed, disk-backed cache of indexed documents.
+
+    Every document lives in ``<root>/<doc_id>/``. At most ``max_in_memory``
+    documents stay loaded (fewer when ``memory`` runs out of budget) and
+    the directory as a whole is capped at ``max_documents``; both tiers
+    evict least recently used first.
+    The on-disk LRU order is recovered from ``meta.json`` mtimes, so the
+    cache survives process restarts.
+
+    One PDF can have several entries, one per chunking/embedding variant;
+    ``embeddings_for`` maps a stored entry's model name to its engine
+    (``embeddings`` is used for entries without one).
+    """
+
+    def __init__(self, root: str, embeddings, max_documents: int = 50, max_in_memory: int = 8,
+                 memory: Optional[MemoryManager] = None, embeddings_for: Optional[Callable[[str], Any]] = None):
+        self.root = root
+        self.embeddings = embeddings
+        self.embeddings_for = embeddings_for
+        self.max_documents = max_documents
+        self.max_in_memory = max_in_memory
+        self.memory = memory
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._memory: "OrderedDict[str, DocumentPipeline]" = OrderedDict()
+        self._disk: "OrderedDict[str, float]" = OrderedDict()
+        os.makedirs(root, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            meta_path = os.path.join(path, META_FILE)
+            if os.path.isfile(meta_path):
+                entries.append((os.path.getmtime(meta_path), name))
+            elif not name.startswith(".tmp-") or time.time() - os.path.getmtime(path) > 3600:
+                # Leftover of an interrupted write
+                shutil.rmtree(path, ignore_errors=True)
+        for mtime, name in sorted(entries):
+            self._disk[name] = mtime
+        logger.info(f"Document store at {self.root} has {len(self._disk)} documents")
+
+    def _path(self, doc_id: str) -> str:
+        return os.path.join(self.root, doc_id)
+
+    def __contains__(self, doc_id: str) -> bool:
+        with self._lock:
+            return doc_id in self._disk or self._adopt(doc_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._disk)
+
+    def get(self, doc_id: str) -> Optional[DocumentPipeline]:
+        with self._lock:
+            if doc_id not in self._disk and not self._adopt(doc_id):
+                return None
+            self._touch(doc_id)
+            pipeline = self._memory.get(doc_id)
+            if pipeline is not None:
+                self._memory.move_to_end(doc_id)
+                if self.memory is not None:
+                    self.memory.touch("documents", doc_id)
+                return pipeline
+        try:
+            pipeline = self._load(doc_id)
+        except Exception as e:
+            logger.error(f"Failed to load document {doc_id}: {e}")
+            self.delete(doc_id)
+            return None
+        with self._lock:
+            self._remember(pipeline)
+        if self.memory is not None:
+            self.memory.enforce()
+        return pipeline
+
+    def get_or_create(self, doc_id: str, build: Callable[[], DocumentPipeline]) -> DocumentPipeline:
+        """Return the stored pipeline, building it with ``build()`` on a miss.
+
+        Concurrent uploads of the same PDF build it only once.
+        """
+        pipeline = self.get(doc_id)
+        if pipeline is not None:
+            return pipeline
+        with self._lock:
+            build_lock = self._build_locks.setdefault(doc_id, threading.Lock())
+        with build_lock:
+            pipeline = self.get(doc_id)
+            if pipeline is None:
+                pipeline = build()
+                pipeline.doc_id = doc_id
+                self.put(pipeline)
+        with self._lock:
+            self._build_locks.pop(doc_id, None)
+        return pipeline
+
+    def put(self, pipeline: DocumentPipeline):
+        final_path = self._path(pipeline.doc_id)
+        tmp_path = os.path.join(self.root, f".tmp-{pipeline.doc_id}-{os.getpid()}-{threading.get_ident()}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        try:
+            pipeline.save(tmp_path)
+            shutil.rmtree(final_path, ignore_errors=True)
+            os.replace(tmp_path, final_path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+        with self._lock:
+            self._disk[pipeline.doc_id] = time.time()
+            self._disk.move_to_end(pipeline.doc_id)
+            self._remember(pipeline)
+            evicted = self._evict()
+        if self.memory is not None:
+            self.memory.enforce()
+        for doc_id in evicted:
+            shutil.rmtree(self._path(doc_id), ignore_errors=True)
+            logger.info(f"Evicted document {doc_id} from store")
+
+    def delete(self, doc_id: str):
+        with self._lock:
+            self._disk.pop(doc_id, None)
+            self._unload(doc_id)
+        shutil.rmtree(self._path(doc_id), ignore_errors=True)
+
+    def source_text(self, source_id: str) -> Optional[Tuple[str, Optional[ExtractedText], List[Dict]]]:
+        """``(text, pages, steps)`` of any stored entry built from the PDF ``source_id``.
+
+        Lets a new variant of a known document skip PDF extraction.
+        """
+        with self._lock:
+            loaded = [p for p in self._memory.values() if (p.source_id or p.doc_id) == source_id]
+            if loaded:
+                return loaded[-1].text, loaded[-1].pages, loaded[-1].steps
+            keys = [source_id] if source_id in self._disk or self._adopt(source_id) else []
+            keys += [key for key in reversed(self._disk) if key != source_id]
+        for key in keys:
+            try:
+                meta = read_meta(self._path(key))
+                if (meta.get("source_id") or meta["doc_id"]) == source_id:
+                    text, pages = load_text(self._path(key), meta)
+                    return text, pages, meta["steps"]
+            except (OSError, ValueError, KeyError):
+                continue  # evicted or half-written meanwhile
+        return None
+
+    def _load(self, doc_id: str) -> DocumentPipeline:
+        path = self._path(doc_id)
+        embeddings = self.embeddings
+        model = read_meta(path).get("embedding_model") if self.embeddings_for is not None else None
+        if model:
+            embeddings = self.embeddings_for(model)
+        return DocumentPipeline.load(path, embeddings)
+
+    def _adopt(self, doc_id: str) -> bool:
+        # Caller holds self._lock. Picks up a document another worker
+        # process wrote after our _scan. doc_id comes from the client, so
+        # only well-formed ids ever reach the filesystem.
+        if len(doc_id) != 64 or not all(c in "0123456789abcdef" for c in doc_id):
+            return False
+        if not os.path.isfile(os.path.join(self._path(doc_id), META_FILE)):
+            return False
+        self._disk[doc_id] = time.time()
+        return True
+
+    def _touch(self, doc_id: str):
+        # Caller holds self._lock
+        self._disk[doc_id] = time.time()
+        self._disk.move_to_end(doc_id)
+        try:
+            os.utime(os.path.join(self._path(doc_id), META_FILE))
+        except OSError:
+            pass
+
+    def _remember(self, pipeline: DocumentPipeline):
+        # Caller holds self._lock
+        self._memory[pipeline.doc_id] = pipeline
+        self._memory.move_to_end(pipeline.doc_id)
+        if self.memory is not None:
+            self.memory.track("documents", pipeline.doc_id, pipeline.nbytes, lambda: self._release(pipeline))
+        while len(self._memory) > self.max_in_memory:
+            self._unload(next(iter(self._memory)))
+
+    def _unload(self, doc_id: str):
+        # Caller holds self._lock
+        self._memory.pop(doc_id, None)
+        if self.memory is not None:
+            self.memory.forget("documents", doc_id)
+
+    def _release(self, pipeline: DocumentPipeline):
+        # Budget eviction; a reload since then is a different object and stays
+        with self._lock:
+            if self._memory.get(pipeline.doc_id) is pipeline:
+                del self._memory[pipeline.doc_id]
+
+    def _evict(self) -> List[str]:
+        # Caller holds self._lock
+        evicted = []
+        while len(self._disk) > self.max_documents:
+            doc_id, _ = self._disk.popitem(last=False)
+            self._unload(doc_id)
+            evicted.append(doc_id)
+        return evicted
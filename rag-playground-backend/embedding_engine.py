@@ -0,0 +1,259 @@
+import fcntl
+import hashlib
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from batching import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 16
+
+# Sentences used to check a quantized model against full precision
+QUANTIZATION_PROBES = [
+    "Retrieval-augmented generation grounds answers in source documents.",
+    "The quarterly report shows revenue growth of twelve percent.",
+    "Install the package with pip and restart the server.",
+    "Photosynthesis converts light energy into chemical energy.",
+    "Section 4.2 describes the warranty terms and exclusions.",
+    "What is the maximum file size accepted by the upload endpoint?",
+]
+
+def chunk_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=HASH_SIZE).digest()
+
+
+class EmbeddingCache:
+    """Chunk-hash -> embedding cache backed by two append-only files.
+
+    ``<path>.keys`` holds 16-byte chunk hashes and ``<path>.f16`` the
+    matching float16 rows, read through a memory map so cached vectors
+    cost page cache rather than heap. Appends take an exclusive ``flock``
+    so several worker processes can share one cache.
+    """
+
+    def __init__(self, path: str, dim: int, max_entries: int = 1_000_000):
+        self.keys_path = path + ".keys"
+        self.vectors_path = path + ".f16"
+        self.dim = dim
+        self.max_entries = max_entries
+        self.row_bytes = dim * np.dtype(np.float16).itemsize
+        self._rows: Dict[bytes, int] = {}
+        self._count = 0  # rows on disk, including duplicate keys from racing writers
+        self._map: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        for file_path in (self.keys_path, self.vectors_path):
+            open(file_path, "ab").close()
+        with self._lock:
+            self._sync()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def nbytes(self) -> int:
+        # The hash -> row dict; vectors are mapped from the file (page cache)
+        return sys.getsizeof(self._rows) + len(self._rows) * (sys.getsizeof(bytes(HASH_SIZE)) + sys.getsizeof(2 ** 30))
+
+    def _sync(self):
+        """Pick up rows appended by this or another process."""
+        known = self._count
+        with open(self.keys_path, "rb") as f:
+            f.seek(known * HASH_SIZE)
+            data = f.read()
+        complete = min(
+            known + len(data) // HASH_SIZE,
+            os.path.getsize(self.vectors_path) // self.row_bytes
+        )
+        for row in range(known, complete):
+            offset = (row - known) * HASH_SIZE
+            self._rows.setdefault(data[offset:offset + HASH_SIZE], row)
+        if complete != known:
+            self._count = complete
+            self._map = None
+
+    def _vectors(self) -> np.memmap:
+        if self._map is None:
+            rows = os.path.getsize(self.vectors_path) // self.row_bytes
+            self._map = np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(rows, self.dim))
+        return self._map
+
+    def get_many(self, hashes: List[bytes]) -> Dict[bytes, np.ndarray]:
+        with self._lock:
+            self._sync()
+            rows = {h: self._rows[h] for h in hashes if h in self._rows}
+            if not rows:
+                return {}
+            vectors = self._vectors()
+            return {h: np.asarray(vectors[row], dtype=np.float32) for h, row in rows.items()}
+
+    def put_many(self, hashes: List[bytes], vectors: np.ndarray):
+        with self._lock:
+            with open(self.keys_path, "ab") as keys_file:
+                fcntl.flock(keys_file, fcntl.LOCK_EX)
+                try:
+                    self._sync()
+                    new = [(h, v) for h, v in zip(hashes, vectors) if h not in self._rows]
+                    new = new[:max(0, self.max_entries - self._count)]
+                    if not new:
+                        return
+                    start = self._count
+                    with open(self.vectors_path, "r+b") as vectors_file:
+                        # Drop rows a crashed writer left without keys
+                        vectors_file.truncate(start * self.row_bytes)
+                        vectors_file.seek(start * self.row_bytes)
+                        vectors_file.write(np.asarray([v for _, v in new], dtype=np.float16).tobytes())
+                    # Keys go last, so a key never points at a missing row
+                    keys_file.write(b"".join(h for h, _ in new))
+                    keys_file.flush()
+                    for offset, (h, _) in enumerate(new):
+                        self._rows[h] = start + offset
+                    self._count = start + len(new)
+                    self._map = None
+                finally:
+                    fcntl.flock(keys_file, fcntl.LOCK_UN)
+
+
+class EmbeddingEngine:
+    """Batched sentence-transformers encoder with an optional chunk cache.
+
+    ``backend="quantized"`` applies int8 dynamic quantization to the model's
+    Linear layers. The quantized model is only kept if its embeddings for
+    ``QUANTIZATION_PROBES`` stay within ``tolerance`` cosine similarity of
+    the full-precision model; otherwise the engine falls back to float32.
+
+    Query encodes from concurrent callers are coalesced by a
+    ``MicroBatcher`` (``batch_wait_ms=0`` turns that off).
+    """
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        batch_size: int = 64,
+        backend: str = "torch",
+        cache_dir: Optional[str] = None,
+        tolerance: float = 0.99,
+        batch_wait_ms: float = 0.0,
+    ):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        # Recent question vectors: retrieval and the LLM cache share them
+        self._queries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._queries_lock = threading.Lock()
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.backend = "torch"
+        if backend == "quantized":
+            self._quantize(tolerance)
+        elif backend != "torch":
+            raise ValueError(f"Unknown embedding backend: {backend}")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.query_batcher = MicroBatcher(
+            self._encode, max_batch_size=batch_size, max_wait_ms=batch_wait_ms, name="query-embed"
+        )
+
+        self.cache = None
+        if cache_dir:
+            safe_name = model_name.replace("/", "__")
+            self.cache = EmbeddingCache(os.path.join(cache_dir, f"{safe_name}-{self.backend}"), self.dim)
+
+    def _quantize(self, tolerance: float):
+        import torch
+
+        reference = self._encode(QUANTIZATION_PROBES)
+        quantized = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        candidate = self._encode(QUANTIZATION_PROBES, model=quantized)
+        similarity = np.sum(reference * candidate, axis=1) / (
+            np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+        )
+        if similarity.min() < tolerance:
+            logger.warning(
+                f"Quantized {self.model_name} drifted to cosine {similarity.min():.4f} "
+                f"(< {tolerance}); using full precision"
+            )
+            return
+        logger.info(f"Using int8 {self.model_name}, min probe cosine {similarity.min():.4f}")
+        self.model = quantized
+        self.backend = "quantized"
+
+    def _encode(self, texts: List[str], model=None) -> np.ndarray:
+        vectors = (model if model is not None else self.model).encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        # Same newline handling as langchain's HuggingFaceEmbeddings
+        texts = [text.replace("\n", " ") for text in texts]
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        hashes = [chunk_hash(text) for text in texts]
+        found = self.cache.get_many(hashes) if self.cache is not None else {}
+
+        # Encode each distinct missing chunk once, in a single batched call
+        missing: Dict[bytes, str] = {}
+        for h, text in zip(hashes, texts):
+            if h not in found and h not in missing:
+                missing[h] = text
+        if missing:
+            encoded = self._encode(list(missing.values()))
+            if self.cache is not None:
+                # Round like cached rows so results don't depend on cache state
+                encoded = encoded.astype(np.float16).astype(np.float32)
+            found.update(zip(missing.keys(), encoded))
+            if self.cache is not None:
+                self.cache.put_many(list(missing.keys()), encoded)
+
+        return np.stack([found[h] for h in hashes])
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """Batched encode that bypasses the chunk cache (questions, answers)."""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return self.query_batcher([text.replace("\n", " ") for text in texts])
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed_query_many([text])[0]
+
+    def embed_query_many(self, texts: List[str]) -> np.ndarray:
+        """Question vectors, remembered so retrieval and the LLM cache share them.
+
+        Questions not seen recently are encoded together in one batch.
+        """
+        found: Dict[str, np.ndarray] = {}
+        with self._queries_lock:
+            for text in texts:
+                vector = self._queries.get(text)
+                if vector is not None:
+                    self._queries.move_to_end(text)
+                    found[text] = vector
+        missing = list(dict.fromkeys(text for text in texts if text not in found))
+        if missing:
+            found.update(zip(missing, self.embed_queries(missing)))
+            with self._queries_lock:
+                for text in missing:
+                    self._queries[text] = found[text]
+                # Keep at least a whole batch of questions
+                while len(self._queries) > max(256, len(missing)):
+                    self._queries.popitem(last=False)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([found[text] for text in texts])
+
+    def cache_nbytes(self) -> int:
+        """Bytes held in memory by the question vectors and the chunk cache's key index."""
+        with self._queries_lock:
+            queries = sum(sys.getsizeof(text) + vector.nbytes for text, vector in self._queries.items())
+        return queries + (self.cache.nbytes if self.cache is not None else 0)
@@ -0,0 +1,220 @@
+import bisect
+import os
+import random
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Fraction of spans that also measure allocations and RSS. tracemalloc
+# slows every allocation while it runs, so it is only on during a sampled span.
+MEMORY_SAMPLE_RATE = float(os.getenv("METRICS_MEMORY_SAMPLE_RATE", "0.05"))
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTE_BUCKETS = tuple(2 ** power for power in range(12, 32, 2))  # 4 KiB .. 1 GiB
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def process_rss() -> int:
+    """Resident set size of this process in bytes (0 where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def _label_key(names: Sequence[str], labels: Dict[str, str]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in names)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labels, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Gauge:
+    """Value read from ``read()`` at scrape time."""
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value:g}"]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float], labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        # label values -> (per-bucket counts incl. +Inf, sum)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labels, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    bucket_labels = _format_labels(self.labels, key, 'le="%s"' % le)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total[0]:g}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """In-process metrics, rendered in the Prometheus text format.
+
+    Values are per process; under serve.py each worker keeps its own.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        return self._add(Gauge(name, help, read))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = DURATION_BUCKETS,
+                  labels: Sequence[str] = ()) -> Histogram:
+        return self._add(Histogram(name, help, buckets, labels))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_duration_seconds", "Time spent in each pipeline stage.", DURATION_BUCKETS, ("stage",)
+)
+STAGE_ALLOC_BYTES = REGISTRY.histogram(
+    "rag_stage_alloc_peak_bytes", "Peak Python allocations during a stage (sampled).", BYTE_BUCKETS, ("stage",)
+)
+STAGE_ERRORS = REGISTRY.counter("rag_stage_errors_total", "Stages that raised.", ("stage",))
+REGISTRY.gauge("rag_process_resident_bytes", "Resident set size of this process.", process_rss)
+
+_trace_lock = threading.Lock()
+_trace_users = 0
+_trace_owned = False
+
+
+def _start_tracing():
+    global _trace_users, _trace_owned
+    with _trace_lock:
+        if _trace_users == 0:
+            # Leave tracing alone if someone else (e.g. -X tracemalloc) started it
+            _trace_owned = not tracemalloc.is_tracing()
+            if _trace_owned:
+                tracemalloc.start()
+        _trace_users += 1
+
+
+def _stop_tracing():
+    global _trace_users
+    with _trace_lock:
+        _trace_users -= 1
+        if _trace_users == 0 and _trace_owned:
+            tracemalloc.stop()
+
+
+class span:
+    """Times a stage, records it in the histograms and optionally in ``steps``.
+
+    Works as ``with`` and ``async with``; yields the step dict so callers
+    can attach fields (e.g. chunk counts). The step is appended to
+    ``steps`` only if the block succeeds. Sampled spans also report
+    ``alloc_bytes``/``alloc_peak_bytes`` (tracemalloc) and ``rss_delta``.
+    tracemalloc is process-wide, so concurrent stages share the numbers.
+    """
+
+    def __init__(self, name: str, steps: Optional[List[Dict]] = None, sample_rate: float = None):
+        self.name = name
+        self.steps = steps
+        self.sample_rate = MEMORY_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.step: Dict = {"name": name}
+
+    def __enter__(self) -> Dict:
+        self.sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if self.sampled:
+            _start_tracing()
+            tracemalloc.reset_peak()
+            self._alloc = tracemalloc.get_traced_memory()[0]
+            self._rss = process_rss()
+        self._start = time.perf_counter()
+        return self.step
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        self.step["duration"] = duration
+        STAGE_SECONDS.observe(duration, stage=self.name)
+        if self.sampled:
+            current, peak = tracemalloc.get_traced_memory()
+            _stop_tracing()
+            self.step["alloc_bytes"] = current - self._alloc
+            self.step["alloc_peak_bytes"] = max(peak - self._alloc, 0)
+            self.step["rss_delta"] = process_rss() - self._rss
+            STAGE_ALLOC_BYTES.observe(self.step["alloc_peak_bytes"], stage=self.name)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(stage=self.name)
+        elif self.steps is not None:
+            self.steps.append(self.step)
+        return False
+
+    async def __aenter__(self) -> Dict:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
@@ -0,0 +1,251 @@
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from instrumentation import DURATION_BUCKETS, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+FINISHED = ("done", "failed", "cancelled", "expired")
+
+JOB_WAIT_SECONDS = REGISTRY.histogram(
+    "rag_job_wait_seconds", "Time jobs spent queued before a worker took them.", DURATION_BUCKETS + (120, 300),
+    ("priority",)
+)
+JOB_SECONDS = REGISTRY.histogram(
+    "rag_job_duration_seconds", "Time from a worker taking a job to its end.", DURATION_BUCKETS + (120, 300),
+    ("priority", "status")
+)
+JOBS_TOTAL = REGISTRY.counter("rag_jobs_total", "Jobs by final status.", ("priority", "status"))
+JOBS_REJECTED = REGISTRY.counter("rag_jobs_rejected_total", "Jobs refused because the queue was full.", ("priority",))
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    """One queued unit of work and its state.
+
+    ``run(job)`` may put partial output in ``job.progress``; it is kept
+    when the job is cancelled or runs past its deadline.
+    """
+
+    def __init__(self, run: Callable[["Job"], Awaitable[Any]], priority: str, timeout: float,
+                 info: Optional[Dict] = None):
+        self.id = uuid.uuid4().hex
+        self.run = run
+        self.priority = priority
+        self.status = "queued"
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.deadline = self.created + timeout
+        self.info = info or {}
+        self.progress: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "deadline": self.deadline,
+            "pid": os.getpid(),
+            **self.info,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """Bounded priority queue drained by a fixed pool of asyncio workers.
+
+    ``submit`` raises ``QueueFull`` once ``max_depth`` jobs are waiting,
+    so callers can answer 429 instead of piling up work. Each job gets a
+    deadline measured from submission: a job still queued at its deadline
+    never starts, and a running one is cancelled (and with it whatever it
+    was awaiting).
+
+    With ``state_dir`` every state change is also written there, so any
+    worker process can answer a poll; a cancel for a job another process
+    owns leaves a marker that the owner picks up within a second.
+    """
+
+    def __init__(self, workers: int, max_depth: int, default_timeout: float, state_dir: Optional[str] = None,
+                 result_ttl: float = 3600):
+        self.workers = workers
+        self.max_depth = max_depth
+        self.default_timeout = default_timeout
+        self.state_dir = state_dir
+        self.result_ttl = result_ttl
+        self.jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks = []
+        self._sequence = itertools.count()
+        self.running = 0
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    @property
+    def depth(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == "queued")
+
+    def start(self):
+        """Start the workers on the running loop (idempotent, fork-safe)."""
+        if self._tasks and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._housekeeping()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, run: Callable[[Job], Awaitable[Any]], priority: str = "normal",
+               timeout: Optional[float] = None, info: Optional[Dict] = None) -> Job:
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+        if timeout is not None and (not math.isfinite(timeout) or timeout <= 0):
+            raise ValueError("timeout must be a positive number of seconds")
+        self.start()
+        if self.depth >= self.max_depth:
+            JOBS_REJECTED.inc(priority=priority)
+            raise QueueFull(f"Job queue is full ({self.max_depth} waiting)")
+        job = Job(run, priority, timeout or self.default_timeout, info)
+        self.jobs[job.id] = job
+        self._queue.put_nowait((PRIORITIES[priority], next(self._sequence), job.id))
+        self._save(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        return self._load(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job; returns its state, or None if unknown."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            state = self._load(job_id)
+            if state is not None and state["status"] not in FINISHED:
+                # Owned by another worker process
+                with open(self._path(job_id, ".cancel"), "w"):
+                    pass
+                state["status"] = "cancelling"
+            return state
+        if job.status == "queued":
+            self._finish(job, "cancelled")
+        elif job.status == "running" and job.task is not None:
+            job.task.cancel()
+            job.status = "cancelling"
+            self._save(job)
+        return job.snapshot()
+
+    async def _worker(self, number: int):
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job.status != "queued":
+                continue  # cancelled while waiting
+            now = time.time()
+            JOB_WAIT_SECONDS.observe(now - job.created, priority=job.priority)
+            if now >= job.deadline:
+                job.error = "Deadline passed while queued"
+                self._finish(job, "expired")
+                continue
+            job.status = "running"
+            job.started = now
+            self._save(job)
+            self.running += 1
+            job.task = asyncio.create_task(job.run(job))
+            try:
+                job.result = await asyncio.wait_for(asyncio.shield(job.task), job.deadline - now)
+                status = "done"
+            except asyncio.TimeoutError:
+                job.task.cancel()
+                await asyncio.gather(job.task, return_exceptions=True)
+                job.error = f"Deadline of {job.deadline - job.created:g}s exceeded"
+                status = "expired"
+            except asyncio.CancelledError:
+                if not job.task.cancelled():
+                    raise  # the worker itself is being stopped
+                status = "cancelled"
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {str(e)}")
+                job.error = str(e)
+                status = "failed"
+            finally:
+                self.running -= 1
+                job.task = None
+            JOB_SECONDS.observe(time.time() - job.started, priority=job.priority, status=status)
+            self._finish(job, status)
+
+    def _finish(self, job: Job, status: str):
+        job.status = status
+        job.finished = time.time()
+        job.run = None  # drop the payload (e.g. uploaded bytes)
+        JOBS_TOTAL.inc(priority=job.priority, status=status)
+        self._save(job)
+
+    async def _housekeeping(self):
+        # Cancel markers from other processes, and expiry of old results
+        while True:
+            await asyncio.sleep(1.0)
+            now = time.time()
+            for job in list(self.jobs.values()):
+                if job.status in FINISHED:
+                    if now - job.finished > self.result_ttl:
+                        del self.jobs[job.id]
+                        self._remove(job.id)
+                elif self.state_dir and os.path.exists(self._path(job.id, ".cancel")):
+                    os.remove(self._path(job.id, ".cancel"))
+                    self.cancel(job.id)
+
+    def _path(self, job_id: str, suffix: str = ".json") -> str:
+        return os.path.join(self.state_dir, job_id + suffix)
+
+    def _save(self, job: Job):
+        if not self.state_dir:
+            return
+        tmp_path = self._path(job.id, f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(job.snapshot(), f, default=str)
+            os.replace(tmp_path, self._path(job.id))
+        except OSError as e:
+            logger.warning(f"Could not save job {job.id}: {str(e)}")
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not self.state_dir or not all(c in "0123456789abcdef" for c in job_id) or len(job_id) != 32:
+            return None
+        try:
+            with open(self._path(job_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove(self, job_id: str):
+        for suffix in (".json", ".cancel"):
+            try:
+                os.remove(self._path(job_id, suffix))
+            except OSError:
+                pass
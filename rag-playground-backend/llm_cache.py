@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    """Bounded, TTL'd cache of LLM answers.
+
+    Two tiers are checked in order:
+
+    - exact: keyed by a hash of (model, temperature, prompt). Optionally
+      mirrored to a SQLite file so answers survive restarts; the file keeps
+      at most ``max_disk_entries`` unexpired rows, newest first.
+    - semantic (when ``semantic_threshold`` is set): within one document and
+      scope (architecture, plus model and temperature from ``CachedLLM``), a
+      previous question whose embedding has cosine similarity >= threshold
+      with the new one reuses its answer.
+
+    Both tiers evict least recently used entries beyond ``max_entries``.
+    With a file, ``get`` and ``put`` may wait on SQLite (another worker
+    holding the write lock), so async callers run them off the event loop.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, path: Optional[str] = None,
+                 semantic_threshold: Optional[float] = None, max_disk_entries: int = 10000):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+        self._exact: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._semantic: "OrderedDict[Tuple[str, str, str], Tuple[float, np.ndarray, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.path = path
+        self._db = None
+        self._db_pid = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            db = self._connection()
+            db.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT, expires REAL)")
+            db.execute("CREATE INDEX IF NOT EXISTS answers_expires ON answers (expires)")
+            self._prune(db, time.time())
+            db.commit()
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        # A SQLite connection must not cross fork(); forked workers open their own
+        if self.path and self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db_pid = os.getpid()
+        return self._db
+
+    @staticmethod
+    def prompt_key(model: str, temperature: float, prompt: str) -> str:
+        return hashlib.sha256(f"{model}\0{temperature}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "exact_hits": self.hits["exact"],
+                "semantic_hits": self.hits["semantic"],
+                "misses": self.misses
+            }
+
+    def nbytes(self) -> int:
+        """Approximate bytes of the in-memory tiers (semantic entries share the answer strings)."""
+        with self._lock:
+            exact = sum(sys.getsizeof(key) + sys.getsizeof(answer) for key, (_, answer) in self._exact.items())
+            semantic = sum(vector.nbytes + sys.getsizeof(doc_id) for (doc_id, _, _), (_, vector, _) in self._semantic.items())
+            return sys.getsizeof(self._exact) + sys.getsizeof(self._semantic) + exact + semantic
+
+    def get(self, key: str, doc_id: Optional[str] = None, scope: str = "",
+            query_vector: Optional[np.ndarray] = None) -> Tuple[Optional[str], Optional[str]]:
+        """Return ``(answer, tier)``; ``(None, None)`` on a miss."""
+        now = time.time()
+        with self._lock:
+            answer = self._get_exact(key, now)
+            if answer is not None:
+                self.hits["exact"] += 1
+                return answer, "exact"
+            answer = self._get_semantic(doc_id, scope, query_vector, now)
+            if answer is not None:
+                self.hits["semantic"] += 1
+                return answer, "semantic"
+            self.misses += 1
+            return None, None
+
+    def put(self, key: str, answer: str, doc_id: Optional[str] = None, scope: str = "",
+            query_vector: Optional[np.ndarray] = None):
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._exact[key] = (expires, answer)
+            self._exact.move_to_end(key)
+            while len(self._exact) > self.max_entries:
+                self._exact.popitem(last=False)
+            db = self._connection()
+            if db is not None:
+                try:
+                    db.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?)", (key, answer, expires))
+                    self._prune(db, expires - self.ttl)
+                    db.commit()
+                except sqlite3.Error as e:
+                    # e.g. locked by another worker past the busy timeout; memory still has it
+                    db.rollback()
+                    logger.warning(f"LLM cache write failed: {str(e)}")
+            if self.semantic_threshold is not None and doc_id and query_vector is not None:
+                vector = np.asarray(query_vector, dtype=np.float32)
+                vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+                self._semantic[(doc_id, scope, key)] = (expires, vector, answer)
+                self._semantic.move_to_end((doc_id, scope, key))
+                while len(self._semantic) > self.max_entries:
+                    self._semantic.popitem(last=False)
+
+    def _get_exact(self, key: str, now: float) -> Optional[str]:
+        entry = self._exact.get(key)
+        db = self._connection()
+        if entry is None and db is not None:
+            try:
+                row = db.execute("SELECT expires, answer FROM answers WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache read failed: {str(e)}")
+                row = None
+            if row is not None:
+                entry = (row[0], row[1])
+                self._exact[key] = entry
+        if entry is None:
+            return None
+        if entry[0] < now:
+            self._exact.pop(key, None)
+            if db is not None:
+                try:
+                    db.execute("DELETE FROM answers WHERE key = ?", (key,))
+                    db.commit()
+                except sqlite3.Error:
+                    db.rollback()  # pruned on a later put
+            return None
+        self._exact.move_to_end(key)
+        return entry[1]
+
+    def _prune(self, db: sqlite3.Connection, now: float):
+        # Expired rows, then all but the max_disk_entries latest to expire
+        db.execute("DELETE FROM answers WHERE expires < ?", (now,))
+        db.execute(
+            "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+
+    def _get_semantic(self, doc_id: Optional[str], scope: str, query_vector: Optional[np.ndarray],
+                      now: float) -> Optional[str]:
+        if self.semantic_threshold is None or not doc_id or query_vector is None:
+            return None
+        candidates = [
+            (entry_key, entry) for entry_key, entry in self._semantic.items()
+            if entry_key[0] == doc_id and entry_key[1] == scope and entry[0] >= now
+        ]
+        if not candidates:
+            return None
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        similarity = np.stack([entry[1] for _, entry in candidates]) @ query
+        best = int(np.argmax(similarity))
+        if similarity[best] < self.semantic_threshold:
+            return None
+        entry_key, entry = candidates[best]
+        self._semantic.move_to_end(entry_key)
+        return entry[2]
+
+
+class CachedLLM:
+    """Puts an ``LLMCache`` in front of a chat model's ainvoke/astream."""
+
+    def __init__(self, llm, cache: LLMCache):
+        self.llm = llm
+        self.cache = cache
+
+    async def _blocking(self, func, *args):
+        # In-memory lookups are cheap; SQLite ones can wait on a lock held
+        # by another worker, so they go to a thread (I/O, not the CPU pool)
+        if self.cache.path:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    # Read on use: ``llm`` may be a LazyModel that isn't loaded yet
+    @property
+    def model_name(self) -> str:
+        return getattr(self.llm, "model_name", type(self.llm).__name__)
+
+    @property
+    def temperature(self) -> Optional[float]:
+        return getattr(self.llm, "temperature", None)
+
+    async def generate(self, prompt: str, emit_token=None, doc_id: Optional[str] = None, scope: str = "",
+                       query_vector: Optional[np.ndarray] = None) -> Tuple[str, Dict]:
+        """Return ``(answer, cache_info)``; tokens go to ``emit_token`` when given."""
+        key = LLMCache.prompt_key(self.model_name, self.temperature, prompt)
+        # Clients with other temperatures share the cache; like the exact
+        # key, a semantic match must come from the same model and temperature
+        scope = f"{scope}:{self.model_name}:{self.temperature}"
+        answer, tier = await self._blocking(self.cache.get, key, doc_id, scope, query_vector)
+        if answer is not None:
+            if emit_token is not None:
+                await emit_token(answer)
+        elif emit_token is None:
+            result = await self.llm.ainvoke(prompt)
+            answer = result.content if hasattr(result, 'content') else result
+        else:
+            parts = []
+            async for chunk in self.llm.astream(prompt):
+                token = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                if token:
+                    parts.append(token)
+                    await emit_token(token)
+            answer = "".join(parts)
+
+        if tier is None:
+            await self._blocking(self.cache.put, key, answer, doc_id, scope, query_vector)
+        return answer, dict(self.cache.stats(), hit=tier)
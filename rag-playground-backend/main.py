@@ -1,18 +1,48 @@
-from fastapi import FastAPI, UploadFile, Form, File, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import os
 from dotenv import load_dotenv
-import uuid
+from typing import Optional
+import asyncio
+import math
 import time
-from utils import extract_text_from_pdf
+from utils import PDF_WORKERS, extract_document
+from document_store import DocumentStore, compute_doc_id
+from process_memory import workers_memory
+from memory_manager import freeze_long_lived, memory_manager, tune_gc
+from instrumentation import REGISTRY, span
+from uploads import read_upload
+from doc_collections import CollectionStore
+from job_queue import PRIORITIES, JobQueue, QueueFull
+from pydantic import ValidationError
+from models import CollectionQuery, QuerySettings
 from rag_engine import (
+    answer_with_collection,
     answer_with_simple_rag,
     answer_with_hybrid_rag,
-    answer_with_reranker_rag
+    answer_with_reranker_rag,
+    create_vector_store,
+    DEFAULT_INDEX,
+    embeddings_for,
+    embedding_models,
+    EMBEDDING_MODELS,
+    index_key,
+    index_params,
+    llm_limit,
+    query_settings,
+    retrieve_batch,
+    embedding_model,
+    ensure_models,
+    llm_cache,
+    model_status,
+    models_for,
+    rerank_scorer,
+    run_cpu,
+    score_results,
+    warmup
 )
 import json
-import gc
 import logging
 
 # Load environment variables and configure port
@@ -48,7 +78,7 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_credentials=False,  # Set to False for cross-origin requests
-    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
     allow_headers=["*"],
     expose_headers=["*"],
     max_age=3600,
@@ -59,36 +89,193 @@ app.add_middleware(
 async def add_cors_headers(request, call_next):
     response = await call_next(request)
     response.headers["Access-Control-Allow-Origin"] = "*"
-    response.headers["Access-Control-Allow-Methods"] = "POST, GET, OPTIONS"
+    response.headers["Access-Control-Allow-Methods"] = "POST, GET, DELETE, OPTIONS"
     response.headers["Access-Control-Allow-Headers"] = "*"
     return response
 
-# Memory optimization
-@app.middleware("http")
-async def clean_up_memory(request, call_next):
-    response = await call_next(request)
-    gc.collect()  # Force garbage collection
-    return response
+# Memory: loaded documents and collection indexes are evicted least recently
+# used first past MEMORY_BUDGET_MB, and the collector runs on GC_THRESHOLDS
+# with models frozen out of it once loaded, instead of a full collection
+# on every request.
+tune_gc()
+
+# Upload limits. Uploads are parsed as they stream in and
+# rejected with 413 past MAX_FILE_SIZE; they are never written to disk.
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(5 * 1024 * 1024)))  # 5MB limit
+MAX_TEXT_LENGTH = 10000  # Limit text length
 
-# Update UPLOAD_DIR configuration
+# Each architecture gets its own deadline and fails independently
+ARCHITECTURE_TIMEOUT = float(os.getenv("ARCHITECTURE_TIMEOUT", "60"))
+
+# /query/batch: questions per call and LLM calls in flight per call
+MAX_BATCH_QUESTIONS = int(os.getenv("MAX_BATCH_QUESTIONS", "500"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+
+# Models load lazily on first use. PRELOAD_MODELS=all (or a comma-separated
+# list of architectures) warms them in the background after startup;
+# /ready reports 503 until that has finished.
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "").strip()
+
+# Persistent index cache, keyed by a hash of the PDF bytes
 if os.environ.get('RENDER'):
-    UPLOAD_DIR = "/tmp/uploaded_pdfs"  # Use /tmp for Render
+    DOCUMENT_STORE_DIR = "/tmp/document_store"
 else:
-    UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "uploaded_pdfs"))
-
-# Ensure upload directory exists
-try:
-    os.makedirs(UPLOAD_DIR, mode=0o777, exist_ok=True)
-    logger.info(f"Created upload directory at: {UPLOAD_DIR}")
-except Exception as e:
-    logger.error(f"Failed to create upload directory: {e}")
-    UPLOAD_DIR = "/tmp"  # Fallback to /tmp if creation fails
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    logger.info(f"Using fallback upload directory: {UPLOAD_DIR}")
-
-# Memory optimization settings
-MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB limit
-MAX_TEXT_LENGTH = 10000  # Limit text length
+    DOCUMENT_STORE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "document_store"))
+DOCUMENT_STORE_DIR = os.getenv("DOCUMENT_STORE_DIR", DOCUMENT_STORE_DIR)
+
+document_store = DocumentStore(
+    DOCUMENT_STORE_DIR,
+    embedding_model,
+    max_documents=int(os.getenv("DOCUMENT_STORE_MAX_DOCUMENTS", "50")),
+    max_in_memory=int(os.getenv("DOCUMENT_STORE_MAX_IN_MEMORY", "8")),
+    memory=memory_manager,
+    embeddings_for=embeddings_for,
+)
+
+# Named multi-document collections. Unlike /query these keep whole
+# documents (no MAX_TEXT_LENGTH) and switch to an ANN index when large.
+COLLECTIONS_DIR = os.getenv("COLLECTIONS_DIR", os.path.join(os.path.dirname(DOCUMENT_STORE_DIR), "collections"))
+COLLECTION_MAX_FILE_SIZE = int(os.getenv("COLLECTION_MAX_FILE_SIZE", str(50 * 1024 * 1024)))  # 50MB limit
+collection_store = CollectionStore(COLLECTIONS_DIR, embedding_model, memory=memory_manager)
+
+# Caches bounded by entry count; they count toward the budget but are not evicted
+memory_manager.watch("llm_cache", llm_cache.nbytes)
+memory_manager.watch("rerank_cache", rerank_scorer.nbytes)
+memory_manager.watch(
+    "embedding_cache", lambda: sum(model.cache_nbytes() for model in embedding_models.values() if model.loaded)
+)
+
+# Queued /jobs: a fixed pool of workers per process; more than
+# JOB_QUEUE_DEPTH waiting jobs are refused with 429. Job state is shared
+# through JOBS_DIR so polls can land on any serve.py worker.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS") or os.cpu_count() or 1)
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "100"))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "300"))
+JOB_MAX_TIMEOUT = float(os.getenv("JOB_MAX_TIMEOUT", "1800"))
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(os.path.dirname(DOCUMENT_STORE_DIR), "jobs"))
+job_queue = JobQueue(
+    JOB_WORKERS,
+    JOB_QUEUE_DEPTH,
+    JOB_TIMEOUT,
+    state_dir=JOBS_DIR,
+    result_ttl=float(os.getenv("JOB_RESULT_TTL", "3600")),
+)
+
+# Aggregated across requests and served on GET /metrics
+HTTP_SECONDS = REGISTRY.histogram(
+    "rag_http_request_duration_seconds", "HTTP request latency.", labels=("method", "path", "status")
+)
+ARCHITECTURE_SECONDS = REGISTRY.histogram(
+    "rag_architecture_duration_seconds", "Time to answer per architecture.", labels=("architecture", "status")
+)
+DOCUMENTS_LOADED = REGISTRY.counter("rag_documents_total", "Documents resolved per request.", ("cached",))
+REGISTRY.gauge("rag_documents_stored", "Documents in the on-disk store.", lambda: len(document_store))
+REGISTRY.gauge("rag_job_queue_depth", "Jobs waiting for a worker.", lambda: job_queue.depth)
+REGISTRY.gauge("rag_jobs_running", "Jobs being worked on.", lambda: job_queue.running)
+REGISTRY.gauge("rag_memory_tracked_bytes", "Bytes of evictable documents and indexes loaded.",
+               lambda: memory_manager.tracked_bytes)
+REGISTRY.gauge("rag_memory_budget_bytes", "MEMORY_BUDGET_MB in bytes.", lambda: memory_manager.budget)
+
+# Pipeline step names as reported by the streaming endpoint
+STAGE_EVENTS = {
+    "extraction": "extracted",
+    "text_processing": "chunked",
+    "embedding": "embedded",
+    "indexing": "indexed",
+}
+
+def build_document(content: Optional[bytes], on_stage=None, source_id: str = None, params=DEFAULT_INDEX):
+    """Extract and index a PDF that is not in the document store yet.
+
+    Another chunking or embedding model of a PDF that is already stored
+    reuses its extracted text; only chunking, embedding and indexing run.
+    """
+    stored = document_store.source_text(source_id) if source_id else None
+    if stored is not None:
+        text, pages, steps = stored
+        extraction = dict(next(step for step in steps if step["name"] == "extraction"), duration=0.0, cached=True)
+    elif content is None:
+        raise HTTPException(status_code=404, detail=f"Unknown doc_id: {source_id}")
+    else:
+        # Straight from the in-memory upload; pages past the MAX_TEXT_LENGTH
+        # budget are never opened
+        with span("extraction") as extraction:
+            pages = extract_document(content, max_chars=MAX_TEXT_LENGTH, workers=PDF_WORKERS)
+        text = pages.text
+        if not text or not text.strip():
+            raise HTTPException(status_code=400, detail="No text content found in PDF")
+        extraction.update({"characters": len(text), "pages": len(pages.page_numbers)})
+    if on_stage is not None:
+        on_stage(extraction)
+    return create_vector_store(
+        text, steps=[extraction], on_stage=on_stage, pages=pages, params=params,
+        source_id=source_id
+    )
+
+async def load_document(content: Optional[bytes], doc_id: Optional[str], on_stage=None,
+                        content_id: Optional[str] = None, settings: Optional[QuerySettings] = None):
+    """Resolve a request to a document pipeline, indexing the upload on a miss.
+
+    ``content_id`` is the upload's sha256 when it was hashed while streaming.
+    ``on_stage`` is called from the worker thread as each build stage finishes.
+    ``settings`` pick the index variant (chunking, embedding model); a
+    ``doc_id`` is enough to build a new variant of a stored PDF.
+    """
+    try:
+        params = index_params(settings)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if doc_id:
+        content = None  # the stored document wins, as before
+    elif content is None:
+        raise HTTPException(status_code=400, detail="Either pdf or doc_id is required")
+    else:
+        logger.info(f"Read file content, size: {len(content)} bytes")
+        doc_id = content_id or compute_doc_id(content)
+
+    key = index_key(doc_id, params)
+    if content is None:
+        pipeline = await run_cpu(document_store.get, key)
+        if pipeline is not None:
+            DOCUMENTS_LOADED.inc(cached="true")
+            return pipeline, True
+        if key == doc_id:
+            raise HTTPException(status_code=404, detail=f"Unknown doc_id: {doc_id}")
+
+    cached = key in document_store
+    pipeline = await run_cpu(
+        document_store.get_or_create, key, lambda: build_document(content, on_stage, doc_id, params)
+    )
+    DOCUMENTS_LOADED.inc(cached=str(cached).lower())
+    return pipeline, cached
+
+def parse_settings(upload):
+    """The optional ``settings`` form field (the frontend's AI settings JSON)."""
+    raw = upload.fields.get("settings")
+    if not raw:
+        return None
+    try:
+        settings = QuerySettings.model_validate_json(raw)
+        index_params(settings)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid settings: {e.errors(include_url=False)}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return settings
+
+def document_ids(pipeline):
+    # doc_id stays the PDF's, so it can be sent back with other settings;
+    # index_id is the variant actually used
+    return {"doc_id": pipeline.source_id or pipeline.doc_id, "index_id": pipeline.doc_id}
+
+def parse_architectures(architectures: str):
+    try:
+        architectures_list = json.loads(architectures)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid architectures JSON")
+    if not architectures_list or not isinstance(architectures_list, list):
+        raise HTTPException(status_code=400, detail="Invalid architectures format")
+    return architectures_list
 
 # Add root endpoint
 @app.get("/")
@@ -97,102 +284,534 @@ async def root():
     return {"status": "healthy", "message": "RAG Playground API is running"}
 
 @app.options("/query")
+@app.options("/query/stream")
+@app.options("/query/batch")
 async def query_options():
     return {"status": "ok"}
 
+@app.on_event("startup")
+async def start_job_workers():
+    job_queue.start()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await job_queue.stop()
+
+@app.on_event("startup")
+async def preload_models():
+    app.state.preload = None
+    if not PRELOAD_MODELS:
+        return
+    if PRELOAD_MODELS == "all":
+        names = None
+    else:
+        names = models_for(arch.strip() for arch in PRELOAD_MODELS.split(","))
+    app.state.preload = asyncio.create_task(preload_and_freeze(names))
+
+async def preload_and_freeze(names):
+    models = await warmup(names)
+    # Startup is the one clean point (lazy loads later never freeze)
+    freeze_long_lived()
+    return models
+
 @app.get("/health")
 async def health_check():
+    # Liveness: the process is up and serving, models may still be loading
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 503 while the startup preload runs or if it failed."""
+    preload = getattr(app.state, "preload", None)
+    models = model_status()
+    if preload is not None and not preload.done():
+        return JSONResponse(status_code=503, content={"status": "loading", "models": models})
+    if any(status["error"] for status in models.values()):
+        return JSONResponse(status_code=503, content={"status": "error", "models": models})
+    return {"status": "ready", "models": models}
+
+@app.get("/embedding-models")
+async def list_embedding_models():
+    """What settings.embeddingModel may be (EMBEDDING_MODELS); the first is the default."""
+    return {"models": EMBEDDING_MODELS, "default": EMBEDDING_MODELS[0]}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of this process's counters and histograms."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/memory")
+async def memory_report():
+    """Per-worker and shared memory (all workers when run under serve.py).
+
+    ``managed`` is this worker's budgeted indexes and caches and GC state.
+    """
+    return {**workers_memory(), "managed": memory_manager.usage()}
+
+@app.post("/warmup")
+async def warmup_models(architectures: Optional[str] = None):
+    """Load and exercise the models for the given architectures (all by default).
+
+    ``architectures`` is a comma-separated query parameter.
+    """
+    names = None
+    if architectures:
+        names = models_for(arch.strip() for arch in architectures.split(","))
+        if not names:
+            raise HTTPException(status_code=400, detail="No known architectures given")
+    start = time.time()
+    models = await warmup(names)
+    failed = {name: status for name, status in models.items() if status["error"]}
+    content = {
+        "status": "error" if failed else "ready",
+        "duration": round(time.time() - start, 3),
+        "models": models
+    }
+    return JSONResponse(status_code=503 if failed else 200, content=content)
+
+@app.post("/documents")
+async def upload_document(request: Request):
+    """Index a PDF (form field ``pdf``) once; later queries can pass the returned doc_id."""
+    upload = await read_upload(request, MAX_FILE_SIZE)
+    if upload.content is None:
+        raise HTTPException(status_code=422, detail="Missing form field: pdf")
+    settings = parse_settings(upload)
+    try:
+        pipeline, cached = await load_document(upload.content, None, content_id=upload.sha256, settings=settings)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {**document_ids(pipeline), "cached": cached, **pipeline.metadata}
+
+async def get_collection(name: str, create: bool = False):
+    # Opening a collection reads its manifest and ANN index: off the event loop
+    try:
+        collection = await run_cpu(collection_store.get, name, create)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if collection is None:
+        raise HTTPException(status_code=404, detail=f"Unknown collection: {name}")
+    return collection
+
+@app.get("/collections")
+async def list_collections():
+    return {"collections": collection_store.names()}
+
+@app.post("/collections/{name}/documents")
+async def add_collection_document(name: str, request: Request):
+    """Add a PDF (form field ``pdf``) to a collection, creating it if needed."""
+    upload = await read_upload(request, COLLECTION_MAX_FILE_SIZE)
+    if upload.content is None:
+        raise HTTPException(status_code=422, detail="Missing form field: pdf")
+    collection = await get_collection(name, create=True)
+    await ensure_models(["embeddings"])
+    try:
+        entry, added = await run_cpu(collection.add, upload.content, upload.filename, upload.sha256)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"collection": name, "added": added, "document": entry, **(await run_cpu(collection.stats))}
+
+@app.get("/collections/{name}")
+async def collection_info(name: str):
+    collection = await get_collection(name)
+    return await run_cpu(collection.stats, True)
+
+@app.delete("/collections/{name}")
+async def delete_collection(name: str):
+    try:
+        deleted = await run_cpu(collection_store.delete, name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"Unknown collection: {name}")
+    return {"deleted": name}
+
+@app.post("/collections/{name}/search")
+async def search_collection(name: str, body: CollectionQuery):
+    """Nearest chunks only, no LLM call."""
+    collection = await get_collection(name)
+    await ensure_models(["embeddings"])
+    start = time.time()
+    try:
+        hits = await run_cpu(collection.similarity_search, body.query, body.k, body.doc_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "results": [
+            {"content": doc.page_content, "distance": distance, **doc.metadata}
+            for doc, distance in hits
+        ],
+        "index": collection.index_kind,
+        "time": round(time.time() - start, 4)
+    }
+
+@app.post("/collections/{name}/query")
+async def query_collection(name: str, body: CollectionQuery):
+    collection = await get_collection(name)
+    start = time.time()
+    await ensure_models(["embeddings", "llm"] + (["reranker"] if body.rerank else []))
+    try:
+        result = await asyncio.wait_for(
+            answer_with_collection(collection, body.query, body.k, body.doc_ids, body.rerank),
+            timeout=ARCHITECTURE_TIMEOUT
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Timed out after {ARCHITECTURE_TIMEOUT:g}s")
+    result["time"] = round(time.time() - start, 2)
+    return result
+
+ARCHITECTURES = {
+    "SimpleRAG": answer_with_simple_rag,
+    "HybridRAG": answer_with_hybrid_rag,
+    "ReRankerRAG": answer_with_reranker_rag,
+}
+
+async def run_architecture(arch: str, pipeline, query: str, shared_steps, emit=None, retrieved=None):
+    """Run one architecture under its own timeout; errors never propagate."""
+    start_time = time.time()
+    status = "ok"
+    try:
+        # Only the models this architecture uses; loaded once per process
+        await ensure_models(models_for([arch], pipeline.embeddings.name))
+        result = await asyncio.wait_for(
+            ARCHITECTURES[arch](pipeline, query, shared_steps=shared_steps, emit=emit, retrieved=retrieved),
+            timeout=ARCHITECTURE_TIMEOUT
+        )
+        if str(result.get("answer", "")).startswith("Error:"):
+            status = "error"
+    except asyncio.TimeoutError:
+        status = "timeout"
+        logger.warning(f"{arch} timed out after {ARCHITECTURE_TIMEOUT}s")
+        result = {
+            "architecture": arch,
+            "answer": f"Error: timed out after {ARCHITECTURE_TIMEOUT:g}s",
+            "sources": [],
+            "metadata": {}
+        }
+    except Exception as e:
+        status = "error"
+        result = {
+            "architecture": arch,
+            "answer": f"Error: {str(e)}",
+            "sources": [],
+            "metadata": {}
+        }
+    duration = time.time() - start_time
+    ARCHITECTURE_SECONDS.observe(duration, architecture=arch, status=status)
+    result["time"] = round(duration, 2)
+    return result
+
 @app.post("/query")
-async def query(
-    pdf: UploadFile = File(...),
-    query: str = Form(...),
-    architectures: str = Form(...)
-):
-    file_path = None
+async def query(request: Request):
+    """Form fields: ``query``, ``architectures`` (JSON list), ``pdf`` or ``doc_id``
+    and optionally ``settings`` (JSON: chunkSize, chunkOverlap, topK,
+    temperature, embeddingModel).
+
+    Each chunking/embedding model combination of a PDF is indexed once and
+    kept; topK and temperature apply per request on top of any index.
+    """
     try:
+        upload = await read_upload(request, MAX_FILE_SIZE)
+        query = upload.require("query")
         # Parse architectures early to validate JSON
-        try:
-            architectures_list = json.loads(architectures)
-            if not architectures_list or not isinstance(architectures_list, list):
-                raise HTTPException(status_code=400, detail="Invalid architectures format")
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=400, detail="Invalid architectures JSON")
-
-        # Save PDF with better error handling
-        file_id = str(uuid.uuid4())
-        file_path = os.path.join(UPLOAD_DIR, f"{file_id}.pdf")
-        logger.info(f"Attempting to save file to: {file_path}")
-        
-        # Save PDF
-        content = await pdf.read()
-        logger.info(f"Read file content, size: {len(content)} bytes")
-        
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        if os.path.exists(file_path):
-            logger.info(f"Successfully saved file at: {file_path}")
-            file_size = os.path.getsize(file_path)
-            logger.info(f"File size on disk: {file_size} bytes")
-        
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=500, detail="Failed to save PDF file")
-            
-        logger.info(f"Saved PDF to {file_path}")
-        
-        # Process the PDF
-        text = extract_text_from_pdf(file_path)[:MAX_TEXT_LENGTH]
-        if not text or not text.strip():
-            raise HTTPException(status_code=400, detail="No text content found in PDF")
+        architectures_list = parse_architectures(upload.require("architectures"))
+        settings = parse_settings(upload)
+        query_settings.set(settings)
+
+        # Extraction and indexing only happen the first time a PDF is seen;
+        # every architecture below shares the same chunks and indexes
+        pipeline, cached = await load_document(
+            upload.content, upload.fields.get("doc_id") or None, content_id=upload.sha256, settings=settings
+        )
+        shared_steps = pipeline.cached_steps() if cached else pipeline.steps
         
-        # Process all selected architectures
-        results = []
-        for arch in architectures_list:  # Removed [:1] to process all architectures
-            try:
-                gc.collect()  # Clean up before each processing
-                start_time = time.time()
-                if arch == "SimpleRAG":
-                    result = answer_with_simple_rag(text, query)
-                elif arch == "HybridRAG":
-                    result = answer_with_hybrid_rag(text, query)
-                elif arch == "ReRankerRAG":
-                    result = answer_with_reranker_rag(text, query)
-                else:
-                    continue  # Skip unsupported architectures
-
-                result["time"] = round(time.time() - start_time, 2)
-                results.append(result)
-            except Exception as e:
-                results.append({
-                    "architecture": arch,
-                    "answer": f"Error: {str(e)}",
-                    "sources": [],
-                    "time": 0
-                })
-
-        return {"results": results}
+        # Process all selected architectures concurrently
+        results = await asyncio.gather(*(
+            run_architecture(arch, pipeline, query, shared_steps)
+            for arch in architectures_list
+            if arch in ARCHITECTURES  # Skip unsupported architectures
+        ))
+        results = list(results)
+        await score_results(pipeline, query, results)
+
+        return {**document_ids(pipeline), "cached": cached, "results": results}
 
+    except HTTPException:
+        raise
     except Exception as e:
-        if os.path.exists(file_path):
-            os.remove(file_path)
         raise HTTPException(status_code=400, detail=str(e))
-        
-    finally:
-        # Cleanup in finally block
+
+@app.post("/query/stream")
+async def query_stream(request: Request):
+    """Streaming /query (same form fields): one JSON object per line (NDJSON), in this order.
+
+    - ``stage``: extracted, chunked, embedded, indexed (``cached`` if reused)
+    - ``document``: doc_id and the chunk/token counts shared by all results
+    - ``sources``: an architecture's retrieved sources, as soon as retrieval ends
+    - ``token``: an architecture's LLM output as it is generated
+    - ``result``: the architecture's RAGResult as soon as it finishes
+    - ``metrics``: each architecture's final ``metrics`` block, once all
+      answers are in (performance_metrics are scored in one batch)
+    - ``done`` last, or ``error`` if the document could not be processed
+    """
+    # The whole form is read (and size-checked) before responding
+    upload = await read_upload(request, MAX_FILE_SIZE)
+    query = upload.require("query")
+    architectures_list = [
+        arch for arch in parse_architectures(upload.require("architectures")) if arch in ARCHITECTURES
+    ]
+    settings = parse_settings(upload)
+    content = upload.content
+    doc_id = upload.fields.get("doc_id") or None
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+    emitted_stages = set()
+
+    async def emit(event):
+        await queue.put(event)
+
+    def stage_event(step, cached):
+        event = {key: value for key, value in step.items() if key not in ("name", "shared")}
+        event.update({"event": "stage", "stage": STAGE_EVENTS.get(step["name"], step["name"]), "cached": cached})
+        return event
+
+    def on_stage(step):
+        # Called from the CPU pool while the document is being built
+        emitted_stages.add(step["name"])
+        # Extraction is reused when only the chunking or embedding model changed
+        loop.call_soon_threadsafe(queue.put_nowait, stage_event(step, step.get("cached", False)))
+
+    async def produce():
+        query_settings.set(settings)
         try:
-            if file_path and os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"Cleaned up file: {file_path}")
+            pipeline, cached = await load_document(content, doc_id, on_stage, content_id=upload.sha256, settings=settings)
+            shared_steps = pipeline.cached_steps() if cached else pipeline.steps
+            for step in shared_steps:
+                if step["name"] not in emitted_stages:
+                    await emit(stage_event(step, True))
+            await emit({"event": "document", **document_ids(pipeline), "cached": cached, "metadata": pipeline.metadata})
+
+            async def run_one(arch):
+                result = await run_architecture(arch, pipeline, query, shared_steps, emit)
+                await emit({"event": "result", "architecture": arch, "result": result})
+                return result
+
+            results = await asyncio.gather(*(run_one(arch) for arch in architectures_list))
+            # Quality metrics need every answer, so they follow the results
+            await score_results(pipeline, query, list(results))
+            for result in results:
+                if isinstance(result.get("metrics"), dict):
+                    await emit({
+                        "event": "metrics",
+                        "architecture": result["architecture"],
+                        "metrics": result["metrics"]
+                    })
+            await emit({"event": "done", **document_ids(pipeline)})
+        except HTTPException as e:
+            await emit({"event": "error", "status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.error(f"Streaming query failed: {str(e)}")
+            await emit({"event": "error", "status_code": 400, "detail": str(e)})
+        finally:
+            await queue.put(finished)
+
+    async def stream():
+        task = asyncio.create_task(produce())
+        try:
+            while True:
+                event = await queue.get()
+                if event is finished:
+                    break
+                yield json.dumps(event) + "\n"
+        finally:
+            # Client went away or we are done; stop any remaining work
+            task.cancel()
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def run_query_job(job, content: Optional[bytes], content_id: Optional[str], doc_id: Optional[str],
+                        query: str, architectures_list, settings: Optional[QuerySettings] = None):
+    """/query as a job; each architecture's result lands in ``job.progress`` as it finishes."""
+    query_settings.set(settings)
+    pipeline, cached = await load_document(content, doc_id, content_id=content_id, settings=settings)
+    job.progress.update(**document_ids(pipeline), cached=cached, results=[])
+    shared_steps = pipeline.cached_steps() if cached else pipeline.steps
+
+    async def run_one(arch):
+        result = await run_architecture(arch, pipeline, query, shared_steps)
+        job.progress["results"].append(result)
+        return result
+
+    # Cancelling the job (deadline or DELETE) cancels whatever is still running
+    results = list(await asyncio.gather(*(run_one(arch) for arch in architectures_list)))
+    await score_results(pipeline, query, results)
+    return {**document_ids(pipeline), "cached": cached, "results": results}
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: Request):
+    """Queue a /query (same form fields, plus optional ``priority`` and ``timeout``).
+
+    Returns the job id at once; poll GET /jobs/{id}. ``priority`` is high,
+    normal or low; ``timeout`` (seconds, from submission) is the job's
+    deadline, after which unfinished architectures are cancelled.
+    """
+    upload = await read_upload(request, MAX_FILE_SIZE)
+    query = upload.require("query")
+    architectures_list = [
+        arch for arch in parse_architectures(upload.require("architectures")) if arch in ARCHITECTURES
+    ]
+    doc_id = upload.fields.get("doc_id") or None
+    content = upload.content
+    if content is None and doc_id is None:
+        raise HTTPException(status_code=400, detail="Either pdf or doc_id is required")
+    settings = parse_settings(upload)
+    priority = upload.fields.get("priority") or "normal"
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(PRIORITIES)}")
+    try:
+        timeout = float(upload.fields.get("timeout") or JOB_TIMEOUT)
+    except ValueError:
+        timeout = math.nan
+    # nan would slip through min() and leave the job without a deadline
+    if not math.isfinite(timeout) or timeout <= 0:
+        raise HTTPException(status_code=400, detail="timeout must be a positive number of seconds")
+    timeout = min(timeout, JOB_MAX_TIMEOUT)
+
+    try:
+        job = job_queue.submit(
+            lambda job: run_query_job(job, content, upload.sha256, doc_id, query, architectures_list, settings),
+            priority=priority,
+            timeout=timeout,
+            info={"query": query, "architectures": architectures_list},
+        )
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job.id, "status": job.status, "priority": priority, "deadline": job.deadline},
+        headers={"Location": f"/jobs/{job.id}"}
+    )
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    state = job_queue.get(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return state
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    state = job_queue.cancel(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return state
+
+def parse_questions(questions: str):
+    try:
+        questions_list = json.loads(questions)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid questions JSON")
+    if not questions_list or not isinstance(questions_list, list) or not all(isinstance(q, str) for q in questions_list):
+        raise HTTPException(status_code=400, detail="questions must be a non-empty JSON list of strings")
+    if len(questions_list) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_QUESTIONS} questions per batch")
+    return questions_list
+
+@app.post("/query/batch")
+async def query_batch(request: Request):
+    """Many questions against one document: form fields ``questions`` (JSON
+    list of strings), ``architectures`` and ``pdf`` or ``doc_id``.
+
+    Retrieval for all questions runs up front in batched form (one question
+    encode, one index search, one cross-encoder pass); LLM calls then run
+    with at most BATCH_LLM_CONCURRENCY in flight. NDJSON events:
+
+    - ``document``: doc_id, whether it was cached, and its metadata
+    - ``retrieval``: the shared batched retrieval/reranking steps
+    - ``result``: one per question as soon as all its architectures are
+      done and scored: ``index``, ``question`` and ``results``
+    - ``done`` last (with the wall time), or ``error``
+    """
+    upload = await read_upload(request, MAX_FILE_SIZE)
+    questions = parse_questions(upload.require("questions"))
+    architectures_list = [
+        arch for arch in parse_architectures(upload.require("architectures")) if arch in ARCHITECTURES
+    ]
+    settings = parse_settings(upload)
+    content = upload.content
+    doc_id = upload.fields.get("doc_id") or None
+
+    async def produce():
+        start = time.time()
+        query_settings.set(settings)
+        pipeline, cached = await load_document(content, doc_id, content_id=upload.sha256, settings=settings)
+        shared_steps = pipeline.cached_steps() if cached else pipeline.steps
+        yield {"event": "document", **document_ids(pipeline), "cached": cached, "metadata": pipeline.metadata}
+
+        await ensure_models(models_for(architectures_list, pipeline.embeddings.name))
+        batch_steps = []
+        retrieved = await run_cpu(retrieve_batch, pipeline, questions, architectures_list, batch_steps)
+        yield {"event": "retrieval", "steps": batch_steps}
+        shared_steps = shared_steps + batch_steps
+
+        async def answer(index: int, question: str):
+            results = list(await asyncio.gather(*(
+                run_architecture(arch, pipeline, question, shared_steps, retrieved=retrieved[index][arch])
+                for arch in architectures_list
+            )))
+            await score_results(pipeline, question, results)
+            return {"event": "result", "index": index, "question": question, "results": results}
+
+        llm_limit.set(asyncio.Semaphore(BATCH_LLM_CONCURRENCY))
+        tasks = [asyncio.create_task(answer(i, question)) for i, question in enumerate(questions)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+        yield {"event": "done", **document_ids(pipeline), "questions": len(questions), "time": round(time.time() - start, 2)}
+
+    async def stream():
+        try:
+            async for event in produce():
+                yield json.dumps(event) + "\n"
+        except HTTPException as e:
+            yield json.dumps({"event": "error", "status_code": e.status_code, "detail": e.detail}) + "\n"
         except Exception as e:
-            logger.error(f"Failed to cleanup file {file_path}: {str(e)}")
+            logger.error(f"Batch query failed: {str(e)}")
+            yield json.dumps({"event": "error", "status_code": 400, "detail": str(e)}) + "\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # Add error logger
 @app.middleware("http")
 async def log_requests(request, call_next):
     try:
+        start = time.perf_counter()
         response = await call_next(request)
+        # Route template, not the raw URL, so label values stay bounded
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            path=getattr(route, "path", "unmatched"),
+            status=response.status_code
+        )
         logger.info(f"Request: {request.method} {request.url} - Status: {response.status_code}")
         return response
     except Exception as e:
@@ -208,6 +827,7 @@ async def global_exception_handler(request, exc):
     )
 
 if __name__ == "__main__":
+    # Single process; serve.py runs several workers sharing the models
     import uvicorn
     logger.info(f"Starting server on port {PORT}")
     uvicorn.run(
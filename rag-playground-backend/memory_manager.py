@@ -0,0 +1,160 @@
+import gc
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Tuple
+
+from instrumentation import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Bytes of loaded indexes and caches to keep per process; 0 turns eviction off
+MEMORY_BUDGET = int(float(os.getenv("MEMORY_BUDGET_MB", "1024")) * 1024 * 1024)
+# Allocations between young collections, then young (and middle) collections
+# per older one. CPython's 700,10,10 means a collection every few requests here
+GC_THRESHOLDS = tuple(int(value) for value in os.getenv("GC_THRESHOLDS", "50000,20,100").split(","))
+
+EVICTIONS = REGISTRY.counter(
+    "rag_memory_evictions_total", "Items dropped from memory to stay under MEMORY_BUDGET_MB.", ("pool",)
+)
+GC_PAUSE_SECONDS = REGISTRY.histogram(
+    "rag_gc_pause_seconds", "Garbage collector pauses.", (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1),
+    ("generation",)
+)
+
+
+class MemoryManager:
+    """Keeps what is loaded in memory under a byte budget.
+
+    Evictable items (a document's loaded pipeline, a collection's ANN
+    index) are ``track``ed with their size and a callback that drops them,
+    and ``touch``ed when used. Caches that are already bounded by entry
+    count are ``watch``ed: their bytes count toward the budget and show up
+    in ``usage()``, but only tracked items are evicted, least recently used
+    first and never the most recent one.
+
+    ``track`` and ``touch`` only take the manager's lock; owners call
+    ``enforce()`` once they have released their own, since eviction
+    callbacks take them.
+    """
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self._items: "OrderedDict[Tuple[str, Hashable], Tuple[int, Callable[[], None]]]" = OrderedDict()
+        self._watched: Dict[str, Callable[[], int]] = {}
+        self._lock = threading.Lock()
+
+    def track(self, pool: str, key: Hashable, nbytes: int, evict: Callable[[], None]):
+        with self._lock:
+            self._items[(pool, key)] = (int(nbytes), evict)
+            self._items.move_to_end((pool, key))
+
+    def touch(self, pool: str, key: Hashable):
+        with self._lock:
+            if (pool, key) in self._items:
+                self._items.move_to_end((pool, key))
+
+    def forget(self, pool: str, key: Hashable):
+        with self._lock:
+            self._items.pop((pool, key), None)
+
+    def watch(self, pool: str, nbytes: Callable[[], int]):
+        self._watched[pool] = nbytes
+
+    def _watched_bytes(self) -> Dict[str, int]:
+        sizes = {}
+        for pool, nbytes in list(self._watched.items()):
+            try:
+                sizes[pool] = int(nbytes())
+            except Exception as e:
+                logger.warning(f"Could not size {pool}: {str(e)}")
+                sizes[pool] = 0
+        return sizes
+
+    def enforce(self) -> int:
+        """Evict least recently used items until usage fits the budget; returns bytes freed."""
+        if self.budget <= 0:
+            return 0
+        used = sum(self._watched_bytes().values())
+        victims = []
+        with self._lock:
+            used += sum(nbytes for nbytes, _ in self._items.values())
+            while used > self.budget and len(self._items) > 1:
+                (pool, key), (nbytes, evict) = self._items.popitem(last=False)
+                used -= nbytes
+                victims.append((pool, key, nbytes, evict))
+        for pool, key, nbytes, evict in victims:
+            try:
+                evict()
+            except Exception as e:
+                logger.warning(f"Failed to evict {pool} {key}: {str(e)}")
+                continue
+            EVICTIONS.inc(pool=pool)
+            logger.info(f"Evicted {pool} {key} ({nbytes / 2 ** 20:.1f} MiB) to stay under the memory budget")
+        return sum(nbytes for _, _, nbytes, _ in victims)
+
+    @property
+    def tracked_bytes(self) -> int:
+        with self._lock:
+            return sum(nbytes for nbytes, _ in self._items.values())
+
+    def usage(self) -> Dict:
+        pools: Dict[str, Dict] = {}
+        with self._lock:
+            for (pool, _), (nbytes, _) in self._items.items():
+                entry = pools.setdefault(pool, {"items": 0, "bytes": 0, "evictable": True})
+                entry["items"] += 1
+                entry["bytes"] += nbytes
+        for pool, nbytes in self._watched_bytes().items():
+            pools[pool] = {"bytes": nbytes, "evictable": False}
+        return {
+            "budget_bytes": self.budget,
+            "used_bytes": sum(entry["bytes"] for entry in pools.values()),
+            "pools": pools,
+            "gc": gc_status(),
+        }
+
+
+memory_manager = MemoryManager(MEMORY_BUDGET)
+
+_gc_started = 0.0
+
+
+def _time_gc(phase: str, info: Dict):
+    global _gc_started
+    if phase == "start":
+        _gc_started = time.perf_counter()
+    else:
+        GC_PAUSE_SECONDS.observe(time.perf_counter() - _gc_started, generation=str(info["generation"]))
+
+
+def tune_gc():
+    """Apply GC_THRESHOLDS and start timing collector pauses (idempotent)."""
+    gc.set_threshold(*GC_THRESHOLDS)
+    if _time_gc not in gc.callbacks:
+        gc.callbacks.append(_time_gc)
+
+
+def freeze_long_lived():
+    """Move everything alive now into the permanent generation.
+
+    Only call it at a clean point, with no request in flight: once the
+    startup preload has finished (serve.py freezes before forking). Then the
+    models' object graphs, which live as long as the process, are no
+    longer traversed by collections (and forked workers stop dirtying
+    their pages). Anything frozen is never collected, so freezing
+    mid-traffic would pin uploads and the cycles of in-flight requests.
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def gc_status() -> Dict:
+    return {
+        "thresholds": list(gc.get_threshold()),
+        "counts": list(gc.get_count()),
+        "frozen_objects": gc.get_freeze_count(),
+        "collections": [generation["collections"] for generation in gc.get_stats()],
+    }
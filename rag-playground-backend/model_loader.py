@@ -0,0 +1,61 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModel:
+    """Builds a model on first use and then stands in for it.
+
+    Attribute access is forwarded to the loaded object, so a ``LazyModel``
+    can be passed wherever the model itself was. Loading happens once even
+    with concurrent callers; a failed load is logged, reported by
+    ``status()`` and retried on the next access. Loading does not freeze
+    the heap (requests may be in flight); see ``freeze_long_lived``.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self._factory = factory
+        self._model = None
+        self._lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def get(self):
+        if self._model is not None:
+            return self._model
+        with self._lock:
+            if self._model is None:
+                logger.info(f"Loading model: {self.name}")
+                start = time.time()
+                try:
+                    model = self._factory()
+                except Exception as e:
+                    self.error = str(e)
+                    logger.error(f"Failed to load model {self.name}: {self.error}")
+                    raise
+                self.load_seconds = time.time() - start
+                self.error = None
+                self._model = model
+                logger.info(f"Loaded model {self.name} in {self.load_seconds:.2f}s")
+        return self._model
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "error": self.error
+        }
+
+    def __getattr__(self, attr):
+        # Only reached for attributes LazyModel itself doesn't define
+        if attr.startswith("__") or attr in ("_factory", "_model", "_lock"):
+            raise AttributeError(attr)
+        return getattr(self.get(), attr)
@@ -1,6 +1,29 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Optional
 
 class QueryRequest(BaseModel):
     query: str
     architectures: List[str]
+
+class CollectionQuery(BaseModel):
+    query: str
+    # Bounded like QuerySettings.top_k; ANN search fetches REFINE_FACTOR * k candidates
+    k: int = Field(4, ge=1, le=50)
+    # Restrict retrieval to these documents of the collection
+    doc_ids: Optional[List[str]] = None
+    rerank: bool = False
+
+class QuerySettings(BaseModel):
+    """Per-request overrides (the frontend's ``settings`` JSON); unset means the server default.
+
+    Chunk sizes are in tokens. Keys the backend doesn't use (e.g.
+    ``maxTokens``) are ignored.
+    """
+    model_config = ConfigDict(populate_by_name=True, extra="ignore")
+
+    chunk_size: Optional[int] = Field(None, alias="chunkSize", ge=16, le=2048)
+    chunk_overlap: Optional[int] = Field(None, alias="chunkOverlap", ge=0)
+    # Ranked chunks offered to the context packer per architecture
+    top_k: Optional[int] = Field(None, alias="topK", ge=1, le=50)
+    temperature: Optional[float] = Field(None, ge=0, le=2)
+    embedding_model: Optional[str] = Field(None, alias="embeddingModel")
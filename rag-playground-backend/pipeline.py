@@ -0,0 +1,230 @@
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from bm25_index import BM25Index
+from chunker import ChunkSet, TokenChunker
+from utils import ExtractedText
+from instrumentation import span
+
+# Files written by DocumentPipeline.save
+TEXT_FILE = "text.txt"
+CHUNKS_FILE = "chunks.npz"
+VECTORS_FILE = "vectors.npy"
+BM25_FILE = "bm25.npz"
+META_FILE = "meta.json"
+
+# Token windows; 128/16 tokens is roughly the old 500/50 character split
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "128"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "16"))
+
+def bm25_tokenize(text: str) -> List[str]:
+    # Same whitespace split langchain's BM25Retriever used
+    return text.split()
+
+
+class FlatIndex:
+    """Exact L2 search directly over the vector matrix.
+
+    Same results as ``faiss.IndexFlatL2`` without copying the vectors into
+    an index. A matrix loaded with ``np.load(mmap_mode=...)`` is searched
+    straight from the page cache, which every worker process shares.
+    """
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    @property
+    def ntotal(self) -> int:
+        return len(self.vectors)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return faiss.knn(np.ascontiguousarray(queries, dtype=np.float32), self.vectors, k)
+
+
+class DocumentPipeline:
+    """Retrieval artifacts for one document, built once and shared.
+
+    The stages run in order: ``chunk`` -> ``embed`` -> ``index``. Each stage
+    appends its timing to ``steps``; every architecture answering a question
+    about the document reads from the same chunks, vectors and indexes.
+
+    ``doc_id`` identifies this index; ``source_id`` the PDF it was built
+    from, which is the same unless the chunking or embedding model differs
+    from the defaults.
+    """
+
+    def __init__(self, text: str, embeddings, doc_id: str = None, pages: ExtractedText = None,
+                 chunk_tokens: int = CHUNK_TOKENS, chunk_overlap: int = CHUNK_OVERLAP_TOKENS,
+                 source_id: str = None):
+        self.text = text
+        self.embeddings = embeddings
+        self.doc_id = doc_id
+        self.source_id = source_id
+        # Page boundaries from extraction; chunks are labelled with real pages
+        self.pages = pages
+        self.chunker = TokenChunker(chunk_tokens, chunk_overlap)
+        self.steps: List[Dict] = []
+        self.chunks: ChunkSet = None
+        self.vectors: np.ndarray = None
+        self.vector_index = None
+        self.bm25 = None
+
+    def build(self, on_stage: Optional[Callable[[Dict], None]] = None) -> "DocumentPipeline":
+        """Run every stage; ``on_stage`` receives each step as it completes."""
+        for stage in (self.chunk, self.embed, self.index):
+            stage()
+            if on_stage is not None:
+                on_stage(self.steps[-1])
+        return self
+
+    def chunk(self):
+        with span("text_processing", self.steps) as step:
+            # One tokenization; token counts are kept for later prompt packing
+            self.chunks = self.chunker.split(self.text, self.pages.page_at if self.pages else None)
+            step["chunks"] = len(self.chunks)
+
+    def embed(self):
+        with span("embedding", self.steps) as step:
+            vectors = self.embeddings.embed_documents(self.chunks.texts())
+            self.vectors = np.asarray(vectors, dtype=np.float32)
+            step["vectors"] = len(self.vectors)
+
+    def index(self):
+        with span("indexing", self.steps) as step:
+            # Same exact L2 search langchain's FAISS wrapper used
+            self.vector_index = FlatIndex(self.vectors)
+            self.bm25 = self.build_bm25()
+            step["vectors"] = self.vector_index.ntotal
+
+    def build_bm25(self) -> BM25Index:
+        return BM25Index.build([bm25_tokenize(text) for text in self.chunks.texts()])
+
+    @property
+    def metadata(self) -> Dict:
+        return {
+            "chunks": len(self.chunks),
+            "total_tokens": self.chunks.total_tokens,
+            "embedding_model": self.embeddings.model_name,
+            "chunk_tokens": self.chunker.chunk_tokens,
+            "chunk_overlap": self.chunker.overlap_tokens
+        }
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the loaded artifacts (the text is counted with the chunks).
+
+        Vectors loaded from the store are memory-mapped and count in full,
+        though their pages are shared page cache.
+        """
+        total = self.chunks.nbytes if self.chunks is not None else sys.getsizeof(self.text)
+        if self.vectors is not None:
+            total += self.vectors.nbytes
+        if self.bm25 is not None:
+            total += self.bm25.nbytes
+        return total
+
+    def cached_steps(self) -> List[Dict]:
+        """Steps to report when the artifacts were reused rather than built."""
+        return [dict(step, duration=0.0, cached=True) for step in self.steps]
+
+    def embed_query(self, question: str) -> np.ndarray:
+        return np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+
+    def document(self, i: int) -> Document:
+        return self.chunks.document(i)
+
+    def similarity_search(self, question: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """Nearest chunks to the question with their L2 distances."""
+        k = min(k, len(self.chunks))
+        distances, ids = self.vector_index.search(self.embed_query(question).reshape(1, -1), k)
+        return [(self.document(i), float(d)) for d, i in zip(distances[0], ids[0]) if i >= 0]
+
+    def bm25_search(self, question: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """Best BM25 chunks for the question with their scores."""
+        return self.bm25_search_many([question], k)[0]
+
+    def embed_queries(self, questions: List[str]) -> np.ndarray:
+        return np.asarray(self.embeddings.embed_query_many(questions), dtype=np.float32).reshape(len(questions), -1)
+
+    def similarity_search_many(self, query_vectors: np.ndarray, k: int = 4) -> List[List[Tuple[Document, float]]]:
+        """``similarity_search`` for a matrix of question vectors in one index search."""
+        k = min(k, len(self.chunks))
+        if len(query_vectors) == 0:
+            return []
+        distances, ids = self.vector_index.search(query_vectors, k)
+        return [
+            [(self.document(i), float(d)) for d, i in zip(row_distances, row_ids) if i >= 0]
+            for row_distances, row_ids in zip(distances, ids)
+        ]
+
+    def bm25_search_many(self, questions: List[str], k: int = 4) -> List[List[Tuple[Document, float]]]:
+        # One sparse product scores every question against every chunk
+        hits = self.bm25.top_k([bm25_tokenize(question) for question in questions], k)
+        return [[(self.document(i), score) for i, score in row] for row in hits]
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, TEXT_FILE), "w", encoding="utf-8") as f:
+            f.write(self.text)
+        self.chunks.save(os.path.join(path, CHUNKS_FILE))
+        np.save(os.path.join(path, VECTORS_FILE), self.vectors)
+        self.bm25.save(os.path.join(path, BM25_FILE))
+        # meta.json is written last; its presence marks a complete entry
+        with open(os.path.join(path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "doc_id": self.doc_id,
+                "source_id": self.source_id,
+                "embedding_model": self.embeddings.model_name,
+                "chunk_tokens": self.chunker.chunk_tokens,
+                "chunk_overlap": self.chunker.overlap_tokens,
+                "page_starts": self.pages.page_starts if self.pages else None,
+                "page_numbers": self.pages.page_numbers if self.pages else None,
+                "steps": self.steps,
+                "created": time.time()
+            }, f)
+
+    @classmethod
+    def load(cls, path: str, embeddings) -> "DocumentPipeline":
+        meta = read_meta(path)
+        text, pages = load_text(path, meta)
+        pipeline = cls(
+            text, embeddings, doc_id=meta["doc_id"], pages=pages,
+            # Entries stored before these were recorded used the defaults
+            chunk_tokens=meta.get("chunk_tokens", CHUNK_TOKENS),
+            chunk_overlap=meta.get("chunk_overlap", CHUNK_OVERLAP_TOKENS),
+            source_id=meta.get("source_id") or meta["doc_id"]
+        )
+        pipeline.chunks = ChunkSet.load(os.path.join(path, CHUNKS_FILE), text)
+        # Copy-on-write map: pages are shared by every process that loads
+        # this document and only become private if something writes to them
+        pipeline.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="c")
+        pipeline.vector_index = FlatIndex(pipeline.vectors)
+        bm25_path = os.path.join(path, BM25_FILE)
+        if os.path.exists(bm25_path):
+            pipeline.bm25 = BM25Index.load(bm25_path)
+        else:
+            # Stored before the sparse index existed (bm25.pkl); cheap to redo
+            pipeline.bm25 = pipeline.build_bm25()
+        pipeline.steps = meta["steps"]
+        return pipeline
+
+
+def read_meta(path: str) -> Dict:
+    with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_text(path: str, meta: Dict) -> Tuple[str, Optional[ExtractedText]]:
+    """Extracted text (and page boundaries, if recorded) of a saved pipeline."""
+    with open(os.path.join(path, TEXT_FILE), encoding="utf-8") as f:
+        text = f.read()
+    pages = None
+    if meta.get("page_starts") is not None:
+        pages = ExtractedText(text, meta["page_starts"], meta["page_numbers"])
+    return text, pages
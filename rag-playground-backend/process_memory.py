@@ -0,0 +1,66 @@
+import os
+from typing import Dict, List
+
+# /proc/<pid>/smaps_rollup fields we report, in kB on disk
+SMAPS_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared_clean",
+    "Shared_Dirty": "shared_dirty",
+    "Private_Clean": "private_clean",
+    "Private_Dirty": "private_dirty",
+    "Swap": "swap",
+}
+
+
+def memory_usage(pid="self") -> Dict[str, int]:
+    """Memory of one process in bytes, from smaps_rollup (Linux only; {} elsewhere).
+
+    ``pss`` splits every shared page evenly between the processes mapping
+    it, so summing pss over workers gives their real combined footprint.
+    """
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                field = SMAPS_FIELDS.get(parts[0].rstrip(":"))
+                if field is not None:
+                    usage[field] = int(parts[1]) * 1024
+    except (OSError, IndexError, ValueError):
+        return {}
+    usage["shared"] = usage.get("shared_clean", 0) + usage.get("shared_dirty", 0)
+    usage["private"] = usage.get("private_clean", 0) + usage.get("private_dirty", 0)
+    return usage
+
+
+def worker_pids() -> List[int]:
+    """All workers of the prefork server (serve.py), or just this process."""
+    master = os.getenv("SERVE_MASTER_PID")
+    if master:
+        try:
+            with open(f"/proc/{master}/task/{master}/children") as f:
+                return sorted(int(pid) for pid in f.read().split())
+        except (OSError, ValueError):
+            pass
+    return [os.getpid()]
+
+
+def workers_memory() -> Dict:
+    """This worker's memory, every sibling's, and totals across them."""
+    workers = []
+    for pid in worker_pids():
+        usage = memory_usage(pid)
+        if usage:
+            workers.append(dict(usage, pid=pid))
+    totals = {
+        field: sum(worker.get(field, 0) for worker in workers)
+        for field in ("rss", "pss", "shared", "private")
+    }
+    return {
+        "pid": os.getpid(),
+        "worker": memory_usage(),
+        "workers": workers,
+        # rss counts shared pages once per worker; pss is the true total
+        "total": totals,
+    }
@@ -1,156 +1,483 @@
 import os
-from typing import List, Dict, Any
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_groq import ChatGroq
-from langchain.chains import RetrievalQA
-from langchain_community.retrievers import BM25Retriever
-from sentence_transformers import CrossEncoder
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import partial
+from typing import List, Dict, Any, Iterable, NamedTuple, Optional
+import numpy as np
 from dotenv import load_dotenv
-import tiktoken
 import time
 from rag_metrics import RAGMetrics  # Change from relative to absolute import
+from models import QuerySettings
+from pipeline import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, DocumentPipeline
+from chunker import get_encoding
+from context_packer import pack_context
+from embedding_engine import EmbeddingEngine
+from llm_cache import CachedLLM, LLMCache
+from stub_llm import StubLLM
+from batching import CachedPairScorer, MicroBatcher
+from model_loader import LazyModel
+from instrumentation import REGISTRY, process_rss, span
 
 # Load environment variables
 load_dotenv()
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 
-# Initialize Groq LLM with a supported model
-llm = ChatGroq(
-    groq_api_key=GROQ_API_KEY,
-    model_name="llama3-70b-8192",  # Updated to a supported model
-    temperature=0.7
+# Models are built on first use (or by /warmup), so importing this module
+# stays cheap and the server answers /health right away
+
+# Sampling temperature unless a request asks for another (see llm_for)
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.7"))
+# Clients kept for other temperatures; the least recently used is dropped
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "4"))
+
+def _load_llm(temperature: float = LLM_TEMPERATURE):
+    # Initialize Groq LLM with a supported model; LLM_BACKEND=stub swaps in a
+    # deterministic local stand-in for offline runs and benchmarks
+    if os.getenv("LLM_BACKEND", "groq") == "stub":
+        return StubLLM(latency=float(os.getenv("STUB_LLM_LATENCY", "0")), temperature=temperature)
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        groq_api_key=GROQ_API_KEY,
+        model_name="llama3-70b-8192",  # Updated to a supported model
+        temperature=temperature
+    )
+
+llm = LazyModel("llm", _load_llm)
+
+# Identical prompts (e.g. SimpleRAG and ReRankerRAG picking the same chunk)
+# are answered once; the semantic tier is off unless a threshold is set
+llm_cache = LLMCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+    path=os.getenv("LLM_CACHE_PATH") or None,
+    max_disk_entries=int(os.getenv("LLM_CACHE_DISK_SIZE", "10000")),
+    semantic_threshold=float(os.environ["LLM_SEMANTIC_CACHE_THRESHOLD"]) if os.getenv("LLM_SEMANTIC_CACHE_THRESHOLD") else None
 )
+cached_llm = CachedLLM(llm, llm_cache)
+_llm_pool: "OrderedDict[float, CachedLLM]" = OrderedDict()
+_llm_pool_lock = threading.Lock()
+
+def llm_for(temperature: Optional[float] = None) -> CachedLLM:
+    """Cached LLM client sampling at ``temperature`` (None: the default client).
+
+    Every client shares ``llm_cache``; temperature is part of its key.
+    """
+    if temperature is None or round(float(temperature), 2) == LLM_TEMPERATURE:
+        return cached_llm
+    temperature = round(float(temperature), 2)
+    with _llm_pool_lock:
+        client = _llm_pool.get(temperature)
+        if client is None:
+            client = _llm_pool[temperature] = CachedLLM(_load_llm(temperature), llm_cache)
+            while len(_llm_pool) > LLM_POOL_SIZE:
+                _llm_pool.popitem(last=False)
+        _llm_pool.move_to_end(temperature)
+    return client
 
-# Initialize embeddings
-embedding_model = HuggingFaceEmbeddings(
-    model_name="all-MiniLM-L6-v2",
-    model_kwargs={'device': 'cpu'}
+# Concurrent requests wait up to this long so their query embeddings and
+# cross-encoder pairs share one forward pass (0 disables micro-batching)
+MICROBATCH_WAIT_MS = float(os.getenv("MICROBATCH_WAIT_MS", "5"))
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", "64"))
+
+# Initialize embeddings; chunks already embedded once are read back from
+# the float16 cache instead of being re-encoded
+EMBEDDING_CACHE_DIR = os.getenv(
+    "EMBEDDING_CACHE_DIR",
+    "/tmp/embedding_cache" if os.environ.get('RENDER')
+    else os.path.abspath(os.path.join(os.path.dirname(__file__), "embedding_cache"))
 )
+# Models a request may pick (settings.embeddingModel); the first is the
+# default. Extra models are opt-in: each one is registered in MODELS, so
+# serve.py preloads it and /warmup loads it too (BAAI/bge-large-en-v1.5 is
+# ~1.3GB). Each has its own chunk cache.
+EMBEDDING_MODELS = [
+    name.strip() for name in os.getenv("EMBEDDING_MODELS", "all-MiniLM-L6-v2").split(",")
+    if name.strip()
+]
+
+def _load_embeddings(model_name: str) -> EmbeddingEngine:
+    return EmbeddingEngine(
+        model_name=model_name,
+        batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "64")),
+        backend=os.getenv("EMBEDDING_BACKEND", "torch"),  # or "quantized" for int8
+        cache_dir=EMBEDDING_CACHE_DIR or None,
+        tolerance=float(os.getenv("EMBEDDING_QUANTIZATION_TOLERANCE", "0.99")),
+        batch_wait_ms=MICROBATCH_WAIT_MS
+    )
+
+embedding_models = {
+    name: LazyModel("embeddings" if i == 0 else f"embeddings:{name}", partial(_load_embeddings, name))
+    for i, name in enumerate(EMBEDDING_MODELS)
+}
+embedding_model = embedding_models[EMBEDDING_MODELS[0]]
 
-reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+def embeddings_for(model_name: Optional[str] = None):
+    """Embedding engine for ``model_name`` (None: the default); only EMBEDDING_MODELS are allowed."""
+    if not model_name:
+        return embedding_model
+    if model_name not in embedding_models:
+        raise ValueError(f"Unknown embedding model: {model_name} (available: {', '.join(EMBEDDING_MODELS)})")
+    return embedding_models[model_name]
 
 # Initialize metrics
-metrics_analyzer = RAGMetrics()
-
-# Constants for token management
-MAX_TOKENS_LIMIT = 4000
-MAX_CONTEXT_LENGTH = 2000
-
-def count_tokens(text: str) -> int:
-    encoding = tiktoken.get_encoding("cl100k_base")
-    return len(encoding.encode(text))
-
-def split_and_annotate(text: str):
-    # Reduced chunk size and overlap for better token management
-    splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    chunks = splitter.create_documents([text])
-    # Annotate with page numbers if possible
-    for i, chunk in enumerate(chunks):
-        chunk.metadata["page"] = i + 1
-    return chunks
-
-def truncate_context(context: str, max_length: int = MAX_CONTEXT_LENGTH) -> str:
-    """Truncate context to fit within token limits."""
-    encoding = tiktoken.get_encoding("cl100k_base")
-    tokens = encoding.encode(context)
-    if len(tokens) > max_length:
-        tokens = tokens[:max_length]
-        context = encoding.decode(tokens)
-    return context
-
-def process_in_batches(text: str, max_tokens: int = 6000) -> str:
-    """Process large texts in batches to avoid token limits."""
-    encoding = tiktoken.get_encoding("cl100k_base")
-    tokens = encoding.encode(text)
-    
-    if len(tokens) <= max_tokens:
-        return text
-    
-    # Split into batches
-    batches = []
-    current_batch = []
-    current_length = 0
-    
-    for token in tokens:
-        if current_length + 1 > max_tokens:
-            batches.append(encoding.decode(current_batch))
-            current_batch = []
-            current_length = 0
-        current_batch.append(token)
-        current_length += 1
-    
-    if current_batch:
-        batches.append(encoding.decode(current_batch))
-    
-    return " ".join(batches)
-
-def create_vector_store(text: str):
-    docs = split_and_annotate(text)
-    # Process chunks to ensure they're within token limits
-    processed_docs = []
-    for doc in docs:
-        doc.page_content = process_in_batches(doc.page_content)
-        processed_docs.append(doc)
-    
-    vectorstore = FAISS.from_documents(processed_docs, embedding_model)
-    bm25_retriever = BM25Retriever.from_documents(processed_docs)
-    metadata = {
-        "chunks": len(processed_docs),
-        "total_tokens": sum(count_tokens(doc.page_content) for doc in processed_docs),
-        "embedding_model": embedding_model.model_name
-    }
-    return vectorstore, bm25_retriever, processed_docs, metadata
+metrics_analyzer = RAGMetrics(embedding_model)
+
+def _load_reranker():
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+
+reranker = LazyModel("reranker", _load_reranker)
+rerank_batcher = MicroBatcher(
+    lambda pairs: reranker.predict(pairs, batch_size=MICROBATCH_MAX_SIZE, show_progress_bar=False),
+    max_batch_size=MICROBATCH_MAX_SIZE,
+    max_wait_ms=MICROBATCH_WAIT_MS,
+    name="rerank"
+)
+# Repeated (question, chunk) pairs are scored once
+rerank_scorer = CachedPairScorer(rerank_batcher, max_entries=int(os.getenv("RERANK_CACHE_SIZE", "10000")))
+
+
+# Bounded pool for CPU-bound work (embedding, FAISS, cross-encoder scoring).
+# Threads rather than processes: torch and faiss release the GIL and the
+# models stay shared instead of being copied into every worker. Threads
+# blocked on a micro-batch just wait, so more workers means wider batches.
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="rag-cpu")
+
+async def run_cpu(func, *args):
+    """Run a blocking call on the CPU pool without stalling the event loop.
+
+    The call sees the caller's context variables (e.g. ``query_settings``);
+    run_in_executor alone would not carry them into the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(cpu_executor, context.run, func, *args)
+
+# The default embedder is "embeddings", other allowed ones "embeddings:<name>"
+MODELS = {
+    "llm": llm,
+    **{model.name: model for model in embedding_models.values()},
+    "reranker": reranker,
+}
+
+# What each architecture needs before it can answer
+ARCHITECTURE_MODELS = {
+    "SimpleRAG": ("embeddings", "llm"),
+    "HybridRAG": ("embeddings", "llm"),
+    "ReRankerRAG": ("embeddings", "reranker", "llm"),
+}
+
+def models_for(architectures: Iterable[str], embeddings: str = "embeddings") -> List[str]:
+    """Models the architectures need; ``embeddings`` names the index's embedder in MODELS."""
+    names = []
+    for arch in architectures:
+        for name in ARCHITECTURE_MODELS.get(arch, ()):
+            if name == "embeddings":
+                name = embeddings
+            if name not in names:
+                names.append(name)
+    return names
+
+def model_status() -> Dict[str, Dict[str, Any]]:
+    return {name: model.status() for name, model in MODELS.items()}
+
+async def ensure_models(names: Iterable[str]):
+    """Load the given models in parallel on the CPU pool; no-op once loaded."""
+    await asyncio.gather(*(run_cpu(MODELS[name].get) for name in names if not MODELS[name].loaded))
+
+def _warm(name: str):
+    # Load, then one tiny call so lazy init inside torch/tiktoken is paid too
+    model = MODELS[name].get()
+    if name.startswith("embeddings"):
+        model.embed_queries(["warmup"])
+    elif name == "reranker":
+        model.predict([("warmup", "warmup")], show_progress_bar=False)
+    else:
+        get_encoding()
+
+async def warmup(names: Iterable[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Load and exercise models (all by default). Failures show up in the status."""
+    await asyncio.gather(*(run_cpu(_warm, name) for name in (names or MODELS)), return_exceptions=True)
+    return model_status()
+
+# Ranked chunks each architecture offers the context packer, which keeps
+# as many as fit in MAX_CONTEXT_TOKENS
+CONTEXT_TOP_K = int(os.getenv("CONTEXT_TOP_K", "8"))
+
+class IndexParams(NamedTuple):
+    """What makes one index of a document differ from another."""
+    chunk_tokens: int
+    chunk_overlap: int
+    embedding_model: str
+
+DEFAULT_INDEX = IndexParams(CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, EMBEDDING_MODELS[0])
+
+def index_params(settings: Optional[QuerySettings]) -> IndexParams:
+    """The index ``settings`` ask for, with server defaults for what they leave out."""
+    if settings is None:
+        return DEFAULT_INDEX
+    chunk_tokens = settings.chunk_size or CHUNK_TOKENS
+    if settings.chunk_overlap is not None:
+        chunk_overlap = settings.chunk_overlap
+        if chunk_overlap >= chunk_tokens:
+            raise ValueError("chunkOverlap must be smaller than chunkSize")
+    else:
+        chunk_overlap = min(CHUNK_OVERLAP_TOKENS, chunk_tokens // 4)
+    embedding_model_name = settings.embedding_model or EMBEDDING_MODELS[0]
+    embeddings_for(embedding_model_name)  # validates the name
+    return IndexParams(chunk_tokens, chunk_overlap, embedding_model_name)
+
+def index_key(source_id: str, params: IndexParams) -> str:
+    """Document store key of one index of a PDF; the default index keeps the PDF's own id.
+
+    Other variants hash to ids of the same form, so sweeping over chunk
+    sizes or models stores (and reuses) one entry per combination.
+    """
+    if params == DEFAULT_INDEX:
+        return source_id
+    variant = f"{source_id}\0{params.chunk_tokens}\0{params.chunk_overlap}\0{params.embedding_model}"
+    return hashlib.sha256(variant.encode("utf-8")).hexdigest()
+
+def create_vector_store(text: str, steps: List[Dict] = None, on_stage=None, pages=None,
+                        params: IndexParams = DEFAULT_INDEX, source_id: str = None) -> DocumentPipeline:
+    """Chunk, embed and index a document once for all architectures."""
+    pipeline = DocumentPipeline(
+        text, embeddings_for(params.embedding_model), pages=pages, chunk_tokens=params.chunk_tokens,
+        chunk_overlap=params.chunk_overlap, source_id=source_id
+    )
+    pipeline.steps.extend(steps or [])
+    return pipeline.build(on_stage)
+
+class VectorRetriever:
+    """Nearest chunks by embedding distance."""
+    retriever_type = "vector_similarity"
+
+    def __init__(self, k: int = 1):
+        self.k = k
+
+    def with_k(self, k: int) -> "VectorRetriever":
+        return VectorRetriever(k)
+
+    def retrieve(self, pipeline: DocumentPipeline, question: str) -> List[Dict[str, Any]]:
+        return [{"doc": doc} for doc, _ in pipeline.similarity_search(question, k=self.k)]
+
+    def retrieve_many(self, pipeline: DocumentPipeline, questions: List[str], vectors: np.ndarray) -> List[List[Dict[str, Any]]]:
+        return [[{"doc": doc} for doc, _ in hits] for hits in pipeline.similarity_search_many(vectors, k=self.k)]
+
+class HybridRetriever:
+    """Vector and BM25 top-``candidates`` fused into one ranking.
+
+    ``fusion="rrf"`` sums reciprocal ranks (1 / (rrf_k + rank)), which
+    ignores the incomparable score scales; ``"weighted"`` min-max
+    normalizes each side's scores (L2 distance flipped to a similarity)
+    and mixes them with ``vector_weight``. A chunk missing from one side
+    contributes nothing from it.
+    """
+    retriever_type = "hybrid_vector_bm25"
+
+    def __init__(self, k: int = 2, candidates: int = 10, fusion: str = "rrf", rrf_k: int = 60,
+                 vector_weight: float = 0.5):
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError(f"Unknown hybrid fusion: {fusion}")
+        self.k = k
+        self.candidates = max(candidates, k)
+        self.fusion = fusion
+        self.rrf_k = rrf_k
+        self.vector_weight = vector_weight
+
+    def with_k(self, k: int) -> "HybridRetriever":
+        return HybridRetriever(k, self.candidates, self.fusion, self.rrf_k, self.vector_weight)
+
+    def retrieve(self, pipeline: DocumentPipeline, question: str) -> List[Dict[str, Any]]:
+        vector_hits = pipeline.similarity_search(question, k=self.candidates)
+        return self.fuse(vector_hits, pipeline.bm25_search(question, k=self.candidates))
+
+    def retrieve_many(self, pipeline: DocumentPipeline, questions: List[str], vectors: np.ndarray) -> List[List[Dict[str, Any]]]:
+        vector_hits = pipeline.similarity_search_many(vectors, k=self.candidates)
+        bm25_hits = pipeline.bm25_search_many(questions, k=self.candidates)
+        return [self.fuse(vector, bm25) for vector, bm25 in zip(vector_hits, bm25_hits)]
+
+    def _contributions(self, hits: List, similarity) -> Dict[int, float]:
+        if self.fusion == "rrf":
+            return {doc.metadata["chunk"]: 1.0 / (self.rrf_k + rank) for rank, (doc, _) in enumerate(hits, start=1)}
+        values = np.array([similarity(score) for _, score in hits], dtype=np.float64)
+        spread = values.max() - values.min() if len(values) else 0.0
+        normalized = (values - values.min()) / spread if spread > 0 else np.ones_like(values)
+        return {doc.metadata["chunk"]: float(value) for (doc, _), value in zip(hits, normalized)}
+
+    def fuse(self, vector_hits: List, bm25_hits: List) -> List[Dict[str, Any]]:
+        """Top ``k`` of the union of (doc, distance) and (doc, bm25 score) hits."""
+        # Drop BM25 hits that share no term with the question
+        bm25_hits = [(doc, score) for doc, score in bm25_hits if score > 0]
+        vector = self._contributions(vector_hits, lambda distance: -distance)
+        bm25 = self._contributions(bm25_hits, lambda score: score)
+        vector_weight = self.vector_weight if self.fusion == "weighted" else 1.0
+        bm25_weight = 1.0 - self.vector_weight if self.fusion == "weighted" else 1.0
+
+        docs, raw = {}, {}
+        for name, hits in (("vector_distance", vector_hits), ("bm25_score", bm25_hits)):
+            for doc, score in hits:
+                docs.setdefault(doc.metadata["chunk"], doc)
+                raw.setdefault(doc.metadata["chunk"], {})[name] = float(score)
+        fused = {
+            chunk: vector_weight * vector.get(chunk, 0.0) + bm25_weight * bm25.get(chunk, 0.0)
+            for chunk in docs
+        }
+        # Ties go to the chunk the vector side ranked first, as before fusion
+        order = sorted(docs, key=lambda chunk: -fused[chunk])[:self.k]
+        hits = []
+        for chunk in order:
+            sides = [side for side, scores in (("vector", vector), ("bm25", bm25)) if chunk in scores]
+            hits.append({
+                "doc": docs[chunk],
+                "retriever": sides[0] if len(sides) == 1 else "both",
+                "score": fused[chunk],
+                **raw[chunk]
+            })
+        return hits
+
+class RerankerRetriever:
+    """Vector candidates re-scored by a cross-encoder.
+
+    ``scorer`` maps a list of (question, text) pairs to scores.
+    """
+    retriever_type = "reranked_vector"
+
+    def __init__(self, scorer, candidates: int = 5, k: int = 1):
+        self.scorer = scorer
+        self.candidates = candidates
+        self.k = k
+
+    def with_k(self, k: int) -> "RerankerRetriever":
+        # Keep reranking at least twice as many candidates as are kept
+        return RerankerRetriever(self.scorer, max(self.candidates, 2 * k), k)
+
+    def candidates_for(self, pipeline: DocumentPipeline, question: str) -> List:
+        return [doc for doc, _ in pipeline.similarity_search(question, k=self.candidates)]
+
+    def rerank(self, question: str, docs: List) -> List[Dict[str, Any]]:
+        scores = self.scorer([(question, doc.page_content) for doc in docs])
+        reranked = sorted(zip(scores, docs), key=lambda pair: pair[0], reverse=True)[:self.k]
+        return [{"doc": doc, "score": float(score)} for score, doc in reranked]
+
+    def retrieve(self, pipeline: DocumentPipeline, question: str) -> List[Dict[str, Any]]:
+        return self.rerank(question, self.candidates_for(pipeline, question))
+
+    def candidates_many(self, pipeline: DocumentPipeline, vectors: np.ndarray) -> List[List]:
+        return [[doc for doc, _ in hits] for hits in pipeline.similarity_search_many(vectors, k=self.candidates)]
+
+    def rerank_many(self, questions: List[str], candidates: List[List]) -> List[List[Dict[str, Any]]]:
+        """``rerank`` for several questions with one cross-encoder call over every pair."""
+        pairs = [(question, doc.page_content) for question, docs in zip(questions, candidates) for doc in docs]
+        scores = iter(self.scorer(pairs) if pairs else [])
+        results = []
+        for docs in candidates:
+            scored = [(next(scores), doc) for doc in docs]
+            reranked = sorted(scored, key=lambda pair: pair[0], reverse=True)[:self.k]
+            results.append([{"doc": doc, "score": float(score)} for score, doc in reranked])
+        return results
+
+simple_retriever = VectorRetriever(k=CONTEXT_TOP_K)
+hybrid_retriever = HybridRetriever(
+    k=int(os.getenv("HYBRID_TOP_K", str(CONTEXT_TOP_K))),
+    candidates=int(os.getenv("HYBRID_CANDIDATES", "10")),
+    fusion=os.getenv("HYBRID_FUSION", "rrf"),
+    vector_weight=float(os.getenv("HYBRID_VECTOR_WEIGHT", "0.5"))
+)
+reranker_retriever = RerankerRetriever(
+    rerank_scorer, candidates=int(os.getenv("RERANK_CANDIDATES", str(2 * CONTEXT_TOP_K))), k=CONTEXT_TOP_K
+)
+
+LLM_REQUESTS = REGISTRY.counter("rag_llm_requests_total", "LLM answers by cache outcome.", ("architecture", "cache"))
+
+# Set by callers that fan out many questions (e.g. /query/batch) to cap
+# how many LLM calls they have in flight at once
+llm_limit: ContextVar[Optional[asyncio.Semaphore]] = ContextVar("llm_limit", default=None)
+
+# Set by endpoints to the request's settings; topK and temperature are
+# read from it by retrieval and generation (chunking and the embedding
+# model pick the index, see index_params)
+query_settings: ContextVar[Optional[QuerySettings]] = ContextVar("query_settings", default=None)
+
+def _scoped(retriever):
+    """``retriever`` with the request's topK, if it set one."""
+    settings = query_settings.get()
+    if settings is None or not settings.top_k or settings.top_k == retriever.k:
+        return retriever
+    return retriever.with_k(settings.top_k)
+
+def _llm():
+    settings = query_settings.get()
+    return llm_for(settings.temperature if settings is not None else None)
+
+async def _timed(steps: List[Dict], name: str, awaitable):
+    async with span(name, steps):
+        return await awaitable
+
+async def _generate(architecture: str, prompt: str, pipeline: DocumentPipeline, question: str, emit=None):
+    """Call the cached LLM; when ``emit`` is given, stream tokens to it as they arrive.
+
+    Returns ``(answer, cache_info)``.
+    """
+    emit_token = None
+    if emit is not None:
+        async def emit_token(token):
+            await emit({"event": "token", "architecture": architecture, "token": token})
+
+    query_vector = None
+    if llm_cache.semantic_threshold is not None:
+        # Already computed (and memoized) by retrieval, with the index's model
+        query_vector = await run_cpu(pipeline.embeddings.embed_query, question)
+    limit = llm_limit.get()
+    async with limit if limit is not None else contextlib.nullcontext():
+        answer, cache_info = await _llm().generate(
+            prompt,
+            emit_token,
+            doc_id=pipeline.doc_id,
+            scope=architecture,
+            query_vector=query_vector
+        )
+    LLM_REQUESTS.inc(architecture=architecture, cache=cache_info["hit"] or "miss")
+    return answer, cache_info
+
+async def _emit_sources(emit, architecture: str, retriever_type: str, sources: List[Dict]):
+    if emit is not None:
+        await emit({
+            "event": "sources",
+            "architecture": architecture,
+            "retriever_type": retriever_type,
+            "sources": sources
+        })
 
 def track_processing_time(func):
-    def wrapper(*args, **kwargs):
+    async def wrapper(pipeline: DocumentPipeline, question: str, shared_steps: List[Dict] = None, emit=None,
+                      retrieved: List[Dict] = None):
         metrics = {
             "start_time": time.time(),
-            "steps": [],
+            # Chunking, embedding and indexing ran once for the whole request
+            "steps": [dict(step, shared=True) for step in (shared_steps if shared_steps is not None else pipeline.steps)],
             "memory_usage": {},
             "performance_metrics": {}
         }
+
+        result = await func(pipeline, question, emit, retrieved)
+        # Retrieval and generation are the only per-architecture stages;
+        # performance_metrics are filled for the whole request by score_results
+        metrics["steps"].extend(result.pop("steps", []))
         
-        # Track text processing
-        start = time.time()
-        text = args[0]  # Get the text argument
-        chunks = split_and_annotate(text)
-        metrics["steps"].append({
-            "name": "text_processing",
-            "duration": time.time() - start,
-            "chunks": len(chunks)
-        })
-        
-        # Track embedding
-        start = time.time()
-        vectorstore, bm25_retriever, docs, metadata = create_vector_store(text)  # Pass text, not chunks
-        metrics["steps"].append({
-            "name": "embedding",
-            "duration": time.time() - start,
-            "vectors": len(docs)
-        })
-        
-        # Track retrieval & generation
-        start = time.time()
-        result = func(*args, **kwargs)  # Call original function with original args
-        metrics["steps"].append({
-            "name": "generation",
-            "duration": time.time() - start
-        })
-        
-        # Add performance metrics
-        if isinstance(result, dict) and result.get("sources"):
-            metrics["performance_metrics"] = metrics_analyzer.calculate_response_metrics(
-                result["sources"],
-                args[1],  # question
-                result.get("answer", "")
-            )
-            
+        chunks = pipeline.chunks
         metrics["memory_usage"] = {
-            "embedding_size": len(docs) * 384,  # Size of embedding vectors
-            "total_chunks": len(docs),
-            "avg_chunk_size": sum(len(d.page_content) for d in docs) / len(docs)
+            "embedding_size": int(pipeline.vectors.nbytes),  # Size of embedding vectors
+            "total_chunks": len(chunks),
+            "avg_chunk_size": float((chunks.ends - chunks.starts).mean()),
+            "process_rss": process_rss()
         }
         
         metrics["total_duration"] = time.time() - metrics["start_time"]
@@ -159,34 +486,80 @@ def track_processing_time(func):
         return result
     return wrapper
 
+async def score_results(pipeline: DocumentPipeline, question: str, results: List[Dict]):
+    """Compute every result's performance_metrics with one batched encode."""
+    async with span("scoring") as step:
+        await run_cpu(metrics_analyzer.score_results, question, results, pipeline.vectors, pipeline.embeddings)
+    for result in results:
+        if isinstance(result.get("metrics"), dict):
+            result["metrics"]["steps"].append(dict(step, shared=True))
+
+def retrieve_batch(pipeline: DocumentPipeline, questions: List[str], architectures: Iterable[str],
+                   steps: List[Dict]) -> List[Dict[str, List[Dict[str, Any]]]]:
+    """Retrieval for many questions at once: one question encode, one index
+    search per retriever and one cross-encoder call for all reranking.
+
+    Returns, per question, each architecture's hits in the form its
+    ``answer_with_*`` function takes as ``retrieved``.
+    """
+    architectures = set(architectures)
+    retrieved = [{} for _ in questions]
+    reranker = _scoped(reranker_retriever)
+    with span("retrieval", steps) as step:
+        vectors = pipeline.embed_queries(questions)
+        step["questions"] = len(questions)
+        if "SimpleRAG" in architectures:
+            for hits, slot in zip(_scoped(simple_retriever).retrieve_many(pipeline, questions, vectors), retrieved):
+                slot["SimpleRAG"] = hits
+        if "HybridRAG" in architectures:
+            for hits, slot in zip(_scoped(hybrid_retriever).retrieve_many(pipeline, questions, vectors), retrieved):
+                slot["HybridRAG"] = hits
+        if "ReRankerRAG" in architectures:
+            candidates = reranker.candidates_many(pipeline, vectors)
+    if "ReRankerRAG" in architectures:
+        with span("reranking", steps) as step:
+            step["pairs"] = sum(len(docs) for docs in candidates)
+            for hits, slot in zip(reranker.rerank_many(questions, candidates), retrieved):
+                slot["ReRankerRAG"] = hits
+    return retrieved
+
 @track_processing_time
-def answer_with_simple_rag(text: str, question: str):
+async def answer_with_simple_rag(pipeline: DocumentPipeline, question: str, emit=None, retrieved=None):
     try:
-        vectorstore, _, _, metadata = create_vector_store(text)
-        # Reduce number of retrieved documents
-        retriever = vectorstore.as_retriever(search_type="similarity", k=1)
-        
-        # Get relevant documents and limit context size
-        docs = retriever.get_relevant_documents(question)
-        context = " ".join(doc.page_content for doc in docs)
-        context = truncate_context(context)
-        
-        # Create a simplified prompt with limited context
-        prompt = f"Question: {question}\nContext: {context}\nAnswer concisely:"
+        steps = []
+        metadata = pipeline.metadata
+        retriever = _scoped(simple_retriever)
+        # Get relevant documents and limit context size; batches pass them in
+        hits = retrieved
+        if hits is None:
+            hits = await _timed(steps, "retrieval", run_cpu(retriever.retrieve, pipeline, question))
+        # Ranked chunks up to the token budget; sources are what the LLM sees
+        packed = pack_context([hit["doc"] for hit in hits])
+        prompt, prompt_tokens = packed.prompt(question)
+        sources = [
+            {"content": doc.page_content[:500], "page": doc.metadata.get("page"), "chunk": doc.metadata["chunk"]}
+            for doc in packed.docs
+        ]
+        await _emit_sources(emit, "SimpleRAG", retriever.retriever_type, sources)
         
         # Use the LLM with processed context
-        result = llm.invoke(prompt)
+        answer, cache_info = await _timed(steps, "generation", _generate("SimpleRAG", prompt, pipeline, question, emit))
         
         return {
             "architecture": "SimpleRAG",
-            "answer": result.content if hasattr(result, 'content') else result,
-            "sources": [{"content": doc.page_content[:500], "page": doc.metadata.get("page")} for doc in docs],
+            "answer": answer,
+            "sources": sources,
             "metadata": {
                 "chunks": metadata["chunks"],
                 "embedding_model": metadata["embedding_model"],
                 "total_tokens": metadata["total_tokens"],
-                "retriever_type": "vector_similarity"
-            }
+                "retriever_type": retriever.retriever_type,
+                "top_k": retriever.k,
+                "temperature": _llm().temperature,
+                **packed.metadata(prompt_tokens),
+                "llm_cache": cache_info
+            },
+            "steps": steps
         }
     except Exception as e:
         return {
@@ -197,44 +570,47 @@ def answer_with_simple_rag(text: str, question: str):
         }
 
 @track_processing_time
-def answer_with_hybrid_rag(text: str, question: str):
+async def answer_with_hybrid_rag(pipeline: DocumentPipeline, question: str, emit=None, retrieved=None):
     try:
-        vectorstore, bm25_retriever, _, metadata = create_vector_store(text)
-        # Reduce retrieved documents
-        vector_docs = vectorstore.similarity_search(question, k=1)
-        bm25_docs = bm25_retriever.get_relevant_documents(question)[:1]
-        
-        # Process and combine contexts with limits
-        combined_context = []
-        sources = []
-        seen = set()
+        steps = []
+        metadata = pipeline.metadata
+        retriever = _scoped(hybrid_retriever)
+        hits = retrieved
+        if hits is None:
+            hits = await _timed(steps, "retrieval", run_cpu(retriever.retrieve, pipeline, question))
         
-        for doc in vector_docs + bm25_docs:
-            if doc.page_content not in seen:
-                processed_content = truncate_context(doc.page_content, MAX_CONTEXT_LENGTH // 2)
-                combined_context.append(processed_content)
-                sources.append({
-                    "content": processed_content[:500],
-                    "page": doc.metadata.get("page"),
-                    "retriever": "vector" if doc in vector_docs else "bm25"
-                })
-                seen.add(doc.page_content)
-        
-        # Create simplified prompt with limited context
-        context = " ".join(combined_context)
-        prompt = f"Question: {question}\nContext: {context}\nAnswer concisely:"
-        result = llm.invoke(prompt)
+        # Fused ranking fills one shared budget instead of half per side
+        packed = pack_context([hit["doc"] for hit in hits])
+        prompt, prompt_tokens = packed.prompt(question)
+        by_chunk = {hit["doc"].metadata["chunk"]: hit for hit in hits}
+        sources = [
+            {
+                "content": doc.page_content[:500],
+                "page": doc.metadata.get("page"),
+                "chunk": doc.metadata["chunk"],
+                "retriever": by_chunk[doc.metadata["chunk"]]["retriever"],
+                "score": by_chunk[doc.metadata["chunk"]]["score"]
+            } for doc in packed.docs
+        ]
+        await _emit_sources(emit, "HybridRAG", retriever.retriever_type, sources)
+        answer, cache_info = await _timed(steps, "generation", _generate("HybridRAG", prompt, pipeline, question, emit))
         
         return {
             "architecture": "HybridRAG",
-            "answer": result.content if hasattr(result, 'content') else result,
+            "answer": answer,
             "sources": sources,
             "metadata": {
                 "chunks": metadata["chunks"],
                 "embedding_model": metadata["embedding_model"],
                 "total_tokens": metadata["total_tokens"],
-                "retriever_type": "hybrid_vector_bm25"
-            }
+                "retriever_type": retriever.retriever_type,
+                "fusion": retriever.fusion,
+                "top_k": retriever.k,
+                "temperature": _llm().temperature,
+                **packed.metadata(prompt_tokens),
+                "llm_cache": cache_info
+            },
+            "steps": steps
         }
     except Exception as e:
         return {
@@ -245,39 +621,48 @@ def answer_with_hybrid_rag(text: str, question: str):
         }
 
 @track_processing_time
-def answer_with_reranker_rag(text: str, question: str):
+async def answer_with_reranker_rag(pipeline: DocumentPipeline, question: str, emit=None, retrieved=None):
     try:
-        vectorstore, _, _, metadata = create_vector_store(text)
+        steps = []
+        metadata = pipeline.metadata
+        retriever = _scoped(reranker_retriever)
         # Get more initial docs but fewer final ones
-        initial_docs = vectorstore.similarity_search(question, k=5)
-        pairs = [(question, doc.page_content) for doc in initial_docs]
-        scores = reranker.predict(pairs)
-        reranked = sorted(zip(scores, initial_docs), reverse=True)[:1]  # Only take top result
-        
-        # Process context with limits
-        context = truncate_context(reranked[0][1].page_content)
-        prompt = f"Question: {question}\nContext: {context}\nAnswer concisely:"
+        reranked = retrieved
+        if reranked is None:
+            candidates = await _timed(steps, "retrieval", run_cpu(retriever.candidates_for, pipeline, question))
+            reranked = await _timed(steps, "reranking", run_cpu(retriever.rerank, question, candidates))
+        packed = pack_context([hit["doc"] for hit in reranked])
+        prompt, prompt_tokens = packed.prompt(question)
+        scores = {hit["doc"].metadata["chunk"]: hit["score"] for hit in reranked}
+        sources = [
+            {
+                "content": doc.page_content[:500],
+                "page": doc.metadata.get("page"),
+                "chunk": doc.metadata["chunk"],
+                "score": scores[doc.metadata["chunk"]]
+            } for doc in packed.docs
+        ]
+        await _emit_sources(emit, "ReRankerRAG", retriever.retriever_type, sources)
         
         # Use direct LLM call instead of chain
-        result = llm.invoke(prompt)
+        answer, cache_info = await _timed(steps, "generation", _generate("ReRankerRAG", prompt, pipeline, question, emit))
         
         return {
             "architecture": "ReRankerRAG",
-            "answer": result.content if hasattr(result, 'content') else result,
-            "sources": [
-                {
-                    "content": doc.page_content[:500],
-                    "page": doc.metadata.get("page"),
-                    "score": float(score)
-                } for score, doc in reranked[:1]  # Only include top result
-            ],
+            "answer": answer,
+            "sources": sources,
             "metadata": {
                 "chunks": metadata["chunks"],
                 "embedding_model": metadata["embedding_model"],
                 "total_tokens": metadata["total_tokens"],
-                "retriever_type": "reranked_vector",
-                "reranker_model": "ms-marco-MiniLM-L-6-v2"
-            }
+                "retriever_type": retriever.retriever_type,
+                "reranker_model": "ms-marco-MiniLM-L-6-v2",
+                "top_k": retriever.k,
+                "temperature": _llm().temperature,
+                **packed.metadata(prompt_tokens),
+                "llm_cache": cache_info
+            },
+            "steps": steps
         }
     except Exception as e:
         return {
@@ -286,3 +671,33 @@ def answer_with_reranker_rag(text: str, question: str):
             "sources": [],
             "metadata": {}
         }
+
+async def answer_with_collection(collection, question: str, k: int = 4, doc_ids: List[str] = None,
+                                 rerank: bool = False) -> Dict[str, Any]:
+    """Answer from a multi-document collection (optionally only ``doc_ids``)."""
+    steps = []
+    candidates = reranker_retriever.candidates if rerank else k
+    hits = await _timed(steps, "retrieval", run_cpu(collection.similarity_search, question, max(k, candidates), doc_ids))
+    docs = [doc for doc, _ in hits]
+    if rerank and docs:
+        reranked = await _timed(steps, "reranking", run_cpu(RerankerRetriever(rerank_scorer, k=k).rerank, question, docs))
+        docs = [hit["doc"] for hit in reranked]
+    packed = pack_context(docs[:k])
+    prompt, prompt_tokens = packed.prompt(question)
+    sources = [
+        {
+            "content": doc.page_content[:500],
+            "doc_id": doc.metadata["doc_id"],
+            "filename": doc.metadata["filename"],
+            "page": doc.metadata.get("page"),
+            "chunk": doc.metadata["chunk"]
+        } for doc in packed.docs
+    ]
+    answer, cache_info = await _timed(steps, "generation", _generate("CollectionRAG", prompt, collection, question))
+    return {
+        "architecture": "CollectionRAG",
+        "answer": answer,
+        "sources": sources,
+        "metadata": {**(await run_cpu(collection.stats)), **packed.metadata(prompt_tokens), "llm_cache": cache_info},
+        "steps": steps
+    }
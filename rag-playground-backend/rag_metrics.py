@@ -1,29 +1,60 @@
 from typing import Dict, Any, List
-import time
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
 
 class RAGMetrics:
-    def calculate_response_metrics(self, sources: List[Dict], question: str, answer: str) -> Dict[str, Any]:
+    """Answer quality signals from embeddings the pipeline already holds.
+
+    Source vectors are rows of the document's embedding matrix; the only
+    model call is one batched encode of the question and every answer in
+    the request (``score_results``).
+    """
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def score_results(self, question: str, results: List[Dict], chunk_vectors: np.ndarray, embeddings=None):
+        """Fill ``metrics.performance_metrics`` of each result in place.
+
+        ``embeddings`` must be the model that produced ``chunk_vectors``
+        when it isn't the default one.
+        """
+        scored = [r for r in results if r.get("sources") and isinstance(r.get("metrics"), dict)]
+        if not scored:
+            return
+        vectors = (embeddings or self.embeddings).embed_queries([question] + [r.get("answer", "") for r in scored])
+        for result, answer_vector in zip(scored, vectors[1:]):
+            source_vectors = chunk_vectors[[source["chunk"] for source in result["sources"]]]
+            result["metrics"]["performance_metrics"] = self.calculate_response_metrics(
+                vectors[0], source_vectors, answer_vector
+            )
+
+    def calculate_response_metrics(self, question_vector: np.ndarray, source_vectors: np.ndarray, answer_vector: np.ndarray) -> Dict[str, Any]:
+        sources = _normalize(np.asarray(source_vectors, dtype=np.float32))
+        relevance = sources @ _normalize(np.asarray(question_vector, dtype=np.float32))
+        context_usage = self._calculate_context_usage(sources, _normalize(np.asarray(answer_vector, dtype=np.float32)))
         return {
-            "relevance_scores": self._calculate_relevance(sources, question),
+            "relevance_scores": [float(score) for score in np.clip(relevance, 0.0, 1.0)],
             "diversity_score": self._calculate_diversity(sources),
-            "context_usage": self._calculate_context_usage(sources, answer),
-            "confidence_score": self._calculate_confidence(sources)
+            "context_usage": context_usage,
+            "confidence_score": self._calculate_confidence(relevance, context_usage)
         }
-    
-    def _calculate_relevance(self, sources: List[Dict], question: str) -> List[float]:
-        # Calculate semantic similarity between question and each source
-        return [score for score in np.random.uniform(0.5, 1.0, len(sources))]
-
-    def _calculate_diversity(self, sources: List[Dict]) -> float:
-        # Measure how different the sources are from each other
-        return float(np.random.uniform(0.6, 1.0))
-
-    def _calculate_context_usage(self, sources: List[Dict], answer: str) -> float:
-        # Measure how much of the retrieved context was used in the answer
-        return float(np.random.uniform(0.7, 1.0))
-
-    def _calculate_confidence(self, sources: List[Dict]) -> float:
-        # Overall confidence score based on source quality
-        return float(np.random.uniform(0.8, 1.0))
+
+    def _calculate_diversity(self, sources: np.ndarray) -> float:
+        # 1 - mean pairwise cosine similarity between sources
+        if len(sources) < 2:
+            return 0.0
+        similarity = sources @ sources.T
+        pairs = similarity[np.triu_indices(len(sources), k=1)]
+        return float(np.clip(1.0 - pairs.mean(), 0.0, 1.0))
+
+    def _calculate_context_usage(self, sources: np.ndarray, answer: np.ndarray) -> float:
+        # How closely the answer follows its best-matching source
+        return float(np.clip((sources @ answer).max(), 0.0, 1.0))
+
+    def _calculate_confidence(self, relevance: np.ndarray, context_usage: float) -> float:
+        # Best source relevance and grounding of the answer, equally weighted
+        return float(np.clip(0.5 * relevance.max() + 0.5 * context_usage, 0.0, 1.0))
@@ -0,0 +1,125 @@
+"""Prefork server: several uvicorn workers sharing one copy of the models.
+
+    python serve.py --workers 4 --port 8000
+
+The parent imports the app and loads every model, then ``gc.freeze()``s
+the heap and forks. Workers inherit the weights copy-on-write, and since
+frozen objects are never touched by the cyclic collector, their pages stay
+shared instead of being dirtied by GC bookkeeping. Stored document vectors
+are memory-mapped (see DocumentPipeline.load), so every worker reads them
+from the same page cache. Each worker runs ``--threads`` torch threads
+(default 1), so N workers use about N cores. ``GET /memory`` on any worker
+reports per-worker and shared memory.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("serve")
+
+
+def load_app(threads: int):
+    # Tokenizer and torch thread pools must not exist before fork()
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    os.environ["PRELOAD_MODELS"] = ""  # loaded here instead, once for all workers
+    import torch
+    torch.set_num_threads(threads)
+
+    import main
+    from rag_engine import MODELS
+    for name, model in MODELS.items():
+        try:
+            model.get()
+        except Exception as e:
+            # Workers retry lazily on first use
+            logger.warning(f"Could not preload {name}: {e}")
+    return main.app
+
+
+def run_worker(app, sock: socket.socket, args):
+    import uvicorn
+    config = uvicorn.Config(
+        app,
+        log_level="info",
+        access_log=True,
+        limit_concurrency=args.limit_concurrency,
+        timeout_keep_alive=65,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "10000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    parser.add_argument("--threads", type=int, default=int(os.getenv("WORKER_THREADS", "1")),
+                        help="torch threads per worker")
+    parser.add_argument("--limit-concurrency", type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.time()
+    app = load_app(args.threads)
+    logger.info(f"Loaded app and models in {time.time() - start:.1f}s")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.set_inheritable(True)
+    os.environ["SERVE_MASTER_PID"] = str(os.getpid())
+
+    # Everything allocated so far is long-lived; keep the collector off it
+    gc.collect()
+    gc.freeze()
+
+    workers = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                run_worker(app, sock, args)
+            finally:
+                os._exit(0)
+        workers[pid] = time.time()
+        logger.info(f"Started worker {pid}")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for _ in range(args.workers):
+        spawn()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.info(f"Serving on {args.host}:{args.port} with {args.workers} workers")
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = workers.pop(pid, time.time())
+        if stopping:
+            continue
+        logger.warning(f"Worker {pid} exited with status {status}; restarting")
+        if time.time() - started < 1:
+            time.sleep(1)  # don't spin on a worker that dies at startup
+        spawn()
+
+
+if __name__ == "__main__":
+    main()
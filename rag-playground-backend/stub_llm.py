@@ -0,0 +1,46 @@
+import asyncio
+import hashlib
+import re
+import time
+from typing import AsyncIterator
+
+
+class StubMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class StubLLM:
+    """Deterministic offline stand-in for ChatGroq (``LLM_BACKEND=stub``).
+
+    The answer is the first sentence of the prompt's context plus a short
+    digest of the prompt, so identical prompts give identical answers.
+    ``latency`` seconds are spent per call (spread across streamed tokens)
+    to mimic a remote model in benchmarks.
+    """
+
+    def __init__(self, latency: float = 0.0, model_name: str = "stub-llm", temperature: float = 0.0):
+        self.latency = latency
+        self.model_name = model_name
+        self.temperature = temperature
+
+    def _answer(self, prompt: str) -> str:
+        match = re.search(r"Context:(.*?)\nAnswer", prompt, re.S)
+        context = (match.group(1) if match else prompt).strip()
+        sentence = re.split(r"(?<=[.!?])\s", context, maxsplit=1)[0][:300]
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        return f"{sentence} [stub:{digest}]"
+
+    def invoke(self, prompt: str) -> StubMessage:
+        time.sleep(self.latency)
+        return StubMessage(self._answer(prompt))
+
+    async def ainvoke(self, prompt: str) -> StubMessage:
+        await asyncio.sleep(self.latency)
+        return StubMessage(self._answer(prompt))
+
+    async def astream(self, prompt: str) -> AsyncIterator[StubMessage]:
+        words = self._answer(prompt).split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            yield StubMessage(word if i == 0 else " " + word)
@@ -0,0 +1,158 @@
+import hashlib
+import io
+from typing import Dict, Optional
+from urllib.parse import parse_qsl
+
+from fastapi import HTTPException
+from starlette.requests import Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Limits for everything that isn't the PDF itself
+MAX_FIELD_SIZE = 64 * 1024
+MAX_PARTS = 16
+
+
+class Upload:
+    """A parsed multipart form: text fields plus at most one file.
+
+    The file is kept in memory (it is bounded by the size limit) and its
+    sha256 is computed while it streams in, so ``sha256`` is the doc_id.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self.file: Optional[io.BytesIO] = None
+        self.filename: Optional[str] = None
+        self.sha256: Optional[str] = None
+        self.size = 0
+        self.parts = 0
+
+    @property
+    def content(self) -> Optional[bytes]:
+        # An empty file input still sends a part; treat it as no file
+        if self.file is None or self.size == 0:
+            return None
+        return self.file.getvalue()
+
+    def require(self, name: str) -> str:
+        if name not in self.fields:
+            raise HTTPException(status_code=422, detail=f"Missing form field: {name}")
+        return self.fields[name]
+
+
+async def _read_urlencoded(request: Request, limit: int) -> Upload:
+    # A form without a file (e.g. a doc_id query) may come urlencoded
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail="Form body is too large")
+    upload = Upload()
+    upload.fields = dict(parse_qsl(body.decode("latin-1"), keep_blank_values=True))
+    return upload
+
+
+async def read_upload(request: Request, max_file_size: int, file_field: str = "pdf") -> Upload:
+    """Parse a multipart/form-data body as it arrives.
+
+    Nothing touches disk. The request is refused with 413 as soon as the
+    file passes ``max_file_size`` (or up front, from Content-Length), so an
+    oversized or endless upload costs at most that much memory.
+    """
+    max_body = max_file_size + MAX_PARTS * MAX_FIELD_SIZE
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_body:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {max_file_size} bytes")
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type == b"application/x-www-form-urlencoded":
+        return await _read_urlencoded(request, MAX_PARTS * MAX_FIELD_SIZE)
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body")
+
+    upload = Upload()
+    hasher = hashlib.sha256()
+    part: Dict = {}
+    header_field = bytearray()
+    header_value = bytearray()
+    errors = []
+
+    def on_part_begin():
+        part.clear()
+        part.update(headers={}, data=bytearray(), kind=None)
+        upload.parts += 1
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        part["headers"][bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        part["name"] = options.get(b"name", b"").decode("utf-8", errors="replace")
+        filename = options.get(b"filename")
+        if filename is None:
+            part["kind"] = "field"
+        elif part["name"] == file_field and upload.file is None:
+            part["kind"] = "file"
+            upload.file = io.BytesIO()
+            upload.filename = filename.decode("utf-8", errors="replace")
+        else:
+            part["kind"] = "ignored"  # other files are read past, never kept
+
+    def on_part_data(data, start, end):
+        if errors:
+            return
+        chunk = data[start:end]
+        if part["kind"] == "file":
+            upload.size += len(chunk)
+            if upload.size > max_file_size:
+                errors.append(HTTPException(status_code=413, detail=f"Upload exceeds {max_file_size} bytes"))
+                return
+            hasher.update(chunk)
+            upload.file.write(chunk)
+        elif part["kind"] == "field":
+            if len(part["data"]) + len(chunk) > MAX_FIELD_SIZE:
+                errors.append(HTTPException(status_code=413, detail=f"Form field {part['name']} is too large"))
+                return
+            part["data"].extend(chunk)
+
+    def on_part_end():
+        if part.get("kind") == "field":
+            upload.fields[part["name"]] = part["data"].decode("utf-8", errors="replace")
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_body:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {max_file_size} bytes")
+        parser.write(chunk)
+        if errors:
+            raise errors[0]
+        if upload.parts > MAX_PARTS:
+            raise HTTPException(status_code=413, detail="Too many form parts")
+    parser.finalize()
+
+    if upload.file is not None:
+        upload.sha256 = hasher.hexdigest()
+    return upload
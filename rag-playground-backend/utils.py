@@ -1,17 +1,200 @@
+import bisect
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Iterator, List, Optional, Tuple, Union
+
 import pdfplumber
 
-def extract_text_from_pdf(file_path: str) -> str:
+# A path on disk or the raw PDF bytes
+PDFSource = Union[str, bytes]
+
+# PDFs with fewer pages are extracted in-process; the pool only pays off
+# once there are enough pages to split across workers
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", "32"))
+PAGES_PER_TASK = 8
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the server process holds model threads and locks
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+def _open(source: PDFSource):
+    return pdfplumber.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+class _SharedPDF(io.RawIOBase):
+    """Read-only file over a shared memory block, without copying it."""
+
+    def __init__(self, name: str, size: int):
+        self._block = shared_memory.SharedMemory(name=name)
+        self._view = self._block.buf[:size]
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = max(0, min(len(buffer), len(self._view) - self._position))
+        buffer[:n] = self._view[self._position:self._position + n]
+        self._position += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = base + offset
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+            self._block.close()
+        super().close()
+
+def _extract_range(source: Union[PDFSource, Tuple[str, int]], start: int, end: int) -> List[str]:
+    """Worker task: text of pages [start, end); ``source`` may be a (shared block, size) pair."""
+    stream = _SharedPDF(*source) if isinstance(source, tuple) else None
     try:
-        text = ""
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() or ""
-        
+        with _open(source) if stream is None else pdfplumber.open(stream) as pdf:
+            return [pdf.pages[i].extract_text() or "" for i in range(start, end)]
+    finally:
+        if stream is not None:
+            stream.close()
+
+def iter_pdf_pages(source: PDFSource, max_chars: Optional[int] = None, workers: int = 1) -> Iterator[Tuple[int, str]]:
+    """Yield ``(page_number, text)`` in page order.
+
+    Stops opening pages once ``max_chars`` characters have been yielded.
+    With ``workers > 1``, PDFs of at least ``PARALLEL_PAGE_THRESHOLD`` pages
+    are split into page ranges extracted by a process pool. With a
+    ``max_chars`` budget the first ``PAGES_PER_TASK`` pages are read
+    in-process first: if the rest of the budget looks like it needs fewer
+    than ``PARALLEL_PAGE_THRESHOLD`` more pages, extraction stays serial,
+    and otherwise only about as many ranges as it needs are in flight.
+    Ranges already running when extraction stops cannot be cancelled.
+
+    Uploaded bytes are copied once into shared memory that every task
+    maps, rather than pickled into each task.
+    """
+    produced = 0
+    with _open(source) as pdf:
+        page_count = len(pdf.pages)
+        serial = page_count
+        if workers > 1 and page_count >= PARALLEL_PAGE_THRESHOLD:
+            serial = PAGES_PER_TASK if max_chars is not None else 0
+        number = 0
+        while number < serial:
+            page = pdf.pages[number]
+            number += 1
+            text = page.extract_text() or ""
+            if hasattr(page, "close"):
+                page.close()  # drop the page's parsed objects
+            yield number, text
+            produced += len(text)
+            if max_chars is not None and produced >= max_chars:
+                return
+            if number == serial < page_count and _pages_needed(max_chars - produced, produced, number) < PARALLEL_PAGE_THRESHOLD:
+                serial = page_count
+        if number >= page_count:
+            return
+
+    pool = _get_pool()
+    block = None
+    if isinstance(source, bytes):
+        block = shared_memory.SharedMemory(create=True, size=max(len(source), 1))
+        block.buf[:len(source)] = source
+        source = (block.name, len(source))
+    ranges = [(start, min(start + PAGES_PER_TASK, page_count)) for start in range(number, page_count, PAGES_PER_TASK)]
+    window = 2 * workers
+    if max_chars is not None:
+        window = min(window, -(-_pages_needed(max_chars - produced, produced, number) // PAGES_PER_TASK))
+    pending = [pool.submit(_extract_range, source, start, end) for start, end in ranges[:window]]
+    next_range = len(pending)
+    try:
+        for start, _ in ranges:
+            texts = pending.pop(0).result()
+            if next_range < len(ranges):
+                pending.append(pool.submit(_extract_range, source, *ranges[next_range]))
+                next_range += 1
+            for number, text in enumerate(texts, start=start + 1):
+                yield number, text
+                produced += len(text)
+                if max_chars is not None and produced >= max_chars:
+                    return
+    finally:
+        for future in pending:
+            future.cancel()
+        if block is not None:
+            # Tasks still running keep their own mapping until they finish
+            block.close()
+            block.unlink()
+
+def _pages_needed(chars: int, produced: int, pages: int) -> int:
+    # Pages left to read for ``chars`` more characters at the average so far
+    if produced <= 0:
+        return PARALLEL_PAGE_THRESHOLD  # nothing to go on (e.g. blank first pages)
+    return max(1, -(-chars * pages // produced))
+
+
+class ExtractedText:
+    """Concatenated page text plus the offset where each page starts."""
+
+    def __init__(self, text: str, page_starts: List[int], page_numbers: List[int]):
+        self.text = text
+        self.page_starts = page_starts
+        self.page_numbers = page_numbers
+
+    def page_at(self, offset: int) -> Optional[int]:
+        """Page number containing character ``offset`` of ``text``."""
+        index = bisect.bisect_right(self.page_starts, offset) - 1
+        return self.page_numbers[index] if index >= 0 else None
+
+
+def extract_document(source: PDFSource, max_chars: Optional[int] = None, workers: int = 1) -> ExtractedText:
+    """Extract up to ``max_chars`` characters, keeping page boundaries."""
+    try:
+        parts = []
+        page_starts = []
+        page_numbers = []
+        length = 0
+        for number, text in iter_pdf_pages(source, max_chars, workers):
+            if parts:
+                parts.append("\n")
+                length += 1
+            page_starts.append(length)
+            page_numbers.append(number)
+            parts.append(text)
+            length += len(text)
+        text = "".join(parts)
+        if max_chars is not None:
+            text = text[:max_chars]
+
         if not text.strip():
             raise ValueError(
                 "No text could be extracted from PDF. "
                 "Please upload a PDF that contains selectable text (not a scanned image)."
             )
-        return text.strip()
+        return ExtractedText(text, page_starts, page_numbers)
     except Exception as e:
         raise ValueError(f"Failed to extract text from PDF: {str(e)}")
+
+def extract_text_from_pdf(file_path: str) -> str:
+    return extract_document(file_path).text.strip()
@@ -10,19 +10,23 @@ import Footer from "@/components/Footer";
 import AIFeatures from '@/components/AIFeatures';
 import Analytics from '@/components/Analytics';
 import ArchitectureComparison from '@/components/ArchitectureComparison';
-import { AISettings, ProcessingMetadata, RAGResult } from "@/types";
+import { AISettings, DEFAULT_AI_SETTINGS, ProcessingMetadata, RAGResult } from "@/types";
+import { QueryStreamEvent } from "@/types/rag";
+
+class StreamError extends Error {
+  constructor(message: string, public status: number) {
+    super(message);
+  }
+}
 
 export default function Home() {
   const [results, setResults] = useState<RAGResult[]>([]);
   const [selectedFile, setSelectedFile] = useState<File | null>(null);
+  // doc_id of selectedFile once the backend has indexed it
+  const [docId, setDocId] = useState<string | null>(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
-  const [aiSettings, setAISettings] = useState<AISettings>({
-    temperature: 0.7,
-    maxTokens: 2000,
-    chunkSize: 500,
-    modelType: 'llama3-70b-8192'
-  });
+  const [aiSettings, setAISettings] = useState<AISettings>(DEFAULT_AI_SETTINGS);
   const [processingMetadata, setProcessingMetadata] = useState<ProcessingMetadata | null>(null);
 
   const handleQuery = async (query: string, architectures: string[]) => {
@@ -35,25 +39,100 @@ export default function Home() {
     setProcessingMetadata(null);
     setError(null);
 
-    const formData = new FormData();
-    formData.append("pdf", selectedFile);
-    formData.append("query", query);
-    formData.append("architectures", JSON.stringify(architectures));
-    formData.append('settings', JSON.stringify(aiSettings));
-    console.log(formData)
-    try {
-      const response = await fetch(`http://localhost:8000/query`, {
-  method: "POST",
-  body: formData,
-});
+    const buildFormData = (useDocId: boolean) => {
+      const formData = new FormData();
+      if (useDocId && docId) {
+        formData.append("doc_id", docId);
+      } else {
+        formData.append("pdf", selectedFile);
+      }
+      formData.append("query", query);
+      formData.append("architectures", JSON.stringify(architectures));
+      formData.append('settings', JSON.stringify(aiSettings));
+      return formData;
+    };
 
-      const data = await response.json();
-      
-      if (data.results?.[0]?.metadata) {
-        setProcessingMetadata(data.results[0].metadata);
+    // Results fill in progressively from the NDJSON event stream
+    let docMetadata: ProcessingMetadata = { chunks: 0, embedding_model: '', total_tokens: 0 };
+    const applyEvent = (event: QueryStreamEvent, partial: Map<string, RAGResult>) => {
+      switch (event.event) {
+        case 'document':
+          setDocId(event.doc_id);
+          docMetadata = event.metadata;
+          setProcessingMetadata(event.metadata);
+          return;
+        case 'sources':
+          partial.set(event.architecture, {
+            architecture: event.architecture,
+            answer: '',
+            sources: event.sources,
+            metadata: { ...docMetadata, retriever_type: event.retriever_type },
+            time: 0,
+          });
+          break;
+        case 'token': {
+          const current = partial.get(event.architecture);
+          if (current) {
+            partial.set(event.architecture, { ...current, answer: current.answer + event.token });
+          }
+          break;
+        }
+        case 'result':
+          partial.set(event.architecture, event.result);
+          break;
+        case 'metrics': {
+          const current = partial.get(event.architecture);
+          if (current) {
+            partial.set(event.architecture, { ...current, metrics: event.metrics });
+          }
+          break;
+        }
+        case 'error':
+          throw new StreamError(event.detail, event.status_code);
+        default:
+          return;
+      }
+      setResults(Array.from(partial.values()));
+    };
+
+    const runStream = async (useDocId: boolean) => {
+      const response = await fetch(`http://localhost:8000/query/stream`, {
+        method: "POST",
+        body: buildFormData(useDocId),
+      });
+      if (!response.ok || !response.body) {
+        throw new StreamError(`Request failed with status ${response.status}`, response.status);
+      }
+
+      const partial = new Map<string, RAGResult>();
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffered = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split('\n');
+        buffered = lines.pop() ?? '';
+        for (const line of lines) {
+          if (line.trim()) {
+            applyEvent(JSON.parse(line) as QueryStreamEvent, partial);
+          }
+        }
+      }
+    };
+
+    try {
+      setResults([]);
+      try {
+        await runStream(true);
+      } catch (err) {
+        if (!(err instanceof StreamError && err.status === 404 && docId)) {
+          throw err;
+        }
+        // The backend evicted the document; upload it again
+        await runStream(false);
       }
-      
-      setResults(data.results);
     } catch (err) {
       const errorMessage = err instanceof Error ? err.message : "An error occurred";
       setError(errorMessage);
@@ -101,7 +180,7 @@ export default function Home() {
           {/* Left Column - Main Workflow */}
           <div className="col-span-12 lg:col-span-8 space-y-6">
             <div className="bg-gray-800/50 backdrop-blur border border-gray-700 rounded-xl p-6">
-              <PDFUpload onUpload={setSelectedFile} />
+              <PDFUpload onUpload={(file) => { setSelectedFile(file); setDocId(null); }} />
             </div>
             
             <div className="bg-gray-800/50 backdrop-blur border border-gray-700 rounded-xl p-6">
@@ -1,5 +1,5 @@
-import { useState } from 'react';
-import { AISettings } from '@/types';
+import { useEffect, useState } from 'react';
+import { AISettings, DEFAULT_AI_SETTINGS } from '@/types';
 
 interface AIFeaturesProps {
   onSettingsChange: (settings: AISettings) => void;
@@ -12,17 +12,47 @@ interface ChangeEvent {
   };
 }
 
+const NUMERIC_SETTINGS = ['temperature', 'maxTokens', 'chunkSize', 'chunkOverlap', 'topK'];
+
+const EMBEDDING_MODEL_LABELS: Record<string, string> = {
+  'all-MiniLM-L6-v2': 'MiniLM-L6-v2 (Fast)',
+  'BAAI/bge-large-en-v1.5': 'BGE-Large (Accurate)',
+};
+
+interface EmbeddingModels {
+  models: string[];
+  default: string;
+}
+
 export default function AIFeatures({ onSettingsChange }: AIFeaturesProps) {
-  const [settings, setSettings] = useState<AISettings>({
-    temperature: 0.7,
-    maxTokens: 2000,
-    chunkSize: 500,
-    modelType: 'llama3-70b-8192'
-  });
+  const [settings, setSettings] = useState<AISettings>(DEFAULT_AI_SETTINGS);
+  // Only what the backend allows (its EMBEDDING_MODELS); other names get a 400
+  const [embeddingModels, setEmbeddingModels] = useState<string[]>([DEFAULT_AI_SETTINGS.embeddingModel]);
+
+  useEffect(() => {
+    fetch(`http://localhost:8000/embedding-models`)
+      .then((response) => (response.ok ? response.json() : null))
+      .then((data: EmbeddingModels | null) => {
+        if (!data || !data.models.length) return;
+        setEmbeddingModels(data.models);
+        setSettings((current) => {
+          if (data.models.includes(current.embeddingModel)) return current;
+          const updated = { ...current, embeddingModel: data.default };
+          onSettingsChange(updated);
+          return updated;
+        });
+      })
+      .catch(() => undefined);  // keep the default model only
+  }, [onSettingsChange]);
 
   const handleChange = (e: ChangeEvent) => {
     const { name, value } = e.target;
-    const newSettings = { ...settings, [name]: value };
+    // Range inputs report strings; the backend validates numbers
+    const parsed = NUMERIC_SETTINGS.includes(name) ? Number(value) : value;
+    const newSettings = { ...settings, [name]: parsed };
+    if (newSettings.chunkOverlap >= newSettings.chunkSize) {
+      newSettings.chunkOverlap = Math.floor(newSettings.chunkSize / 4);
+    }
     setSettings(newSettings);
     onSettingsChange(newSettings);
   };
@@ -68,14 +98,14 @@ export default function AIFeatures({ onSettingsChange }: AIFeaturesProps) {
 
         <div>
           <label className="text-gray-300 mb-2 block">
-            Text Chunk Size: {settings.chunkSize}
+            Text Chunk Size: {settings.chunkSize} tokens
           </label>
           <input
             type="range"
             name="chunkSize"
-            min="100"
-            max="1000"
-            step="100"
+            min="32"
+            max="512"
+            step="32"
             value={settings.chunkSize}
             onChange={handleChange}
             className="w-full"
@@ -85,6 +115,56 @@ export default function AIFeatures({ onSettingsChange }: AIFeaturesProps) {
             <span>Larger Chunks</span>
           </div>
         </div>
+
+        <div>
+          <label className="text-gray-300 mb-2 block">
+            Chunk Overlap: {settings.chunkOverlap} tokens
+          </label>
+          <input
+            type="range"
+            name="chunkOverlap"
+            min="0"
+            max={settings.chunkSize / 2}
+            step="8"
+            value={settings.chunkOverlap}
+            onChange={handleChange}
+            className="w-full"
+          />
+        </div>
+
+        <div>
+          <label className="text-gray-300 mb-2 block">
+            Top K: {settings.topK}
+          </label>
+          <input
+            type="range"
+            name="topK"
+            min="1"
+            max="20"
+            step="1"
+            value={settings.topK}
+            onChange={handleChange}
+            className="w-full"
+          />
+          <div className="flex justify-between text-xs text-gray-500">
+            <span>Fewer Sources</span>
+            <span>More Sources</span>
+          </div>
+        </div>
+
+        <div>
+          <label className="text-gray-300 mb-2 block">Embedding Model</label>
+          <select
+            name="embeddingModel"
+            value={settings.embeddingModel}
+            onChange={handleChange}
+            className="w-full bg-gray-900 border border-gray-700 rounded-lg p-2 text-gray-100"
+          >
+            {embeddingModels.map((model) => (
+              <option key={model} value={model}>{EMBEDDING_MODEL_LABELS[model] ?? model}</option>
+            ))}
+          </select>
+        </div>
       </div>
 
       <div className="mt-4 p-4 bg-gray-900 rounded-lg">
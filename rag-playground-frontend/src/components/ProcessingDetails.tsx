@@ -23,6 +23,14 @@ export default function ProcessingDetails({ result }: { result: RAGResult }) {
           <span>Total Tokens:</span>
           <span className="font-mono">{metadata.total_tokens?.toLocaleString() || 'N/A'}</span>
         </div>
+        {metadata.prompt_tokens !== undefined && (
+          <div className="flex justify-between">
+            <span>Prompt Tokens:</span>
+            <span className="font-mono">
+              {metadata.prompt_tokens.toLocaleString()} ({metadata.context_chunks} chunks)
+            </span>
+          </div>
+        )}
         {metadata.reranker_model && (
           <div className="flex justify-between">
             <span>Reranker Model:</span>
@@ -1,10 +1,26 @@
 export interface AISettings {
   temperature: number;
   maxTokens: number;
+  // Chunking is in tokens; each chunkSize/chunkOverlap/embeddingModel
+  // combination is indexed once by the backend and reused
   chunkSize: number;
+  chunkOverlap: number;
+  // Ranked chunks offered to the prompt per architecture
+  topK: number;
+  embeddingModel: string;
   modelType: string;
 }
 
+export const DEFAULT_AI_SETTINGS: AISettings = {
+  temperature: 0.7,
+  maxTokens: 2000,
+  chunkSize: 128,
+  chunkOverlap: 16,
+  topK: 8,
+  embeddingModel: 'all-MiniLM-L6-v2',
+  modelType: 'llama3-70b-8192'
+};
+
 export interface ProcessingMetadata {
   chunks: number;
   embedding_model: string;
@@ -17,6 +33,7 @@ export interface Source {
   page?: number;
   score?: number;
   retriever?: string;
+  chunk?: number;
 }
 
 export interface MetricStep {
@@ -24,12 +41,18 @@ export interface MetricStep {
   duration: number;
   chunks?: number;
   vectors?: number;
+  shared?: boolean;
+  // Present on memory-sampled steps
+  alloc_bytes?: number;
+  alloc_peak_bytes?: number;
+  rss_delta?: number;
 }
 
 export interface MemoryUsage {
   embedding_size: number;
   total_chunks: number;
   avg_chunk_size: number;
+  process_rss?: number;
 }
 
 export interface PerformanceMetrics {
@@ -47,6 +70,13 @@ export interface Metrics {
   performance_metrics: PerformanceMetrics;
 }
 
+export interface LLMCacheInfo {
+  hit: 'exact' | 'semantic' | null;
+  exact_hits: number;
+  semantic_hits: number;
+  misses: number;
+}
+
 export interface RAGResult {
   architecture: string;
   answer: string;
@@ -57,6 +87,10 @@ export interface RAGResult {
     total_tokens: number;
     retriever_type: string;
     reranker_model?: string;
+    prompt_tokens?: number;
+    context_chunks?: number;
+    packing_ms?: number;
+    llm_cache?: LLMCacheInfo;
   };
   metrics?: Metrics;
   time: number;
@@ -3,6 +3,7 @@ export interface Source {
   page?: number;
   score?: number;
   retriever?: string;
+  chunk?: number;
 }
 
 export interface MetricStep {
@@ -10,12 +11,18 @@ export interface MetricStep {
   duration: number;
   chunks?: number;
   vectors?: number;
+  shared?: boolean;
+  // Present on memory-sampled steps
+  alloc_bytes?: number;
+  alloc_peak_bytes?: number;
+  rss_delta?: number;
 }
 
 export interface MemoryUsage {
   embedding_size: number;
   total_chunks: number;
   avg_chunk_size: number;
+  process_rss?: number;
 }
 
 export interface PerformanceMetrics {
@@ -33,6 +40,13 @@ export interface Metrics {
   performance_metrics: PerformanceMetrics;
 }
 
+export interface LLMCacheInfo {
+  hit: 'exact' | 'semantic' | null;
+  exact_hits: number;
+  semantic_hits: number;
+  misses: number;
+}
+
 export interface RAGResult {
   architecture: string;
   answer: string;
@@ -43,7 +57,78 @@ export interface RAGResult {
     total_tokens: number;
     retriever_type: string;
     reranker_model?: string;
+    prompt_tokens?: number;
+    context_chunks?: number;
+    packing_ms?: number;
+    llm_cache?: LLMCacheInfo;
   };
   metrics?: Metrics;
   time: number;
 }
+
+// Events emitted by POST /query/stream, one JSON object per line
+export interface StageEvent {
+  event: 'stage';
+  stage: 'extracted' | 'chunked' | 'embedded' | 'indexed';
+  duration: number;
+  cached: boolean;
+  chunks?: number;
+  vectors?: number;
+  characters?: number;
+}
+
+export interface DocumentEvent {
+  event: 'document';
+  // The PDF's id, the same whatever the settings; index_id is the chunking/embedding variant used
+  doc_id: string;
+  index_id: string;
+  cached: boolean;
+  metadata: Pick<RAGResult['metadata'], 'chunks' | 'embedding_model' | 'total_tokens'>;
+}
+
+export interface SourcesEvent {
+  event: 'sources';
+  architecture: string;
+  retriever_type: string;
+  sources: Source[];
+}
+
+export interface TokenEvent {
+  event: 'token';
+  architecture: string;
+  token: string;
+}
+
+export interface ResultEvent {
+  event: 'result';
+  architecture: string;
+  result: RAGResult;
+}
+
+export interface MetricsEvent {
+  event: 'metrics';
+  architecture: string;
+  metrics: Metrics;
+}
+
+export interface DoneEvent {
+  event: 'done';
+  doc_id: string;
+  index_id: string;
+}
+
+export interface ErrorEvent {
+  event: 'error';
+  status_code: number;
+  detail: string;
+}
+
+export type QueryStreamEvent =
+  | StageEvent
+  | DocumentEvent
+  | SourcesEvent
+  | TokenEvent
+  | ResultEvent
+  | MetricsEvent
+  | DoneEvent
+  | ErrorEvent;